@@ -0,0 +1,496 @@
+"""
+Query-count benchmark harness for the DRF endpoints.
+
+`DatasetSeeder` fills the database with a realistic member base (users, profiles
+with nested professional data, subscriptions, notifications, waiting list,
+introductions...) and can grow it in steps. `run_endpoints` requests every
+registered route and records query count, wall time and response size, and
+`find_regressions` flags the endpoints whose query count grows with the dataset.
+`run_camel_case_benchmark` times api.camel_case against djangorestframework_camel_case
+on the same responses.
+
+Used by the `benchmark_endpoints` and `benchmark_camel_case` management commands
+and by api/tests.py.
+"""
+import datetime
+import io
+import time
+from dataclasses import dataclass
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from djangorestframework_camel_case.parser import CamelCaseJSONParser as LibraryJSONParser
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer as LibraryJSONRenderer
+from rest_framework.test import APIClient
+
+from api.camel_case import CamelCaseJSONParser, CamelCaseJSONRenderer
+
+from api.models import (
+    CityCatalog, LanguageCatalog, RelationshipCatalog, Relative, SupportAgent, IndustryCatalog,
+    ProfessionalInterestCatalog, HobbyCatalog, ClubCatalog, RateExpertise, ContactMessage, PartnerType,
+)
+from membership.models import (
+    Plan, ShippingAddress, UserInvitation, MembershipSubscription, IntroductionCatalog, IntroductionStatus,
+    MemberIntroduction, InviteeQualificationCatalog, MemberReferral,
+)
+from moderation.models import Team, TeamMembership
+from notification.models import Notification
+from nsocial.models import (
+    Role, CustomUser, UserProfile, SocialMediaProfile, PersonalDetail, Club, ProfessionalProfile, WorkPosition,
+    Education, BoardPosition, NonProfitInvolvement, Recognition, Expertise, UserVideo,
+)
+from nsocial.search import index_members
+from waitinglist.models import WaitingList, RejectionReason
+
+
+ANON = 'anon'
+MEMBER = 'member'
+ADMIN = 'admin'
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    name: str
+    path: str
+    actor: str = MEMBER
+
+
+# Every GET route in api/, membership/, waitinglist/, notification/ and moderation/ urls.
+# `{...}` placeholders are filled from DatasetSeeder.fixtures.
+# Left out on purpose: `members/stripe/plans/` (always calls the Stripe API).
+ENDPOINTS = [
+    # api/urls.py
+    Endpoint('users-current', '/api/v1/users/current/'),
+    Endpoint('user-search', '/api/v1/users/search/?search=member'),
+    Endpoint('city-list', '/api/v1/cities/', ANON),
+    Endpoint('city-search', '/api/v1/cities/?search=city', ANON),
+    Endpoint('language-list', '/api/v1/languages/', ANON),
+    Endpoint('user-profile', '/api/v1/users/profile/'),
+    Endpoint('full-profile', '/api/v1/full-profile/'),
+    Endpoint('admin-profile', '/api/v1/admin-profile/'),
+    Endpoint('admin-profile-basic', '/api/v1/admin-profile/basic/'),
+    Endpoint('admin-profile-confidential', '/api/v1/admin-profile/confidential/'),
+    Endpoint('admin-profile-basic-social-media', '/api/v1/admin-profile/basic/social-media/'),
+    Endpoint('social-profile-list', '/api/v1/social-profiles/'),
+    Endpoint('video-list', '/api/v1/profile/videos/'),
+    Endpoint('experience-list', '/api/v1/experiences1/', ANON),
+    Endpoint('relationship-catalog-list', '/api/v1/relatives/relationships/', ANON),
+    Endpoint('relative-list', '/api/v1/relatives/'),
+    Endpoint('relative-list-admin', '/api/v1/relatives/', ADMIN),
+    Endpoint('support-agent-list', '/api/v1/support-agents/', ANON),
+    Endpoint('support-agent-detail', '/api/v1/support-agents/{support_agent}/', ANON),
+    Endpoint('industry-catalog-list', '/api/v1/catalog/industries/'),
+    Endpoint('professional-interest-catalog-list', '/api/v1/catalog/professional-interests/', ANON),
+    Endpoint('hobby-catalog-list', '/api/v1/catalog/hobbies/', ANON),
+    Endpoint('club-catalog-list', '/api/v1/catalog/clubs/', ANON),
+    Endpoint('rate-expertise', '/api/v1/catalog/rate-expertise/', ANON),
+    Endpoint('role-list', '/api/v1/roles/'),
+    Endpoint('role-detail', '/api/v1/roles/{member_role}/'),
+    Endpoint('contact-list', '/api/v1/contact/', ADMIN),
+    Endpoint('contact-email', '/api/v1/contact-email/', ANON),
+    Endpoint('partner-type-list', '/api/v1/partner-types/', ANON),
+    # notification/urls.py
+    Endpoint('notification-list', '/api/v1/notifications/'),
+    Endpoint('notification-unread-count', '/api/v1/notifications/unread-count/'),
+    # membership/urls.py
+    Endpoint('nobilis-list', '/api/v1/members/nobilis/plans/', ANON),
+    Endpoint('plan-price', '/api/v1/members/nobilis/plans/{plan}/', ANON),
+    Endpoint('account-overview', '/api/v1/members/account/overview/'),
+    Endpoint('subscription-status', '/api/v1/members/subscriptions/status/'),
+    Endpoint('members-subscriptions-overview', '/api/v1/members/subscriptions/members/overview/', ADMIN),
+    Endpoint('members-metrics-history', '/api/v1/members/subscriptions/members/metrics/history/', ADMIN),
+    Endpoint('members-list', '/api/v1/members/subscriptions/members/list/', ADMIN),
+    Endpoint('shipping-address', '/api/v1/members/shipping-address/'),
+    Endpoint('invitations-list', '/api/v1/members/invitations/', ADMIN),
+    Endpoint('dependents-list', '/api/v1/members/dependents/'),
+    Endpoint('introduction-catalog-list', '/api/v1/members/introductions/catalog/'),
+    Endpoint('introduction-catalog-detail', '/api/v1/members/introductions/catalog/{introduction_type}/'),
+    Endpoint('introduction-status-list', '/api/v1/members/introductions/status/'),
+    Endpoint('introduction-status-detail', '/api/v1/members/introductions/status/{introduction_status}/'),
+    Endpoint('member-introduction-list', '/api/v1/members/introductions/'),
+    Endpoint('member-introduction-detail', '/api/v1/members/introductions/{introduction}/'),
+    Endpoint('invitee-qualification-catalog-list', '/api/v1/members/referrals/catalog/'),
+    Endpoint('member-referral-list', '/api/v1/members/referrals/'),
+    Endpoint('member-referral-detail', '/api/v1/members/referrals/{referral}/'),
+    # waitinglist/urls.py
+    Endpoint('waitinglist', '/api/v1/waitinglist/', ANON),
+    Endpoint('rejection-reason-list', '/api/v1/waitinglist/rejection-reasons/'),
+    Endpoint('waitinglist-admin-list', '/api/v1/waitinglist/admin/', ADMIN),
+    Endpoint('waitinglist-admin-detail', '/api/v1/waitinglist/admin/{waiting_entry}/', ADMIN),
+    # moderation/urls.py
+    Endpoint('team-list', '/api/v1/moderation/teams/', ADMIN),
+    Endpoint('team-detail', '/api/v1/moderation/teams/{team}/', ADMIN),
+    Endpoint('team-members-list', '/api/v1/moderation/teams/{team}/members/', ADMIN),
+]
+
+
+SUBSCRIPTION_STATUSES = ['active', 'trialing', 'canceled', 'past_due']
+
+
+class DatasetSeeder:
+    """
+    Seeds the benchmark dataset with bulk inserts.
+
+    `setup()` creates the fixed catalogs and the users that make the requests;
+    `grow_to(n)` adds members (and everything that hangs off them) until the
+    dataset holds `n` of them, so the same database can be measured at
+    increasing sizes.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.fixtures = {}
+        self.users = {}
+        self._password = make_password(None)
+
+    def setup(self):
+        admin_role = Role.objects.create(code='bench-admin', name='Admin', is_admin=True)
+        member_role = Role.objects.create(code='bench-member', name='Member')
+        self.users[ADMIN] = self._create_user('bench-admin@nobilis.test', admin_role)
+        self.users[MEMBER] = self._create_user('bench-member@nobilis.test', member_role)
+        self.roles = {ADMIN: admin_role, MEMBER: member_role}
+
+        self.plans = [
+            Plan.objects.create(
+                title=f'Plan {i}', color='gold', price_year='1000', price=1000, description='Plan',
+                stripe_plan_id=f'price_bench_{i}', price_description='yearly', features=[], requirements=[],
+            )
+            for i in range(3)
+        ]
+        self.introduction_types = [
+            IntroductionCatalog.objects.create(title=f'Introduction {i}', cost=0) for i in range(3)
+        ]
+        self.introduction_statuses = [
+            IntroductionStatus.objects.create(status_name=name) for name in ('pending', 'accepted')
+        ]
+        self.qualifications = [
+            InviteeQualificationCatalog.objects.create(name=f'Qualification {i}') for i in range(2)
+        ]
+        self.relationships = [
+            RelationshipCatalog.objects.create(name=name) for name in ('Son', 'Daughter', 'Spouse')
+        ]
+        self.rejection_reasons = [RejectionReason.objects.create(reason='Incomplete')]
+        self.team = Team.objects.create(name='Bench team')
+
+        # The member reads its subscription from the local mirror (fresh, so no Stripe refresh)
+        member_profile = self.users[MEMBER].profile
+        subscription = MembershipSubscription.objects.create(
+            user_profile=member_profile, plan=self.plans[0], stripe_subscription_id='sub_bench_member',
+            status='active', current_period_end=timezone.now() + datetime.timedelta(days=365),
+        )
+        member_profile.stripe_subscription_id = subscription.stripe_subscription_id
+        member_profile.subscription_status = subscription.status
+        member_profile.current_subscription = subscription
+        member_profile.subscription_synced_at = timezone.now()
+        member_profile.card_brand, member_profile.card_last4 = 'visa', '4242'
+        member_profile.save()
+
+        self.fixtures.update({
+            'member_role': member_role.pk,
+            'plan': self.plans[0].pk,
+            'introduction_type': self.introduction_types[0].pk,
+            'introduction_status': self.introduction_statuses[0].pk,
+            'team': self.team.pk,
+        })
+
+    def _create_user(self, email, role):
+        return CustomUser.objects.create(
+            email=email, first_name='Bench', last_name=role.code, role=role, password=self._password
+        )
+
+    def grow_to(self, size):
+        if size <= self.size:
+            return
+        start, stop = self.size, size
+        member = self.users[MEMBER]
+        admin = self.users[ADMIN]
+        now = timezone.now()
+
+        # Users, profiles and shipping addresses (bulk_create skips the post_save signals)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                email=f'member{i}@nobilis.test',
+                first_name=f'Member{i}', last_name=f'Surname{i}',
+                role=self.roles[MEMBER], password=self._password,
+                invited_by=member if i % 10 == 0 else None,
+            )
+            for i in range(start, stop)
+        ])
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=u, alias_title='Founder', city=f'City {i % 50}, Country {i % 7}', often_in='Paris, Rome')
+            for i, u in zip(range(start, stop), users)
+        ])
+        ShippingAddress.objects.bulk_create([ShippingAddress(user=u, name='Home') for u in users])
+
+        # Nested professional and personal data
+        personal = PersonalDetail.objects.bulk_create([
+            PersonalDetail(user_profile=p, hobbies='Golf, Sailing') for p in profiles
+        ])
+        Club.objects.bulk_create([
+            Club(personal_detail=d, name=f'Club {j}', city='London') for d in personal for j in range(2)
+        ])
+        professional = ProfessionalProfile.objects.bulk_create([
+            ProfessionalProfile(user_profile=p, industries='Finance, Energy') for p in profiles
+        ])
+        WorkPosition.objects.bulk_create([
+            WorkPosition(professional_profile=pp, company='ACME', position='CEO', city='NYC',
+                         from_year='2010', to_year='2020')
+            for pp in professional for _ in range(2)
+        ])
+        Education.objects.bulk_create([
+            Education(professional_profile=pp, university_name='MIT', carreer='Economics', city='Boston',
+                      from_year='2000', to_year='2004')
+            for pp in professional
+        ])
+        Expertise.objects.bulk_create([
+            Expertise(user_profile=p, title='Investing', content='Private equity', rate='hourly') for p in profiles
+        ])
+
+        # Subscriptions: one per member, cycling plans and statuses
+        MembershipSubscription.objects.bulk_create([
+            MembershipSubscription(
+                user_profile=p, plan=self.plans[i % len(self.plans)],
+                stripe_subscription_id=f'sub_bench_{i}',
+                status=SUBSCRIPTION_STATUSES[i % len(SUBSCRIPTION_STATUSES)],
+                current_period_end=now + datetime.timedelta(days=30),
+                is_active=SUBSCRIPTION_STATUSES[i % len(SUBSCRIPTION_STATUSES)] in ('active', 'trialing'),
+            )
+            for i, p in zip(range(start, stop), profiles)
+        ])
+
+        # Notifications for the requesting users
+        Notification.objects.bulk_create(
+            [Notification(recipient=member, actor=u, verb='sent you a message') for u in users]
+            + [Notification(recipient=admin, actor=u, verb='joined Nobilis') for u in users]
+        )
+
+        waiting = WaitingList.objects.bulk_create([
+            WaitingList(first_name=f'Applicant{i}', last_name='Doe', email=f'applicant{i}@nobilis.test',
+                        city=f'City {i % 50}, Country {i % 7}', executive=bool(i % 2))
+            for i in range(start, stop)
+        ])
+
+        MemberIntroduction.objects.bulk_create([
+            MemberIntroduction(
+                introduction_type=self.introduction_types[i % len(self.introduction_types)],
+                from_user=member if i % 2 else u, to_user=u if i % 2 else member,
+                topic='Partnership', message='Hello', status=self.introduction_statuses[0],
+            )
+            for i, u in zip(range(start, stop), users)
+        ])
+
+        # Collections that belong to the requesting users grow at a lower rate
+        step = [u for i, u in zip(range(start, stop), users) if i % 10 == 0]
+        MemberReferral.objects.bulk_create([
+            MemberReferral(first_name='Ref', last_name=u.last_name, email=f'ref.{u.email}',
+                           phone_number='555',
+                           invitee_qualification=self.qualifications[0], created_by=member)
+            for u in step
+        ])
+        UserInvitation.objects.bulk_create([
+            UserInvitation(email=f'invite.{u.email}', invited_by=admin, token=f'bench-{u.pk}') for u in step
+        ])
+        Relative.objects.bulk_create([
+            Relative(user=member, first_name='Relative', relationship=self.relationships[0]) for _ in step
+        ])
+        TeamMembership.objects.bulk_create([
+            TeamMembership(user=u, team=self.team, role=self.roles[MEMBER]) for u in step
+        ])
+        ContactMessage.objects.bulk_create([
+            ContactMessage(full_name='Visitor', email=f'visitor.{u.email}', message='Hi') for u in step
+        ])
+        self._grow_member_profile(member, len(step))
+        self._grow_catalogs(start, stop)
+        # bulk_create skips the reindex signals; index the new members explicitly
+        index_members([u.pk for u in users] + [member.pk, admin.pk])
+
+        self.size = size
+        self.fixtures.setdefault('waiting_entry', waiting[0].pk)
+        self.fixtures.setdefault(
+            'introduction', MemberIntroduction.objects.filter(from_user=member).values_list('pk', flat=True).first()
+        )
+        self.fixtures.setdefault(
+            'referral', MemberReferral.objects.filter(created_by=member).values_list('pk', flat=True).first()
+        )
+        self.fixtures.setdefault('support_agent', SupportAgent.objects.values_list('pk', flat=True).first())
+
+    def _grow_member_profile(self, member, count):
+        """Grows every nested list of the requesting member's own profile."""
+        profile = UserProfile.objects.get_or_create(user=member)[0]
+        personal = PersonalDetail.objects.get_or_create(user_profile=profile)[0]
+        professional = ProfessionalProfile.objects.get_or_create(user_profile=profile)[0]
+        Recognition.objects.get_or_create(user_profile=profile)
+        Club.objects.bulk_create([Club(personal_detail=personal, name='Club', city='Rome') for _ in range(count)])
+        for model in (WorkPosition, BoardPosition, NonProfitInvolvement):
+            model.objects.bulk_create([
+                model(professional_profile=professional, company='ACME', position='Chair', city='Rome',
+                      from_year='2015', to_year='2020')
+                for _ in range(count)
+            ])
+        Education.objects.bulk_create([
+            Education(professional_profile=professional, university_name='LSE', carreer='Law', city='London',
+                      from_year='1990', to_year='1994')
+            for _ in range(count)
+        ])
+        Expertise.objects.bulk_create([
+            Expertise(user_profile=profile, title='Advisory', content='Boards', rate='project') for _ in range(count)
+        ])
+        UserVideo.objects.bulk_create([
+            UserVideo(user_profile=profile, video_link='https://videos.nobilis.test/v.mp4') for _ in range(count)
+        ])
+        offset = SocialMediaProfile.objects.filter(user_profile=profile).count()
+        SocialMediaProfile.objects.bulk_create([
+            SocialMediaProfile(user_profile=profile, platform_name=f'network-{offset + i}',
+                               profile_url='https://social.nobilis.test/me')
+            for i in range(count)
+        ])
+
+    def _grow_catalogs(self, start, stop):
+        CityCatalog.objects.bulk_create([
+            CityCatalog(name=f'City {i}', country=f'Country {i % 7}') for i in range(start, stop)
+        ])
+        step = range(start, stop, 10)
+        LanguageCatalog.objects.bulk_create([LanguageCatalog(name=f'Language {i}') for i in step])
+        IndustryCatalog.objects.bulk_create([IndustryCatalog(name=f'Industry {i}') for i in step])
+        ProfessionalInterestCatalog.objects.bulk_create([ProfessionalInterestCatalog(name=f'Interest {i}') for i in step])
+        HobbyCatalog.objects.bulk_create([HobbyCatalog(name=f'Hobby {i}') for i in step])
+        ClubCatalog.objects.bulk_create([ClubCatalog(name=f'Club {i}', city='Madrid') for i in step])
+        RateExpertise.objects.bulk_create([RateExpertise(name=f'rate-{i}') for i in step])
+        PartnerType.objects.bulk_create([PartnerType(name=f'Partner {i}') for i in step])
+        SupportAgent.objects.bulk_create([
+            SupportAgent(name=f'Agent {i}', email=f'agent{i}@nobilis.test', phone_number='555') for i in step
+        ])
+
+
+def _client_for(actor, seeder):
+    client = APIClient()
+    if actor != ANON:
+        client.force_authenticate(seeder.users[actor])
+    return client
+
+
+def run_endpoints(seeder, endpoints=None):
+    """
+    Requests every endpoint once to warm up (content types, lazy settings...) and
+    once measured. Returns {name: {status, queries, time_ms, bytes}}.
+    """
+    results = {}
+    for endpoint in endpoints or ENDPOINTS:
+        client = _client_for(endpoint.actor, seeder)
+        path = endpoint.path.format(**seeder.fixtures)
+        # The cache also backs the throttles; start every request from the same state
+        cache.clear()
+        client.get(path)
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = client.get(path)
+            elapsed = time.perf_counter() - started
+        content = b''.join(response) if getattr(response, 'streaming', False) else response.content
+        results[endpoint.name] = {
+            'path': path,
+            'actor': endpoint.actor,
+            'status': response.status_code,
+            'queries': len(ctx.captured_queries),
+            'time_ms': round(elapsed * 1000, 2),
+            'bytes': len(content),
+        }
+    return results
+
+
+def run_benchmark(scales, endpoints=None):
+    """
+    Seeds the dataset at each size in `scales` (ascending) and measures all
+    endpoints at each step. Returns the JSON-serializable report.
+    """
+    seeder = DatasetSeeder()
+    seeder.setup()
+    runs = []
+    for scale in sorted(scales):
+        seeder.grow_to(scale)
+        runs.append({'scale': scale, 'results': run_endpoints(seeder, endpoints)})
+    report = {
+        'generated_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'scales': [run['scale'] for run in runs],
+        'endpoints': {},
+    }
+    for run in runs:
+        for name, result in run['results'].items():
+            entry = report['endpoints'].setdefault(name, {'path': result['path'], 'actor': result['actor'], 'runs': []})
+            entry['runs'].append({'scale': run['scale'], **{k: result[k] for k in ('status', 'queries', 'time_ms', 'bytes')}})
+    report['regressions'] = find_regressions(report)
+    return report
+
+
+def find_regressions(report):
+    """
+    Endpoints whose query count grows with the dataset size, or that fail with
+    a server error at any size.
+    """
+    regressions = []
+    for name, entry in report['endpoints'].items():
+        queries = [run['queries'] for run in entry['runs']]
+        statuses = [run['status'] for run in entry['runs']]
+        if any(s >= 500 for s in statuses):
+            regressions.append({'endpoint': name, 'reason': 'server error', 'statuses': statuses})
+        elif max(queries) > queries[0]:
+            regressions.append({'endpoint': name, 'reason': 'query count grows with dataset', 'queries': queries})
+    return regressions
+
+
+# Large payloads the camelCase renderer/parser spend the most time on
+CAMEL_CASE_ENDPOINTS = ('city-list', 'members-list', 'full-profile', 'user-search', 'waitinglist-admin-list')
+
+
+def _throughput(func, payload, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(payload)
+    elapsed = time.perf_counter() - started
+    return iterations / elapsed if elapsed else float('inf')
+
+
+def run_camel_case_benchmark(scale, iterations=50, endpoints=CAMEL_CASE_ENDPOINTS):
+    """
+    Seeds the dataset at `scale`, takes the `response.data` of each endpoint and
+    renders / parses it `iterations` times with djangorestframework_camel_case
+    and with api.camel_case. Returns {name: {bytes, same_output, render/parse: {library, ours, speedup}}}
+    with throughputs in operations per second.
+    """
+    seeder = DatasetSeeder()
+    seeder.setup()
+    seeder.grow_to(scale)
+    by_name = {endpoint.name: endpoint for endpoint in ENDPOINTS}
+    renderers = {'library': LibraryJSONRenderer(), 'ours': CamelCaseJSONRenderer()}
+    parsers = {'library': LibraryJSONParser(), 'ours': CamelCaseJSONParser()}
+
+    results = {}
+    for name in endpoints:
+        endpoint = by_name[name]
+        cache.clear()
+        response = _client_for(endpoint.actor, seeder).get(endpoint.path.format(**seeder.fixtures))
+        data = getattr(response, 'data', None)
+        if data is None:
+            continue
+        body = renderers['library'].render(data)
+        result = {
+            'bytes': len(body),
+            'same_output': (
+                renderers['ours'].render(data) == body
+                and parsers['ours'].parse(io.BytesIO(body)) == parsers['library'].parse(io.BytesIO(body))
+            ),
+        }
+        for step, ops in (
+            ('render', {label: renderer.render for label, renderer in renderers.items()}),
+            ('parse', {label: (lambda raw, parser=parser: parser.parse(io.BytesIO(raw))) for label, parser in parsers.items()}),
+        ):
+            payload = data if step == 'render' else body
+            timings = {label: round(_throughput(op, payload, iterations), 1) for label, op in ops.items()}
+            timings['speedup'] = round(timings['ours'] / timings['library'], 2)
+            result[step] = timings
+        results[name] = result
+    return results
@@ -0,0 +1,180 @@
+"""
+Renderer, parsers y middleware camelCase (reemplazo de djangorestframework_camel_case).
+
+La librería recorre cada respuesta con camelize() y aplica la regex a cada
+clave en cada objeto, y en cada petición underscoreize() vuelve a compilar su
+regex por clave. Aquí la traducción de claves se memoriza en un LRU acotado
+(las claves vienen de un conjunto pequeño de serializers; el límite protege de
+payloads con claves arbitrarias), la de la tupla de claves de un dict también,
+y el recorrido construye dicts simples que luego codifica el encoder en C de
+json. En listas de dicts planos (catálogos, listados de miembros) cada fila se
+reconstruye con dict(zip(...)) sin volver a recorrer sus valores.
+
+La salida es idéntica a la de la librería (mismas regex, mismas opciones de
+JSON_CAMEL_CASE['JSON_UNDERSCOREIZE']). Con ignore_fields/ignore_keys
+configurados se usa la implementación de la librería.
+
+`manage.py benchmark_camel_case` compara ambas sobre respuestas reales.
+"""
+import datetime
+import decimal
+import json
+import re
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import QueryDict
+from django.http.multipartparser import MultiPartParser as DjangoMultiPartParser, MultiPartParserError
+from django.utils.datastructures import MultiValueDict
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from djangorestframework_camel_case import util
+from djangorestframework_camel_case.settings import api_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+
+KEY_CACHE_SIZE = 4096
+
+_OPTIONS = api_settings.JSON_UNDERSCOREIZE
+_USE_LIBRARY = bool(_OPTIONS.get('ignore_fields') or _OPTIONS.get('ignore_keys'))
+_UNDERSCORE_RE = util.get_underscoreize_re(_OPTIONS)
+
+# Valores sin claves adentro: se copian tal cual (el encoder de DRF sabe serializarlos)
+_SCALARS = frozenset((
+    str, int, float, bool, type(None),
+    decimal.Decimal, datetime.datetime, datetime.date, datetime.time, datetime.timedelta, uuid.UUID,
+))
+
+
+# --- Claves ---
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def camel_key(key):
+    if isinstance(key, Promise):
+        key = force_str(key)
+    if isinstance(key, str) and '_' in key:
+        return re.sub(util.camelize_re, util.underscore_to_camel, key)
+    return key
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def underscore_key(key):
+    if isinstance(key, str):
+        return _UNDERSCORE_RE.sub(r'\1_\2', key).lower()
+    return key
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def _camel_keys(keys):
+    return tuple(map(camel_key, keys))
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def _underscore_keys(keys):
+    return tuple(map(underscore_key, keys))
+
+
+# --- Recorrido ---
+
+def _translate(data, keys_for):
+    if type(data) in _SCALARS:
+        return data
+    if isinstance(data, dict):
+        return dict(zip(keys_for(tuple(data)), [_translate(value, keys_for) for value in data.values()]))
+    if isinstance(data, (list, tuple)):
+        return _translate_list(data, keys_for)
+    if isinstance(data, Promise):
+        return force_str(data)
+    if isinstance(data, (str, bytes, bytearray)) or not hasattr(data, '__iter__'):
+        return data
+    return _translate_list(list(data), keys_for)
+
+
+def _translate_list(items, keys_for):
+    result = []
+    append = result.append
+    for item in items:
+        if isinstance(item, dict):
+            values = item.values()
+            if _SCALARS.issuperset(map(type, values)):
+                # Fila plana: solo cambian las claves
+                append(dict(zip(keys_for(tuple(item)), values)))
+                continue
+        append(_translate(item, keys_for))
+    return result
+
+
+def camelize(data):
+    """ Como djangorestframework_camel_case.util.camelize(), devolviendo dicts simples. """
+    if _USE_LIBRARY:
+        return util.camelize(data, **_OPTIONS)
+    return _translate(data, _camel_keys)
+
+
+def underscoreize(data):
+    """ Como djangorestframework_camel_case.util.underscoreize(). """
+    if _USE_LIBRARY:
+        return util.underscoreize(data, **_OPTIONS)
+    if isinstance(data, MultiValueDict):
+        # QueryDict (formularios, query string) y MultiValueDict (archivos)
+        translated = QueryDict(mutable=True) if isinstance(data, QueryDict) else MultiValueDict()
+        for key, values in data.lists():
+            translated.setlist(underscore_key(key), values)
+        return translated
+    return _translate(data, _underscore_keys)
+
+
+# --- Clases para REST_FRAMEWORK ---
+
+class CamelCaseJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(camelize(data), accepted_media_type, renderer_context)
+
+
+class CamelCaseJSONParser(JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = json.loads(stream.read().decode(encoding))
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+        return underscoreize(data)
+
+
+class CamelCaseFormParser(FormParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return underscoreize(super().parse(stream, media_type, parser_context))
+
+
+class CamelCaseMultiPartParser(MultiPartParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context['request']
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta['CONTENT_TYPE'] = media_type
+        try:
+            data, files = DjangoMultiPartParser(meta, stream, request.upload_handlers, encoding).parse()
+        except MultiPartParserError as exc:
+            raise ParseError('Multipart form parse error - %s' % str(exc))
+        return DataAndFiles(underscoreize(data), underscoreize(files))
+
+
+class CamelCaseMiddleware:
+    """ Pasa a snake_case los parámetros del query string; si ya lo están no copia el QueryDict. """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        keys = tuple(request.GET)
+        if keys and _underscore_keys(keys) != keys:
+            request.GET = underscoreize(request.GET)
+        return self.get_response(request)
@@ -0,0 +1,93 @@
+"""
+Caché de los catálogos públicos (ciudades, idiomas, industrias, hobbies, ...).
+
+Cada catálogo tiene una versión (timestamp del último cambio) guardada en la
+caché de Django; los signals de save/delete la renuevan (ver api.signals), lo
+que invalida todas las búsquedas cacheadas de ese catálogo. La respuesta lleva
+un ETag fuerte (hash del contenido) y Last-Modified (la versión), así el
+cliente puede revalidar y recibir 304 sin cuerpo.
+
+Con la caché local (LocMem) cada proceso tiene su copia: CATALOG_CACHE_TIMEOUT
+acota cuánto puede tardar en verse un cambio hecho desde otro proceso o con
+queryset.update()/bulk_create, que no disparan signals.
+"""
+import hashlib
+import json
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def _version_key(catalog):
+    return f'catalog:{catalog}:version'
+
+
+def catalog_version(catalog):
+    key = _version_key(catalog)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_catalog(catalog):
+    """ Renueva la versión del catálogo; las entradas anteriores quedan huérfanas. """
+    key = _version_key(catalog)
+    previous = cache.get(key) or 0
+    # Siempre creciente, aunque dos cambios caigan en el mismo instante
+    cache.set(key, max(time.time(), previous + 0.001), None)
+
+
+def _query_fingerprint(request):
+    params = []
+    for name, values in sorted(request.query_params.lists()):
+        if name == 'search':
+            values = [v.strip().lower() for v in values]
+        params.append((name, values))
+    return hashlib.sha1(urlencode(params, doseq=True).encode()).hexdigest()
+
+
+def catalog_response(request, catalog, build):
+    """
+    Devuelve la respuesta del catálogo desde caché (o la construye con
+    `build()`), con ETag/Last-Modified y 304 si el cliente ya la tiene.
+    """
+    version = catalog_version(catalog)
+    key = f'catalog:{catalog}:{version!r}:{_query_fingerprint(request)}'
+    entry = cache.get(key)
+    if entry is None:
+        data = build()
+        body = json.dumps(data, sort_keys=True, default=str).encode()
+        entry = (data, '"%s"' % hashlib.sha1(body).hexdigest())
+        cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+    data, etag = entry
+
+    last_modified = int(version)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Siempre revalidar; el 304 evita reenviar el cuerpo
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CachedCatalogMixin:
+    """
+    Para ListAPIView de catálogos: `catalog` nombra el catálogo e
+    `build_catalog()` produce los datos sin caché (por defecto, el list de DRF).
+    """
+    catalog = None
+
+    def build_catalog(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+    def list(self, request, *args, **kwargs):
+        return catalog_response(request, self.catalog, lambda: self.build_catalog(request, *args, **kwargs))
@@ -0,0 +1,152 @@
+"""
+Índice en memoria para el autocompletado de ciudades.
+
+Los nombres y países se normalizan (sin acentos, minúsculas, solo letras y
+dígitos) y se indexan de dos formas:
+  - una lista ordenada de palabras para búsquedas por prefijo (bisect),
+  - un índice invertido de trigramas para coincidencias aproximadas.
+
+El índice se construye en la primera búsqueda de cada proceso y se reconstruye
+cuando cambia la versión del catálogo 'city' (ver api.catalog_cache, la renuevan
+los signals de CityCatalog).
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+from api.catalog_cache import catalog_version
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+# Calidad de la coincidencia: menor es mejor
+EXACT, NAME_PREFIX, WORD_PREFIX, COUNTRY_PREFIX, ALL_TOKENS, FUZZY = range(6)
+MIN_SIMILARITY = 0.3
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CityIndex:
+
+    def __init__(self, cities):
+        """ `cities`: iterable de objetos con name, country (CityCatalog). """
+        self.labels = []       # lo que devuelve la API ("Name, Country")
+        self.names = []        # nombre normalizado
+        self.countries = []    # país normalizado
+        self.gram_counts = []  # nº de trigramas del nombre
+        self.grams = defaultdict(list)
+        words = []
+
+        for i, city in enumerate(cities):
+            name, country = normalize(city.name), normalize(city.country)
+            self.labels.append(f'{city.name}, {city.country}')
+            self.names.append(name)
+            self.countries.append(country)
+            for word in set(name.split()) | set(country.split()):
+                words.append((word, i))
+            grams = trigrams(name)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.grams[gram].append(i)
+
+        words.sort()
+        self.words = [w for w, _ in words]
+        self.word_ids = [i for _, i in words]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _rank(self, i, query, tokens):
+        name = self.names[i]
+        if name == query:
+            return EXACT
+        if name.startswith(query):
+            return NAME_PREFIX
+        if f' {query}' in f' {name}':
+            return WORD_PREFIX
+        if self.countries[i].startswith(query):
+            return COUNTRY_PREFIX
+        words = f'{name} {self.countries[i]}'.split()
+        if all(any(w.startswith(t) for w in words) for t in tokens):
+            return ALL_TOKENS
+        return None
+
+    def search(self, query, limit=None, budget_ms=None):
+        """
+        Devuelve hasta `limit` etiquetas ordenadas por calidad de coincidencia.
+        Si se agota `budget_ms` se devuelve lo mejor encontrado hasta entonces.
+        """
+        limit = limit or settings.CITY_AUTOCOMPLETE_LIMIT
+        budget_ms = settings.CITY_AUTOCOMPLETE_BUDGET_MS if budget_ms is None else budget_ms
+        deadline = time.perf_counter() + budget_ms / 1000.0
+
+        query = normalize(query)
+        if not query:
+            return []
+        tokens = query.split()
+        scores = {}
+
+        # 1. Prefijo sobre la palabra más larga de la consulta (la más selectiva)
+        anchor = max(tokens, key=len)
+        pos = bisect_left(self.words, anchor)
+        while pos < len(self.words) and self.words[pos].startswith(anchor):
+            i = self.word_ids[pos]
+            pos += 1
+            if i in scores:
+                continue
+            rank = self._rank(i, query, tokens)
+            if rank is not None:
+                scores[i] = rank
+            if not pos % 256 and time.perf_counter() > deadline:
+                break
+
+        # 2. Trigramas para errores de tipeo, solo si faltan resultados
+        if len(scores) < limit and len(query) >= 3 and time.perf_counter() <= deadline:
+            query_grams = trigrams(query)
+            shared = defaultdict(int)
+            for gram in query_grams:
+                for i in self.grams.get(gram, ()):
+                    shared[i] += 1
+                if time.perf_counter() > deadline:
+                    break
+            for i, common in shared.items():
+                if i in scores:
+                    continue
+                similarity = common / (len(query_grams) + self.gram_counts[i] - common)
+                if similarity >= MIN_SIMILARITY:
+                    scores[i] = FUZZY + (1 - similarity)
+
+        best = sorted(scores, key=lambda i: (scores[i], len(self.names[i]), self.names[i]))[:limit]
+        return [self.labels[i] for i in best]
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_city_index():
+    """ Índice del proceso, reconstruido si el catálogo cambió desde la última vez. """
+    global _index, _index_version
+    from api.models import CityCatalog
+
+    version = catalog_version('city')
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                cities = CityCatalog.objects.only('name', 'country').order_by('name').iterator(chunk_size=2000)
+                _index, _index_version = CityIndex(cities), version
+    return _index
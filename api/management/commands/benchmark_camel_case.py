@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.benchmarks import run_camel_case_benchmark
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic member base and measures how many times per second the camelCase JSON "
+        "renderer and parser of api.camel_case and of djangorestframework_camel_case process the "
+        "responses of the largest endpoints. The seeded rows are rolled back at the end. Fails if "
+        "both implementations do not produce the same output."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=500, help='Dataset size (number of members).')
+        parser.add_argument('--iterations', type=int, default=50, help='Renders/parses per payload.')
+        parser.add_argument('--output', help='Optional path of a JSON report.')
+
+    def handle(self, *args, **options):
+        results = None
+        try:
+            with transaction.atomic():
+                results = run_camel_case_benchmark(options['scale'], options['iterations'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2, sort_keys=True)
+
+        for name, result in results.items():
+            render, parse = result['render'], result['parse']
+            self.stdout.write(
+                f"{name:25} {result['bytes']:>9}B  "
+                f"render {render['library']:>8}/s -> {render['ours']:>8}/s (x{render['speedup']})  "
+                f"parse {parse['library']:>8}/s -> {parse['ours']:>8}/s (x{parse['speedup']})"
+            )
+
+        mismatched = [name for name, result in results.items() if not result['same_output']]
+        if mismatched:
+            raise CommandError(f"Output differs from djangorestframework_camel_case: {', '.join(mismatched)}")
+        self.stdout.write(self.style.SUCCESS('Same output as djangorestframework_camel_case.'))
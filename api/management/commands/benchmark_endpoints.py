@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.benchmarks import run_benchmark
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic member base at increasing sizes, measures query count, wall time and "
+        "response size of every GET endpoint and writes a JSON report. The seeded rows are rolled "
+        "back at the end. Fails if an endpoint's query count grows with the dataset size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', type=int, default=[200, 2000],
+                            help='Dataset sizes (number of members) to measure at.')
+        parser.add_argument('--output', default='bench_output.json', help='Path of the JSON report.')
+        parser.add_argument('--keep-data', action='store_true', help='Commit the seeded rows instead of rolling back.')
+
+    def handle(self, *args, **options):
+        report = None
+        try:
+            with transaction.atomic():
+                report = run_benchmark(options['scales'])
+                if not options['keep_data']:
+                    raise _Rollback()
+        except _Rollback:
+            pass
+
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+
+        for name, entry in sorted(report['endpoints'].items()):
+            runs = ' | '.join(
+                f"n={run['scale']}: {run['status']} {run['queries']}q {run['time_ms']}ms {run['bytes']}B"
+                for run in entry['runs']
+            )
+            self.stdout.write(f"{name:40} {runs}")
+        self.stdout.write(f"Report written to {options['output']}")
+
+        if report['regressions']:
+            for regression in report['regressions']:
+                self.stderr.write(json.dumps(regression))
+            raise CommandError(f"{len(report['regressions'])} endpoint(s) regressed.")
+        self.stdout.write(self.style.SUCCESS('No query-count regressions.'))
@@ -13,8 +13,10 @@ from .models import (
     PartnershipEnquery,
     PartnerType
 )
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from nsocial.models import UserProfile, CustomUser, Role
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenObtainSerializer
+from nsocial.models import Role
+from nsocial.emails import email_status
+from nsocial.tokens import issue_tokens
 
 
 class CityListSerializer(serializers.BaseSerializer):
@@ -108,27 +110,10 @@ class ProfileHobbiesUpdateSerializer(serializers.Serializer):
 
 class TokenWithSubscriptionSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
-        data = super().validate(attrs)
-        user = self.user
-        # Get cached subscription details from the user's profile (if exists)
-        try:
-            profile = UserProfile.objects.get(user=user)
-            if profile.stripe_subscription_id:
-                data['subscription'] = {
-                    'id': profile.stripe_subscription_id,
-                    'status': profile.subscription_status,
-                    'current_period_end': profile.subscription_current_period_end,
-                    'cancel_at_period_end': profile.cancel_at_period_end,
-                    'card': (
-                        {'brand': profile.card_brand, 'last4': profile.card_last4}
-                        if profile.card_last4 else None
-                    )
-                }
-            else:
-                data['subscription'] = None
-        except UserProfile.DoesNotExist:
-            data['subscription'] = None
-        return data
+        # Autenticación de simplejwt; los tokens (y la suscripción cacheada del perfil)
+        # los emite nsocial.tokens, igual que al activar la cuenta o restablecer la contraseña
+        TokenObtainSerializer.validate(self, attrs)
+        return issue_tokens(self.user)
 
 
 class InviteUserSerializer(serializers.Serializer):
@@ -151,7 +136,7 @@ class InviteUserSerializer(serializers.Serializer):
         """
         Comprueba que no exista ya un usuario con el mismo correo electrónico.
         """
-        if CustomUser.objects.filter(email=value).exists():
+        if email_status(value, cached=False).has_user:
             raise serializers.ValidationError("Un usuario con este correo electrónico ya existe.")
         return value
 
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_save, post_delete
+
+from api.catalog_cache import invalidate_catalog
+from api.models import (
+    CityCatalog,
+    LanguageCatalog,
+    RelationshipCatalog,
+    IndustryCatalog,
+    ProfessionalInterestCatalog,
+    HobbyCatalog,
+    ClubCatalog,
+    RateExpertise,
+    PartnerType,
+)
+
+# Modelo -> nombre del catálogo cacheado (ver api.catalog_cache)
+CATALOG_MODELS = {
+    CityCatalog: 'city',
+    LanguageCatalog: 'language',
+    RelationshipCatalog: 'relationship',
+    IndustryCatalog: 'industry',
+    ProfessionalInterestCatalog: 'professional_interest',
+    HobbyCatalog: 'hobby',
+    ClubCatalog: 'club',
+    RateExpertise: 'rate_expertise',
+    PartnerType: 'partner_type',
+}
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    invalidate_catalog(CATALOG_MODELS[sender])
+
+
+for _model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_cache, sender=_model, dispatch_uid=f'catalog_cache_save_{_model.__name__}')
+    post_delete.connect(invalidate_catalog_cache, sender=_model, dispatch_uid=f'catalog_cache_delete_{_model.__name__}')
@@ -0,0 +1,214 @@
+"""
+Respuestas generadas por partes para exportaciones y listados grandes.
+
+Las filas se leen con queryset.iterator() y se escriben a medida que se envían,
+así la memoria no crece con el número de filas. Las partes se agrupan en
+bloques de STREAM_BUFFER_SIZE caracteres. Con ASGI se entregan como iterador
+asíncrono: a un iterador síncrono Django lo consume entero (list()) antes de
+enviar el primer byte.
+
+Los listados con StreamingListMixin eligen el formato por negociación de
+contenido:
+- Accept: application/x-ndjson (o ?format=ndjson): un objeto JSON por línea.
+- Accept: application/json; stream=true: un array JSON con todas las filas.
+- Cualquier otro: la respuesta habitual (paginada o desde la caché del catálogo).
+Las filas llevan las claves en camelCase, igual que las respuestas JSON.
+"""
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_header_parameters
+from rest_framework.compat import SHORT_SEPARATORS, LONG_SEPARATORS
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.camel_case import camelize
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+STREAM_FORMATS = ('json', 'ndjson')
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+STREAM_BUFFER_SIZE = 64 * 1024
+STREAM_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """ Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla. """
+
+    def write(self, value):
+        return value
+
+
+def _buffered(pieces, size=STREAM_BUFFER_SIZE):
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def _async_chunks(chunks):
+    # next() en el hilo de la vista (thread_sensitive): el cursor del iterator() vive ahí
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _is_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def _streaming_response(pieces, content_type, request=None):
+    chunks = _buffered(pieces)
+    if request is not None and _is_asgi(request):
+        chunks = _async_chunks(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+def _attachment(response, filename):
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def csv_response(columns, rows, filename=None, request=None):
+    """ `rows`: iterable de secuencias en el orden de `columns`. """
+    writer = csv.writer(_Echo())
+
+    def stream():
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    return _attachment(_streaming_response(stream(), 'text/csv', request), filename)
+
+
+def ndjson_response(records, filename=None, request=None):
+    """ `records`: iterable de dicts; un objeto JSON por línea. """
+    encoder = DjangoJSONEncoder()
+
+    def stream():
+        for record in records:
+            yield encoder.encode(record) + '\n'
+
+    return _attachment(_streaming_response(stream(), NDJSON_MEDIA_TYPE, request), filename)
+
+
+def export_response(export_format, columns, rows, filename, request=None):
+    """ CSV o NDJSON (`filename` sin extensión) a partir de filas en el orden de `columns`. """
+    if export_format == 'ndjson':
+        return ndjson_response((dict(zip(columns, row)) for row in rows), f'{filename}.ndjson', request)
+    return csv_response(columns, rows, f'{filename}.csv', request)
+
+
+# --- Listados por streaming ---
+
+def _encode_record(encoder):
+    # Mismo formato que el JSONRenderer de DRF (camelCase, separadores, \u2028/\u2029 escapados)
+    def encode(record):
+        return encoder.encode(camelize(record)).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+    return encode
+
+
+def _json_encoder():
+    return JSONEncoder(
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=SHORT_SEPARATORS if api_settings.COMPACT_JSON else LONG_SEPARATORS,
+    )
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Hace que la negociación acepte application/x-ndjson. Los listados se
+    envían con stream_response(); este renderer solo escribe las respuestas
+    que no son streams (errores de validación, 403, ...).
+    """
+    media_type = NDJSON_MEDIA_TYPE
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        encode = _encode_record(_json_encoder())
+        records = data if isinstance(data, list) else [data]
+        return ''.join(encode(record) + '\n' for record in records).encode()
+
+
+def stream_format(request):
+    """ 'ndjson', 'json' o None según lo negociado por DRF para `request`. """
+    if isinstance(getattr(request, 'accepted_renderer', None), NDJSONRenderer):
+        return 'ndjson'
+    _, params = parse_header_parameters(getattr(request, 'accepted_media_type', None) or '')
+    if params.get('stream', '').lower() in ('1', 'true'):
+        return 'json'
+    return None
+
+
+def stream_response(request, stream_format, records):
+    """ Array JSON o NDJSON con `records` (iterable de datos serializados), generado por partes. """
+    encode = _encode_record(_json_encoder())
+
+    if stream_format == 'ndjson':
+        pieces = (encode(record) + '\n' for record in records)
+        content_type = NDJSON_MEDIA_TYPE
+    else:
+        def array():
+            yield '['
+            separator = ''
+            for record in records:
+                yield separator + encode(record)
+                separator = ','
+            yield ']'
+        pieces = array()
+        content_type = 'application/json'
+
+    response = _streaming_response(pieces, content_type, request)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+class StreamingListMixin:
+    """
+    Para vistas de listado: si el cliente pide un stream (ver stream_format())
+    se envía la lista completa, filtrada y sin paginar, leyendo el queryset con
+    iterator(chunk_size=stream_chunk_size). `stream_records()` produce cada
+    fila (por defecto con el serializer de la vista); las vistas que
+    sobrescriben list() llaman a `stream_list()`.
+    """
+    stream_chunk_size = STREAM_CHUNK_SIZE
+
+    def get_renderers(self):
+        return [*super().get_renderers(), NDJSONRenderer()]
+
+    def stream_records(self, queryset):
+        serializer = self.get_serializer()
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            yield serializer.to_representation(instance)
+
+    def stream_list(self, request, queryset):
+        """ La respuesta por streaming si se pidió, si no None. """
+        negotiated = stream_format(request)
+        if negotiated is None:
+            return None
+        return stream_response(request, negotiated, self.stream_records(queryset))
+
+    def list(self, request, *args, **kwargs):
+        response = self.stream_list(request, self.filter_queryset(self.get_queryset()))
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return response
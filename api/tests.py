@@ -1,3 +1,128 @@
-from django.test import TestCase
+import json
+from collections import namedtuple
 
-# Create your tests here.
+from django.http import QueryDict
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from django.utils.translation import gettext_lazy
+from djangorestframework_camel_case import util
+
+from api import camel_case
+from api.benchmarks import run_benchmark, run_camel_case_benchmark
+from api.city_index import CityIndex
+from api.models import CityCatalog, HobbyCatalog
+from api.streaming import STREAM_CHUNK_SIZE
+
+
+class EndpointQueryCountTests(TestCase):
+    """
+    Measures every GET endpoint at two dataset sizes; the query count of each
+    one must not grow with the number of members (no N+1).
+    """
+
+    def test_query_count_does_not_grow_with_dataset(self):
+        report = run_benchmark([20, 60])
+        self.assertEqual(report['regressions'], [], msg=report['regressions'])
+
+    def test_report_covers_every_endpoint(self):
+        report = run_benchmark([5])
+        for name, entry in report['endpoints'].items():
+            run = entry['runs'][0]
+            self.assertLess(run['status'], 500, msg=name)
+            self.assertGreater(run['bytes'], 0, msg=name)
+
+
+class CamelCaseTests(TestCase):
+
+    def test_same_output_as_library(self):
+        data = {
+            'first_name': gettext_lazy('Ann'), 'items': [{'is_active': True, 'sub_items': ({'x_1': 1},)}],
+            1: 'int key', 'rows': [{'city_name': 'Rome', 'country_code': 'IT'}] * 3,
+        }
+        self.assertEqual(
+            camel_case.CamelCaseJSONRenderer().render(data),
+            camel_case.JSONRenderer().render(util.camelize(data)),
+        )
+        query = QueryDict('userId=1&userId=2&search=a')
+        self.assertEqual(dict(camel_case.underscoreize(query).lists()), dict(util.underscoreize(query).lists()))
+
+    def test_benchmark_matches_library_on_real_payloads(self):
+        results = run_camel_case_benchmark(10, iterations=1)
+        self.assertIn('full-profile', results)
+        for name, result in results.items():
+            self.assertTrue(result['same_output'], msg=name)
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        HobbyCatalog.objects.create(name='Sailing')
+
+    def test_etag_revalidation_returns_304(self):
+        first = self.client.get('/api/v1/catalog/hobbies/')
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/v1/catalog/hobbies/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_save_invalidates_catalog(self):
+        first = self.client.get('/api/v1/catalog/hobbies/')
+        HobbyCatalog.objects.create(name='Polo')
+        second = self.client.get('/api/v1/catalog/hobbies/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), ['Polo', 'Sailing'])
+
+
+class StreamingListTests(TestCase):
+    URL = '/api/v1/cities/'
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        CityCatalog.objects.bulk_create([CityCatalog(name=f'City {i:04}', country='Peru') for i in range(STREAM_CHUNK_SIZE + 5)])
+        self.expected = self.client.get(self.URL).json()
+
+    def test_negotiates_json_array_or_ndjson(self):
+        response = self.client.get(self.URL, HTTP_ACCEPT='application/json; stream=true')
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), self.expected)
+
+        response = self.client.get(self.URL, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected)
+
+    def test_search_limit_is_clamped(self):
+        for limit, expected in (('0', 1), ('-3', 1), ('500', 100)):
+            self.assertEqual(len(self.client.get(self.URL, {'search': 'city', 'limit': limit}).json()), expected)
+
+    async def test_asgi_streams_asynchronously(self):
+        response = await AsyncClient().get(self.URL, headers={'Accept': 'application/x-ndjson'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), len(self.expected))
+
+
+class CityIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        City = namedtuple('City', 'name country')
+        self.index = CityIndex([
+            City('São Paulo', 'Brazil'), City('Paris', 'France'), City('Paris', 'United States'),
+            City('Parma', 'Italy'), City('Le Paris', 'Canada'), City('Asunción', 'Paraguay'),
+        ])
+
+    def test_accent_folded_prefix(self):
+        self.assertEqual(self.index.search('sao p', limit=5), ['São Paulo, Brazil'])
+        self.assertEqual(self.index.search('ASUNCION', limit=5), ['Asunción, Paraguay'])
+
+    def test_ranking_and_limit(self):
+        self.assertEqual(
+            self.index.search('par', limit=10),
+            ['Paris, France', 'Paris, United States', 'Parma, Italy', 'Le Paris, Canada', 'Asunción, Paraguay'],
+        )
+        self.assertEqual(len(self.index.search('par', limit=2)), 2)
+
+    def test_typo_tolerance(self):
+        self.assertEqual(self.index.search('pariss', limit=2), ['Paris, France', 'Paris, United States'])
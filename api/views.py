@@ -39,25 +39,30 @@ from .serializers import (
     PartnerTypeSerializer,
     PartnershipEnquerySerializer
 )
-from nsocial.models import ProfessionalProfile, UserProfile, PersonalDetail, CustomUser
+from nsocial.models import ProfessionalProfile, PersonalDetail, CustomUser
 from moderation.models import (
     TeamMembership, Team, ModeratorInvitation, ModeratorProfile
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.db import transaction
 from django.conf import settings
-from django.core.mail import send_mail
+from notification.mail import queue_mail
 from moderation.views import IsAdminRole
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 from django.http import HttpResponse
 from django.views import View
+from api.catalog_cache import CachedCatalogMixin, catalog_response
+from api.city_index import get_city_index
+from api.streaming import StreamingListMixin
+from nsocial.loaders import request_profile
 
 
 class TokenObtainPairWithSubscriptionView(TokenObtainPairView):
     serializer_class = TokenWithSubscriptionSerializer
 
 
-class CityListView(ListAPIView):
+class CityListView(StreamingListMixin, CachedCatalogMixin, ListAPIView):
+    catalog = 'city'
     queryset = CityCatalog.objects.all().order_by('name')
     serializer_class = CityListSerializer
     filter_backends = (SearchFilter,)
@@ -66,8 +71,25 @@ class CityListView(ListAPIView):
     permintion_classes = [permissions.AllowAny]
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
-
-class LanguageListView(ListAPIView):
+    def build_catalog(self, request, *args, **kwargs):
+        # Autocompletado: ?search= usa el índice en memoria (top N por calidad de coincidencia)
+        term = request.query_params.get('search', '').strip()
+        if not term:
+            return super().build_catalog(request, *args, **kwargs)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit')), 100))
+        except (TypeError, ValueError):
+            limit = None
+        return get_city_index().search(term, limit=limit)
+
+    def stream_records(self, queryset):
+        # Lo mismo que CityListSerializer, sin instanciar modelos
+        for name, country in queryset.values_list('name', 'country').iterator(chunk_size=self.stream_chunk_size):
+            yield f"{name}, {country}"
+
+
+class LanguageListView(CachedCatalogMixin, ListAPIView):
+    catalog = 'language'
     queryset = LanguageCatalog.objects.all()
     serializer_class = LanguageSerializer
 
@@ -78,7 +100,8 @@ class LanguageListView(ListAPIView):
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
 
-class RelationshipCatalogListView(ListAPIView):
+class RelationshipCatalogListView(CachedCatalogMixin, ListAPIView):
+    catalog = 'relationship'
     queryset = RelationshipCatalog.objects.all().order_by('name')
     serializer_class = RelationshipCatalogSerializer
     filter_backends = [SearchFilter]
@@ -95,7 +118,7 @@ class RelativeListCreateView(ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        qs = Relative.objects.all().order_by('-created_at')
+        qs = Relative.objects.select_related('relationship').order_by('-created_at')
         if getattr(user, 'is_admin', False):
             return qs
         return qs.filter(user=user)
@@ -111,7 +134,7 @@ class RelativeDetailView(RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        qs = Relative.objects.all()
+        qs = Relative.objects.select_related('relationship')
         if getattr(user, 'is_admin', False):
             return qs
         return qs.filter(user=user)
@@ -133,7 +156,8 @@ class SupportAgentDetailView(RetrieveAPIView):
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
 
-class IndustryCatalogListView(ListAPIView):
+class IndustryCatalogListView(CachedCatalogMixin, ListAPIView):
+    catalog = 'industry'
     queryset = IndustryCatalog.objects.filter(active=True).order_by('name')
     serializer_class = IndustryCatalogSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -142,14 +166,14 @@ class IndustryCatalogListView(ListAPIView):
     pagination_class = None
     throttle_classes = [UserRateThrottle]
 
-    def list(self, request, *args, **kwargs):
+    def build_catalog(self, request, *args, **kwargs):
         # Use DRF filtering to respect search params, then return only the names as a plain array
         queryset = self.filter_queryset(self.get_queryset())
-        names = list(queryset.values_list('name', flat=True))
-        return Response(names)
+        return list(queryset.values_list('name', flat=True))
 
 
-class ProfessionalInterestCatalogListView(ListAPIView):
+class ProfessionalInterestCatalogListView(CachedCatalogMixin, ListAPIView):
+    catalog = 'professional_interest'
     queryset = ProfessionalInterestCatalog.objects.filter(active=True).order_by('name')
     serializer_class = ProfessionalInterestCatalogSerializer
     permission_classes = [permissions.AllowAny]
@@ -159,7 +183,8 @@ class ProfessionalInterestCatalogListView(ListAPIView):
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
 
-class HobbyCatalogListView(ListAPIView):
+class HobbyCatalogListView(CachedCatalogMixin, ListAPIView):
+    catalog = 'hobby'
     queryset = HobbyCatalog.objects.filter(active=True).order_by('name')
     serializer_class = HobbyCatalogSerializer
     permission_classes = [permissions.AllowAny]
@@ -168,14 +193,14 @@ class HobbyCatalogListView(ListAPIView):
     pagination_class = None
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
-    def list(self, request, *args, **kwargs):
+    def build_catalog(self, request, *args, **kwargs):
         # Return only hobby names as a plain array of strings (with search applied)
         queryset = self.filter_queryset(self.get_queryset())
-        names = list(queryset.values_list('name', flat=True))
-        return Response(names)
+        return list(queryset.values_list('name', flat=True))
 
 
-class ClubCatalogListView(ListAPIView):
+class ClubCatalogListView(StreamingListMixin, CachedCatalogMixin, ListAPIView):
+    catalog = 'club'
     queryset = ClubCatalog.objects.filter(active=True).order_by('name')
     serializer_class = ClubCatalogSerializer
     permission_classes = [permissions.AllowAny]
@@ -184,11 +209,30 @@ class ClubCatalogListView(ListAPIView):
     pagination_class = None
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
-    def list(self, request, *args, **kwargs):
+    def build_catalog(self, request, *args, **kwargs):
         # Return concatenated "name - city" for each active club (with search applied)
         queryset = self.filter_queryset(self.get_queryset())
-        items = [f"{c.name} - {c.city}" if c.city else c.name for c in queryset]
-        return Response(items)
+        return [f"{c.name} - {c.city}" if c.city else c.name for c in queryset]
+
+    def stream_records(self, queryset):
+        for name, city in queryset.values_list('name', 'city').iterator(chunk_size=self.stream_chunk_size):
+            yield f"{name} - {city}" if city else name
+
+
+def _professional_profile(request):
+    profile = request_profile(request)
+    try:
+        return profile.professional_profile
+    except ProfessionalProfile.DoesNotExist:
+        return ProfessionalProfile.objects.create(user_profile=profile)
+
+
+def _personal_detail(request):
+    profile = request_profile(request)
+    try:
+        return profile.personal_detail
+    except PersonalDetail.DoesNotExist:
+        return PersonalDetail.objects.create(user_profile=profile)
 
 
 class UpdateProfileIndustriesView(APIView):
@@ -201,9 +245,8 @@ class UpdateProfileIndustriesView(APIView):
         ids = serializer.validated_data.get('industry_ids', [])
         names = list(IndustryCatalog.objects.filter(id__in=ids, active=True).values_list('name', flat=True))
 
-        # Obtener o crear ProfessionalProfile del usuario
-        profile = UserProfile.objects.get(user=request.user)
-        prof, _ = ProfessionalProfile.objects.get_or_create(user_profile=profile)
+        # ProfessionalProfile del usuario (se crea si aún no existe)
+        prof = _professional_profile(request)
         # Guardar como CSV en el campo existente (compatibilidad mínima)
         prof.industries = ", ".join(names)
         prof.save(update_fields=['industries'])
@@ -223,8 +266,7 @@ class UpdateProfileInterestsView(APIView):
         ids = serializer.validated_data.get('interest_ids', [])
         names = list(ProfessionalInterestCatalog.objects.filter(id__in=ids, active=True).values_list('name', flat=True))
 
-        profile = UserProfile.objects.get(user=request.user)
-        prof, _ = ProfessionalProfile.objects.get_or_create(user_profile=profile)
+        prof = _professional_profile(request)
         prof.professional_interest = ", ".join(names)
         prof.save(update_fields=['professional_interest'])
         return Response({
@@ -243,9 +285,7 @@ class UpdateProfileHobbiesView(APIView):
         ids = serializer.validated_data.get('hobby_ids', [])
         names = list(HobbyCatalog.objects.filter(id__in=ids, active=True).values_list('name', flat=True))
 
-        profile = UserProfile.objects.get(user=request.user)
-        # Obtener o crear PersonalDetail
-        personal, _ = PersonalDetail.objects.get_or_create(user_profile=profile)
+        personal = _personal_detail(request)
         personal.hobbies = ", ".join(names)
         personal.save(update_fields=['hobbies'])
         return Response({
@@ -266,11 +306,14 @@ class RateExpertiseView(APIView):
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
     def get(self, request):
+        return catalog_response(request, 'rate_expertise', self.build_catalog)
+
+    def build_catalog(self):
         # Read from the model; if empty, provide sensible defaults without enforcing auth.
         names = list(RateExpertise.objects.filter(active=True).order_by('name').values_list('name', flat=True))
         if not names:
             names = ["hourly", "project", "under request"]
-        return Response(names)
+        return names
 
 
 class InviteUserView(generics.GenericAPIView):
@@ -340,12 +383,11 @@ class InviteUserView(generics.GenericAPIView):
                         """
         from_email = settings.EMAIL_HOST_USER
 
-        send_mail(subject=subject,
-                  message=message,
-                  from_email=from_email,
-                  recipient_list=[email],
-                  fail_silently=False,
-                  )
+        queue_mail(subject=subject,
+                   message=message,
+                   from_email=from_email,
+                   recipient_list=[email],
+                   )
 
         return Response({
             'success': 'Ok',
@@ -382,7 +424,8 @@ class ContactEmailView(APIView):
             )
 
 
-class PartnerTypeListView(generics.ListAPIView):
+class PartnerTypeListView(CachedCatalogMixin, generics.ListAPIView):
+    catalog = 'partner_type'
     queryset = PartnerType.objects.all()
     serializer_class = PartnerTypeSerializer
     permission_classes = [permissions.AllowAny]
@@ -8,7 +8,8 @@ from membership.models import (
     IntroductionStatus,
     MemberIntroduction,
     InviteeQualificationCatalog,
-    MemberReferral
+    MemberReferral,
+    StripeEvent
 )
 
 
@@ -52,3 +53,11 @@ class MemberReferralAdmin(admin.ModelAdmin):
     list_display = ("first_name", "last_name", "email", "phone_number", "invitee_qualification", "created_by", "created_at")
     search_fields = ("first_name", "last_name", "email", "phone_number")
     list_filter = ("invitee_qualification",)
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "customer_id", "created", "status", "attempts", "processed_at")
+    list_filter = ("status", "type")
+    search_fields = ("event_id", "customer_id")
+    readonly_fields = ("payload", "received_at", "processed_at", "last_error")
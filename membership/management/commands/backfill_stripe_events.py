@@ -0,0 +1,49 @@
+import json
+import time
+
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from membership.webhooks import HANDLERS, process_pending, record_event
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores Stripe events missed by the webhook (deduplicated by id) and applies them. "
+        "Reads them from the Stripe API, or from a recorded JSON file with --file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3, help='How far back to list events from Stripe (max. 30).')
+        parser.add_argument('--file', help='JSON file with an event, a list of events or an Event.list page ({"data": [...]}).')
+
+    def recorded_events(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('data', [data])
+        return data
+
+    def stripe_events(self, days):
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        since = int(time.time()) - days * 86400
+        events = stripe.Event.list(created={'gte': since}, types=list(HANDLERS), limit=100)
+        for event in events.auto_paging_iter():
+            yield json.loads(str(event))
+
+    def handle(self, *args, **options):
+        if options['file']:
+            events = self.recorded_events(options['file'])
+        else:
+            events = self.stripe_events(options['days'])
+
+        new = seen = 0
+        for payload in events:
+            _, created = record_event(payload)
+            new += created
+            seen += 1
+        applied, failed = process_pending()
+        self.stdout.write(self.style.SUCCESS(
+            f'{seen} event(s) read, {new} new: {applied} applied, {failed} failed.'
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from membership.webhooks import process_pending
+
+
+class Command(BaseCommand):
+    help = "Applies pending Stripe webhook events (StripeEvent), in order per customer. With --loop it keeps running as the worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls when there is nothing to do.')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            applied, failed = process_pending()
+            if applied or failed:
+                self.stdout.write(f'Applied {applied} event(s), {failed} failed.')
+            if not options['loop']:
+                break
+            if not (applied or failed):
+                time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from membership.models import StripeEvent
+from membership.webhooks import process_pending, requeue
+
+
+class Command(BaseCommand):
+    help = "Re-applies stored Stripe events (by id, customer or failed status) from their recorded payload, without calling Stripe."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', help='Stripe event ids (evt_...).')
+        parser.add_argument('--customer', help='Replay every stored event of this customer (cus_...).')
+        parser.add_argument('--failed', action='store_true', help='Replay every event marked as failed.')
+
+    def handle(self, *args, **options):
+        if not (options['event_ids'] or options['customer'] or options['failed']):
+            raise CommandError('Give event ids, --customer or --failed.')
+
+        events = StripeEvent.objects.all()
+        if options['event_ids']:
+            events = events.filter(event_id__in=options['event_ids'])
+        if options['customer']:
+            events = events.filter(customer_id=options['customer'])
+        if options['failed']:
+            events = events.filter(status=StripeEvent.STATUS_FAILED)
+
+        count = requeue(events)
+        applied, failed = process_pending()
+        self.stdout.write(self.style.SUCCESS(f'Requeued {count} event(s): {applied} applied, {failed} failed.'))
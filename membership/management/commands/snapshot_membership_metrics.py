@@ -0,0 +1,42 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from membership.metrics import backfill, take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores daily membership metrics (MembershipSnapshot). By default refreshes yesterday and today; "
+        "--backfill rebuilds history from the subscriptions' created_at / current_period_end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Snapshot a single day (YYYY-MM-DD).')
+        parser.add_argument('--backfill', action='store_true', help='Snapshot every day since the first subscription.')
+        parser.add_argument('--since', help='With --backfill, start from this day (YYYY-MM-DD).')
+        parser.add_argument('--overwrite', action='store_true', help='With --backfill, recompute days already stored.')
+
+    def parse_day(self, value, option):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'{option} must be YYYY-MM-DD.')
+        return day
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            since = self.parse_day(options['since'], '--since') if options['since'] else None
+            written = backfill(start=since, overwrite=options['overwrite'])
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} snapshot(s).'))
+            return
+
+        if options['date']:
+            days = [self.parse_day(options['date'], '--date')]
+        else:
+            today = timezone.localdate()
+            days = [today - dt.timedelta(days=1), today]
+        for day in days:
+            take_snapshot(day)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(days)} snapshot(s).'))
@@ -0,0 +1,108 @@
+"""
+Métricas de miembros.
+
+`member_counters()` calcula los contadores del dashboard en una sola consulta
+con agregación condicional (COUNT DISTINCT ... FILTER). `take_snapshot(day)`
+guarda las métricas de un día en MembershipSnapshot para mostrar tendencias
+sin recorrer MembershipSubscription.
+
+No hay historial de estados, así que el pasado se reconstruye con created_at y
+current_period_end: una suscripción está vigente al cierre de un día si se
+creó antes y, o sigue activa hoy, o su periodo terminó después de ese día.
+Las que ya no están activas cuentan como bajas el día de su current_period_end
+(sin esa fecha no entran en el histórico).
+"""
+import datetime as dt
+
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from membership.models import MembershipSnapshot, MembershipSubscription
+
+ACTIVE_STATUSES = ('active', 'trialing')
+
+
+def _active():
+    return Q(is_active=True) | Q(status__in=ACTIVE_STATUSES)
+
+
+def _distinct_members(condition=None):
+    return Count('user_profile', distinct=True, filter=condition)
+
+
+def member_counters(now=None):
+    """ Mismos contadores que MembersSubscriptionsOverviewView, en una consulta. """
+    now = now or timezone.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    counters = MembershipSubscription.objects.aggregate(
+        total_members=_distinct_members(),
+        total_active_members=_distinct_members(_active()),
+        total_new_subscribers_this_month=_distinct_members(Q(created_at__gte=month_start)),
+    )
+    # Inactivos = totales - activos (evita doble conteo si hay múltiples suscripciones)
+    counters['total_inactive_members'] = max(counters['total_members'] - counters['total_active_members'], 0)
+    return counters
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(dt.datetime.combine(day, dt.time.min))
+    return start, start + dt.timedelta(days=1)
+
+
+def _live_at(end):
+    return Q(created_at__lt=end) & (_active() | Q(current_period_end__gte=end))
+
+
+def day_metrics(day):
+    """ Métricas del día `day` (date); dos consultas. """
+    start, end = _day_bounds(day)
+    live = _live_at(end)
+    earlier = MembershipSubscription.objects.filter(user_profile=OuterRef('user_profile'), created_at__lt=start)
+    ended = ~_active() & Q(current_period_end__gte=start, current_period_end__lt=end)
+
+    metrics = MembershipSubscription.objects.aggregate(
+        total_members=_distinct_members(Q(created_at__lt=end)),
+        active_members=_distinct_members(live & ~Q(status='trialing')),
+        trialing_members=_distinct_members(live & Q(status='trialing')),
+        new_members=_distinct_members(Q(created_at__gte=start, created_at__lt=end) & ~Exists(earlier)),
+        churned_members=_distinct_members(ended),
+    )
+    by_plan = (
+        MembershipSubscription.objects.filter(live, plan__isnull=False)
+        .values('plan__title').annotate(members=_distinct_members()).order_by('plan__title')
+    )
+    metrics['by_plan'] = {row['plan__title']: row['members'] for row in by_plan}
+    return metrics
+
+
+def take_snapshot(day):
+    snapshot, _ = MembershipSnapshot.objects.update_or_create(date=day, defaults=day_metrics(day))
+    return snapshot
+
+
+def first_subscription_day():
+    first = MembershipSubscription.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    return timezone.localdate(first) if first else None
+
+
+def backfill(start=None, end=None, overwrite=False):
+    """
+    Genera los snapshots de [start, end] (por defecto desde la primera
+    suscripción hasta hoy). Sin `overwrite` se saltan los días ya guardados.
+    Devuelve el número de snapshots escritos.
+    """
+    start = start or first_subscription_day()
+    end = end or timezone.localdate()
+    if start is None:
+        return 0
+    existing = set() if overwrite else set(
+        MembershipSnapshot.objects.filter(date__range=(start, end)).values_list('date', flat=True)
+    )
+    written = 0
+    day = start
+    while day <= end:
+        if day not in existing:
+            take_snapshot(day)
+            written += 1
+        day += dt.timedelta(days=1)
+    return written
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0017_stripeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MembershipSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('total_members', models.PositiveIntegerField(default=0)),
+                ('active_members', models.PositiveIntegerField(default=0)),
+                ('trialing_members', models.PositiveIntegerField(default=0)),
+                ('new_members', models.PositiveIntegerField(default=0)),
+                ('churned_members', models.PositiveIntegerField(default=0)),
+                ('by_plan', models.JSONField(default=dict, help_text='Miembros con suscripción vigente por plan (título -> conteo).')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:11
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def fill_email_canonical(apps, schema_editor):
+    apps.get_model('membership', 'UserInvitation').objects.update(email_canonical=Lower(Trim('email')))
+    apps.get_model('membership', 'MemberReferral').objects.update(email_canonical=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0018_membershipsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberreferral',
+            name='email_canonical',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='userinvitation',
+            name='email_canonical',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=254),
+        ),
+        migrations.RunPython(fill_email_canonical, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0019_email_canonical'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='membershipsubscription',
+            name='currency',
+            field=models.CharField(blank=True, default='', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='membershipsubscription',
+            name='interval_count',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
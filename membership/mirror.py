@@ -0,0 +1,125 @@
+"""
+Espejo local de la suscripción de Stripe.
+
+Los webhooks `customer.subscription.*` mantienen MembershipSubscription y la
+caché de suscripción de UserProfile; las vistas de lectura (overview / status)
+responden desde aquí sin llamar a Stripe. Si el espejo supera
+SUBSCRIPTION_MIRROR_MAX_AGE se agenda un refresco en segundo plano y se
+responde igualmente con los datos locales.
+"""
+import logging
+import threading
+
+import stripe
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from membership.stripe_client import stripe_client
+
+logger = logging.getLogger(__name__)
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def wants_fresh(request):
+    """ `?fresh=1` fuerza la lectura en vivo desde Stripe. """
+    return str(request.query_params.get('fresh', '')).lower() in ('1', 'true', 'yes')
+
+
+def is_stale(profile):
+    synced_at = profile.subscription_synced_at
+    if synced_at is None:
+        return True
+    return timezone.now() - synced_at > settings.SUBSCRIPTION_MIRROR_MAX_AGE
+
+
+def local_subscription_data(profile):
+    """
+    Misma forma que SubscriptionStatusSerializer, construida con el espejo
+    local (MembershipSubscription + Plan + tarjeta cacheada en el perfil).
+    currency e interval_count vienen del último price visto en Stripe; null
+    si la fila aún no los tiene.
+    """
+    sub = profile.current_subscription
+    plan = sub.plan if sub else None
+
+    plan_data = None
+    if plan is not None:
+        plan_data = {
+            'id': plan.stripe_plan_id,
+            'amount': int(plan.price * 100),
+            'currency': sub.currency or None,
+            'interval': plan.interval,
+            'interval_count': sub.interval_count,
+            'product': None,
+        }
+
+    payment_method = None
+    if profile.card_last4:
+        payment_method = {'card': {'brand': profile.card_brand, 'last4': profile.card_last4}}
+
+    return {
+        'id': profile.stripe_subscription_id,
+        'status': sub.status if sub else profile.subscription_status,
+        'cancel_at_period_end': sub.cancel_at_period_end if sub else profile.cancel_at_period_end,
+        'canceled_at': None,
+        'current_period_start': None,
+        'current_period_end': sub.current_period_end if sub else profile.subscription_current_period_end,
+        'trial_end': None,
+        'plan': plan_data,
+        'default_payment_method': payment_method,
+    }
+
+
+def refresh_from_stripe(profile_id):
+    """ Trae la suscripción de Stripe y actualiza el espejo local. """
+    from nsocial.models import UserProfile
+
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if not profile or not profile.stripe_subscription_id:
+        return
+    try:
+        stripe_subscription = stripe_client.retrieve_subscription(
+            profile.stripe_subscription_id,
+            expand=['plan.product', 'default_payment_method']
+        )
+    except stripe.error.InvalidRequestError as e:
+        logger.warning(f"Refresco de espejo: sub {profile.stripe_subscription_id} inválida en Stripe: {e}")
+        profile.clear_subscription_details()
+        return
+
+    # Actualiza la caché del perfil y hace upsert de MembershipSubscription
+    profile.update_subscription_details(stripe_subscription)
+
+
+def _run_refresh(profile_id):
+    try:
+        refresh_from_stripe(profile_id)
+    except Exception as e:
+        logger.error(f"Error refrescando espejo de suscripción para perfil {profile_id}: {e}", exc_info=True)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(profile_id)
+        # El hilo abre su propia conexión; cerrarla al terminar
+        connections.close_all()
+
+
+def schedule_refresh(profile):
+    """
+    Agenda un refresco en segundo plano (tras el commit). Un solo refresco en
+    curso por perfil; las peticiones concurrentes no lo duplican.
+    """
+    profile_id = profile.pk
+
+    def start():
+        # Se marca aquí y no antes: si la transacción hace rollback start() no corre
+        # y el perfil quedaría marcado para siempre
+        with _refreshing_lock:
+            if profile_id in _refreshing:
+                return
+            _refreshing.add(profile_id)
+        threading.Thread(target=_run_refresh, args=(profile_id,), daemon=True).start()
+
+    transaction.on_commit(start)
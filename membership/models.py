@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from nsocial.emails import CanonicalEmailMixin, CanonicalEmailQuerySet
 
 
 class IntroductionCatalog(models.Model):
@@ -86,14 +89,17 @@ class ShippingAddress(models.Model):
         verbose_name_plural = "Shippings"
 
 
-class UserInvitation(models.Model):
+class UserInvitation(CanonicalEmailMixin, models.Model):
     email = models.EmailField()
+    email_canonical = models.CharField(max_length=254, editable=False, default='', db_index=True)
     invited_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_invitations')
     token = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     accepted_at = models.DateTimeField(null=True, blank=True)
     invited_user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='invitations_received')
 
+    objects = CanonicalEmailQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['email']),
@@ -114,6 +120,9 @@ class MembershipSubscription(models.Model):
     current_period_end = models.DateTimeField(null=True, blank=True)
     cancel_at_period_end = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    # Del price de Stripe, para responder desde el espejo (membership.mirror)
+    currency = models.CharField(max_length=3, blank=True, default='')
+    interval_count = models.PositiveSmallIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -157,15 +166,18 @@ class InviteeQualificationCatalog(models.Model):
         return self.name
 
 
-class MemberReferral(models.Model):
+class MemberReferral(CanonicalEmailMixin, models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField()
+    email_canonical = models.CharField(max_length=254, editable=False, default='', db_index=True)
     phone_number = models.CharField(max_length=30)
     invitee_qualification = models.ForeignKey(InviteeQualificationCatalog, on_delete=models.PROTECT, related_name='referrals')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='member_referrals')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CanonicalEmailQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Member Referral"
@@ -173,3 +185,62 @@ class MemberReferral(models.Model):
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
+
+
+class StripeEvent(models.Model):
+    """
+    Evento de webhook de Stripe tal como llegó (deduplicado por `event_id`).
+    El webhook solo lo guarda; `manage.py process_stripe_events` lo aplica
+    (ver membership.webhooks).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSED = 'processed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSED, 'Processed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    customer_id = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(help_text="Creación del evento en Stripe; define el orden por cliente.")
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created', 'pk']
+        indexes = [
+            models.Index(fields=['status', 'customer_id', 'created'], name='stripe_event_queue'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id} ({self.status})"
+
+
+class MembershipSnapshot(models.Model):
+    """
+    Métricas de miembros de un día (ver membership.metrics). Las genera
+    `manage.py snapshot_membership_metrics`; el dashboard lee las tendencias
+    de aquí en lugar de recorrer MembershipSubscription.
+    """
+    date = models.DateField(unique=True)
+    total_members = models.PositiveIntegerField(default=0)
+    active_members = models.PositiveIntegerField(default=0)
+    trialing_members = models.PositiveIntegerField(default=0)
+    new_members = models.PositiveIntegerField(default=0)
+    churned_members = models.PositiveIntegerField(default=0)
+    by_plan = models.JSONField(default=dict, help_text="Miembros con suscripción vigente por plan (título -> conteo).")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Snapshot {self.date}"
@@ -242,14 +242,29 @@ class IntroductionStatusSerializer(serializers.ModelSerializer):
 
 class MemberIntroductionSerializer(serializers.ModelSerializer):
     from_user = serializers.PrimaryKeyRelatedField(read_only=True)
+    # Resumen de cada miembro desde ProfileCard (select_related('from_user__card', 'to_user__card'))
+    from_member = serializers.SerializerMethodField()
+    to_member = serializers.SerializerMethodField()
 
     class Meta:
         model = MemberIntroduction
         fields = [
             'id', 'introduction_type', 'from_user', 'to_user', 'topic', 'message',
-            'status', 'created_at'
+            'status', 'created_at', 'from_member', 'to_member'
         ]
-        read_only_fields = ['id', 'from_user', 'created_at']
+        read_only_fields = ['id', 'from_user', 'created_at', 'from_member', 'to_member']
+
+    def _member(self, user):
+        # Import local: nsocial.serializers importa este módulo
+        from nsocial.serializers import ProfileCardSerializer
+        card = getattr(user, 'card', None) if user is not None else None
+        return ProfileCardSerializer(card, context=self.context).data if card else None
+
+    def get_from_member(self, obj):
+        return self._member(obj.from_user)
+
+    def get_to_member(self, obj):
+        return self._member(obj.to_user)
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -0,0 +1,233 @@
+"""
+Cliente de Stripe con caché para lecturas.
+
+Las lecturas (`list_prices`, `retrieve_*`) se guardan en la caché de Django por
+endpoint + id + parámetros, con el TTL de STRIPE_CACHE_TTLS. Varias peticiones
+idénticas simultáneas en el mismo proceso esperan una sola llamada a Stripe.
+Las escrituras pasan directo e invalidan los objetos que tocan (antes y
+después de la llamada), y cada evento
+de webhook invalida su objeto, su customer y, en facturas, su suscripción
+(ver membership.webhooks). Con la
+caché LocMem la invalidación solo llega al proceso que recibió el webhook; el
+TTL acota el resto.
+
+`stats()` devuelve llamadas, aciertos, errores y latencia por endpoint del
+proceso que atiende la petición; los admins lo consultan en
+/api/v1/members/stripe/stats/.
+El cliente recibe el módulo `stripe` o cualquier objeto con la misma forma
+(`api.Price.list`, ...), así los tests pueden usar un Stripe falso local.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+
+_CACHE_PREFIX = 'stripe'
+# Objetos cuyo cambio invalida el listado de precios
+_CATALOG_OBJECTS = ('price', 'product', 'plan')
+_PRICE_LIST_TAG = 'price.list'
+
+
+def invoice_subscription_id(invoice):
+    subscription_id = invoice.get('subscription')
+    if isinstance(subscription_id, dict):
+        subscription_id = subscription_id.get('id')
+    if not subscription_id:
+        # API 2025-03+: la suscripción va en parent.subscription_details
+        details = (invoice.get('parent') or {}).get('subscription_details') or {}
+        subscription_id = details.get('subscription')
+    return subscription_id
+
+
+class _Inflight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class StripeClient:
+
+    def __init__(self, api=stripe, ttls=None):
+        self.api = api
+        self.ttls = ttls
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'calls': 0, 'hits': 0, 'coalesced': 0, 'errors': 0,
+                                           'total_ms': 0.0, 'max_ms': 0.0})
+
+    # --- Infraestructura ---
+
+    def _ttl(self, endpoint):
+        ttls = self.ttls if self.ttls is not None else settings.STRIPE_CACHE_TTLS
+        return ttls.get(endpoint, 0)
+
+    def _tag_key(self, tag):
+        return f'{_CACHE_PREFIX}:tag:{tag}'
+
+    def _tag_version(self, tag):
+        key = self._tag_key(tag)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, 1, None)
+            version = cache.get(key) or 1
+        return version
+
+    def _key(self, endpoint, params, tags):
+        versions = [(tag, self._tag_version(tag)) for tag in tags]
+        raw = json.dumps([endpoint, params, versions], sort_keys=True, default=str)
+        return f'{_CACHE_PREFIX}:{endpoint}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    def _timed(self, endpoint, fn, *args, **kwargs):
+        stats = self._stats[endpoint]
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            stats['errors'] += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed
+            stats['max_ms'] = max(stats['max_ms'], elapsed)
+
+    def _cached(self, endpoint, tags, fn, *args, **kwargs):
+        """
+        Lectura cacheada. `tags` son los ids (o etiquetas) que la invalidan:
+        al invalidar una etiqueta cambia su versión y con ella la clave.
+        """
+        ttl = self._ttl(endpoint)
+        if not ttl:
+            return self._timed(endpoint, fn, *args, **kwargs)
+
+        key = self._key(endpoint, [args, kwargs], tags)
+        value = cache.get(key)
+        if value is not None:
+            self._stats[endpoint]['hits'] += 1
+            return value
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[key] = _Inflight()
+        if not owner:
+            self._stats[endpoint]['coalesced'] += 1
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.result
+
+        try:
+            inflight.result = self._timed(endpoint, fn, *args, **kwargs)
+            cache.set(key, inflight.result, ttl)
+            return inflight.result
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
+
+    # --- Invalidación y estadísticas ---
+
+    def invalidate(self, *object_ids):
+        for object_id in object_ids:
+            if not object_id:
+                continue
+            key = self._tag_key(object_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 2, None)
+
+    def invalidate_event(self, payload):
+        """ Invalida el objeto de un evento de webhook (dict), su customer y, si es una factura, su suscripción. """
+        obj = (payload.get('data') or {}).get('object') or {}
+        customer = obj.get('customer')
+        ids = [obj.get('id'), customer.get('id') if isinstance(customer, dict) else customer]
+        if obj.get('object') == 'invoice':
+            ids.append(invoice_subscription_id(obj))
+        if obj.get('object') in _CATALOG_OBJECTS:
+            ids.append(_PRICE_LIST_TAG)
+        self.invalidate(*ids)
+
+    def stats(self):
+        result = {}
+        for endpoint, s in self._stats.items():
+            result[endpoint] = {
+                'calls': s['calls'],
+                'hits': s['hits'],
+                'coalesced': s['coalesced'],
+                'errors': s['errors'],
+                'avg_ms': round(s['total_ms'] / s['calls'], 2) if s['calls'] else 0.0,
+                'max_ms': round(s['max_ms'], 2),
+            }
+        return result
+
+    def reset_stats(self):
+        self._stats.clear()
+
+    # --- Lecturas (cacheadas) ---
+
+    def list_prices(self, **params):
+        return self._cached('price.list', [_PRICE_LIST_TAG], self.api.Price.list, **params)
+
+    def retrieve_subscription(self, subscription_id, expand=None, fresh=False):
+        """ fresh=True consulta Stripe en vivo (invalida la entrada y vuelve a cachear el resultado). """
+        if fresh:
+            self.invalidate(subscription_id)
+        return self._cached('subscription.retrieve', [subscription_id],
+                            self.api.Subscription.retrieve, subscription_id, expand=expand or [])
+
+    def retrieve_payment_method(self, payment_method_id):
+        return self._cached('payment_method.retrieve', [payment_method_id],
+                            self.api.PaymentMethod.retrieve, payment_method_id)
+
+    # --- Escrituras y lecturas que deben ir en vivo ---
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        # Sin caché: se consulta justo después de confirmar un pago y el estado cambia en segundos
+        return self._timed('payment_intent.retrieve', self.api.PaymentIntent.retrieve, payment_intent_id)
+
+    def list_subscriptions(self, **params):
+        return self._timed('subscription.list', self.api.Subscription.list, **params)
+
+    def create_customer(self, **params):
+        return self._timed('customer.create', self.api.Customer.create, **params)
+
+    def _write(self, endpoint, object_ids, fn, *args, **kwargs):
+        # Invalida antes y después: una lectura concurrente durante la llamada puede
+        # volver a cachear el objeto anterior
+        self.invalidate(*object_ids)
+        try:
+            return self._timed(endpoint, fn, *args, **kwargs)
+        finally:
+            self.invalidate(*object_ids)
+
+    def modify_customer(self, customer_id, **params):
+        return self._write('customer.modify', [customer_id], self.api.Customer.modify, customer_id, **params)
+
+    def attach_payment_method(self, payment_method_id, **params):
+        return self._write('payment_method.attach', [payment_method_id, params.get('customer')],
+                           self.api.PaymentMethod.attach, payment_method_id, **params)
+
+    def create_subscription(self, **params):
+        return self._write('subscription.create', [params.get('customer')], self.api.Subscription.create, **params)
+
+    def modify_subscription(self, subscription_id, **params):
+        return self._write('subscription.modify', [subscription_id],
+                           self.api.Subscription.modify, subscription_id, **params)
+
+    def create_payment_intent(self, **params):
+        return self._timed('payment_intent.create', self.api.PaymentIntent.create, **params)
+
+
+stripe_client = StripeClient()
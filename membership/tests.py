@@ -1,3 +1,429 @@
-from django.test import TestCase
+import datetime as dt
+import hashlib
+import hmac
+import json
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from membership import metrics, mirror, webhooks
+from membership.models import MembershipSnapshot, MembershipSubscription, Plan, StripeEvent
+from membership.stripe_client import StripeClient, stripe_client
+from membership.webhooks import HANDLERS, process_customer, process_pending, record_event
+from nsocial.models import CustomUser, Role
+
+FIXTURES = Path(__file__).parent / 'testdata' / 'stripe_events.json'
+
+
+def signed_headers(body):
+    timestamp = int(time.time())
+    signature = hmac.new(
+        settings.STRIPE_WEBHOOK_SECRET.encode(), f'{timestamp}.{body}'.encode(), hashlib.sha256,
+    ).hexdigest()
+    return {'HTTP_STRIPE_SIGNATURE': f't={timestamp},v1={signature}'}
+
+
+class StripeWebhookPipelineTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='payer@nobilis.test', first_name='Pay', last_name='Er')
+        self.profile = self.user.profile
+        self.profile.stripe_customer_id = 'cus_fixture'
+        self.profile.save()
+        self.plan = Plan.objects.create(
+            title='Gold', color='gold', price_year='1000', price=1000, description='Plan',
+            stripe_plan_id='price_fixture', price_description='yearly', features=[], requirements=[],
+        )
+        self.events = json.loads(FIXTURES.read_text())['data']
+
+    def backfill(self):
+        out = StringIO()
+        call_command('backfill_stripe_events', file=str(FIXTURES), stdout=out)
+        return out.getvalue()
+
+    def test_webhook_stores_once_and_acknowledges(self):
+        body = json.dumps(self.events[0])
+        for duplicate in (False, True):
+            response = self.client.post('/api/v1/members/stripe/webhook/', body,
+                                        content_type='application/json', **signed_headers(body))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['duplicate'], duplicate)
+
+        event = StripeEvent.objects.get()
+        self.assertEqual((event.event_id, event.customer_id), ('evt_sub_updated', 'cus_fixture'))
+        # Aplicarlo es trabajo del worker
+        self.assertEqual(event.status, StripeEvent.STATUS_PENDING)
+        self.assertFalse(MembershipSubscription.objects.exists())
+
+    def test_bad_signature_is_rejected(self):
+        body = json.dumps(self.events[0])
+        response = self.client.post('/api/v1/members/stripe/webhook/', body, content_type='application/json',
+                                    HTTP_STRIPE_SIGNATURE='t=1,v1=bad')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_backfill_applies_in_stripe_order(self):
+        self.assertIn('4 event(s) read, 4 new: 4 applied, 0 failed', self.backfill())
+
+        # El fixture llega desordenado; el último evento de Stripe es el updated
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.subscription_status, 'active')
+        self.assertTrue(self.profile.cancel_at_period_end)
+        subscription = MembershipSubscription.objects.get(stripe_subscription_id='sub_fixture')
+        self.assertEqual((subscription.plan, subscription.status), (self.plan, 'active'))
+        self.assertEqual((subscription.currency, subscription.interval_count), ('usd', 1))
+        self.assertEqual(self.profile.current_subscription, subscription)
+
+        self.assertIn('4 event(s) read, 0 new', self.backfill())
+
+    def test_failed_event_blocks_later_ones_until_replayed(self):
+        for payload in self.events:
+            record_event(payload)
+
+        def broken(event):
+            raise RuntimeError('boom')
+
+        with mock.patch.dict(HANDLERS, {'invoice.payment_failed': broken}):
+            self.assertEqual(process_pending(), (2, 1))
+        statuses = dict(StripeEvent.objects.values_list('event_id', 'status'))
+        self.assertEqual(statuses['evt_sub_created'], StripeEvent.STATUS_PROCESSED)
+        # El updated es posterior al invoice que falló: espera su reintento
+        self.assertEqual(statuses['evt_sub_updated'], StripeEvent.STATUS_PENDING)
+        self.assertEqual(process_pending(), (0, 0))
+
+        call_command('replay_stripe_events', 'evt_invoice_failed', stdout=StringIO())
+        self.assertFalse(StripeEvent.objects.exclude(status=StripeEvent.STATUS_PROCESSED).exists())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.subscription_status, 'active')
+
+    def test_worker_does_not_overtake_events_locked_by_another(self):
+        by_type = {payload['type']: payload for payload in self.events}
+        record_event(by_type['customer.subscription.created'])
+        record_event(by_type['invoice.payment_failed'])
+        held_by_a = set(StripeEvent.objects.values_list('pk', flat=True))
+        lock_pending = webhooks._lock_pending
+        applied = []
+
+        def worker_b_locks(customer_id):
+            # select_for_update(skip_locked=True) con el worker A todavía en su transacción
+            return [event for event in lock_pending(customer_id) if event.pk not in held_by_a]
+
+        def tracking(handler):
+            def apply(event):
+                applied.append(event.id)
+                if len(applied) == 1:
+                    # Llegan eventos posteriores mientras A aplica el primero y los toma B
+                    record_event(by_type['customer.subscription.updated'])
+                    with mock.patch.object(webhooks, '_lock_pending', worker_b_locks):
+                        self.assertEqual(process_customer('cus_fixture'), (0, 0))
+                handler(event)
+            return apply
+
+        with mock.patch.dict(HANDLERS, {key: tracking(handler) for key, handler in HANDLERS.items()}):
+            self.assertEqual(process_customer('cus_fixture'), (2, 0))
+        self.assertEqual(process_customer('cus_fixture'), (1, 0))
+        self.assertEqual(applied, ['evt_sub_created', 'evt_invoice_failed'])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.subscription_status, 'active')
+
+    def test_event_without_profile_is_retried(self):
+        self.profile.stripe_customer_id = ''
+        self.profile.save()
+        record_event(self.events[0])
+        record_event(self.events[1])  # invoice.payment_failed, anterior al updated
+
+        self.assertEqual(process_pending(), (0, 1))
+        event = StripeEvent.objects.get(event_id='evt_invoice_failed')
+        self.assertEqual((event.status, event.attempts), (StripeEvent.STATUS_PENDING, 1))
+        self.assertIn('cus_fixture', event.last_error)
+
+        self.profile.stripe_customer_id = 'cus_fixture'
+        self.profile.save()
+        self.assertEqual(process_customer('cus_fixture', now=event.next_attempt_at), (2, 0))
+        self.assertTrue(MembershipSubscription.objects.filter(user_profile=self.profile).exists())
+
+
+class FakeStripe:
+    """ Stripe local: cuenta las llamadas y devuelve objetos mínimos. """
+
+    def __init__(self, delay=0):
+        self.calls = []
+        self.delay = delay
+        fake = self
+
+        class Price:
+            @staticmethod
+            def list(**params):
+                fake.calls.append(('price.list', params))
+                return {'data': [{'id': 'price_1'}]}
+
+        class Subscription:
+            @staticmethod
+            def retrieve(subscription_id, **params):
+                fake.calls.append(('subscription.retrieve', subscription_id))
+                time.sleep(fake.delay)
+                return {'id': subscription_id, 'status': 'active'}
+
+            @staticmethod
+            def modify(subscription_id, **params):
+                fake.calls.append(('subscription.modify', subscription_id))
+                return {'id': subscription_id, **params}
+
+        self.Price = Price
+        self.Subscription = Subscription
+
+
+class StripeClientTests(SimpleTestCase):
+    TTLS = {'price.list': 300, 'subscription.retrieve': 30}
+
+    def setUp(self):
+        cache.clear()
+        self.fake = FakeStripe()
+        self.stripe = StripeClient(api=self.fake, ttls=self.TTLS)
+
+    def test_reads_are_cached_per_params(self):
+        for _ in range(3):
+            self.stripe.list_prices(active=True, expand=['data.product'])
+        self.stripe.list_prices(active=False)
+        self.assertEqual(len(self.fake.calls), 2)
+        stats = self.stripe.stats()['price.list']
+        self.assertEqual((stats['calls'], stats['hits']), (2, 2))
+
+    def test_concurrent_reads_are_coalesced(self):
+        self.fake.delay = 0.05
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.stripe.retrieve_subscription('sub_1')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.fake.calls, [('subscription.retrieve', 'sub_1')])
+
+    def test_writes_and_webhooks_invalidate(self):
+        self.stripe.retrieve_subscription('sub_1')
+        self.stripe.modify_subscription('sub_1', cancel_at_period_end=True)
+        self.stripe.retrieve_subscription('sub_1')
+        self.stripe.retrieve_subscription('sub_2')
+        self.stripe.invalidate_event({'data': {'object': {'object': 'subscription', 'id': 'sub_2'}}})
+        self.stripe.retrieve_subscription('sub_2')
+        self.stripe.retrieve_subscription('sub_1')
+        retrieves = [c for c in self.fake.calls if c[0] == 'subscription.retrieve']
+        self.assertEqual([c[1] for c in retrieves], ['sub_1', 'sub_1', 'sub_2', 'sub_2'])
+
+        # Una lectura durante la escritura no deja cacheado el objeto anterior
+        with mock.patch.object(self.fake.Subscription, 'modify',
+                               lambda *args, **kwargs: self.stripe.retrieve_subscription('sub_1')):
+            self.stripe.modify_subscription('sub_1', cancel_at_period_end=False)
+        calls = len(self.fake.calls)
+        self.stripe.retrieve_subscription('sub_1')
+        self.assertEqual(len(self.fake.calls), calls + 1)
+        self.stripe.retrieve_subscription('sub_1', fresh=True)
+        self.assertEqual(len(self.fake.calls), calls + 2)
+
+        self.stripe.list_prices()
+        self.stripe.invalidate_event({'data': {'object': {'object': 'price', 'id': 'price_1'}}})
+        self.stripe.list_prices()
+        self.assertEqual(self.stripe.stats()['price.list']['calls'], 2)
+
+    def test_invoice_event_invalidates_its_subscription(self):
+        self.stripe.retrieve_subscription('sub_1')
+        self.stripe.retrieve_subscription('sub_2')
+        self.stripe.invalidate_event({'data': {'object': {'object': 'invoice', 'id': 'in_1', 'subscription': 'sub_1'}}})
+        self.stripe.invalidate_event({'data': {'object': {
+            'object': 'invoice', 'id': 'in_2',
+            'parent': {'subscription_details': {'subscription': 'sub_2'}},
+        }}})
+        self.stripe.retrieve_subscription('sub_1')
+        self.stripe.retrieve_subscription('sub_2')
+        self.assertEqual(self.stripe.stats()['subscription.retrieve']['calls'], 4)
+
+
+class SubscriptionMirrorTests(TestCase):
+    URL = '/api/v1/members/subscriptions/status/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='mirror@nobilis.test', first_name='Mi', last_name='Rror')
+        self.profile = self.user.profile
+        self.plan = Plan.objects.create(
+            title='Gold', color='gold', price_year='1000', price=1000, description='Plan',
+            stripe_plan_id='price_fixture', price_description='yearly', features=[], requirements=[],
+        )
+        self.events = json.loads(FIXTURES.read_text())['data']
+        self.profile.stripe_customer_id = 'cus_fixture'
+        self.profile.save()
+        record_event(self.events[2])  # customer.subscription.created
+        process_pending()
+        self.profile.refresh_from_db()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_served_from_mirror_with_the_live_keys(self):
+        with mock.patch.object(stripe_client, 'retrieve_subscription') as retrieve:
+            data = self.client.get(self.URL).data
+        retrieve.assert_not_called()
+        self.assertEqual(set(data), {
+            'id', 'status', 'cancel_at_period_end', 'canceled_at', 'current_period_start', 'current_period_end',
+            'trial_end', 'plan', 'default_payment_method',
+        })
+        self.assertEqual((data['plan']['currency'], data['plan']['interval_count']), ('usd', 1))
+
+    def test_stale_mirror_schedules_a_single_refresh(self):
+        self.profile.subscription_synced_at = timezone.now() - settings.SUBSCRIPTION_MIRROR_MAX_AGE * 2
+        self.profile.save()
+        with mock.patch.object(mirror.threading, 'Thread') as thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(self.URL)
+                self.client.get(self.URL)
+            # El segundo on_commit ve el refresco en curso
+            thread.assert_called_once()
+            target, args = thread.call_args.kwargs['target'], thread.call_args.kwargs['args']
+
+            with mock.patch.object(mirror, 'refresh_from_stripe') as refresh, \
+                    mock.patch.object(mirror.connections, 'close_all'):
+                target(*args)
+            refresh.assert_called_once_with(self.profile.pk)
+
+            # Terminado el refresco, otra petición vuelve a agendarlo
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(self.URL)
+            self.assertEqual(thread.call_count, 2)
+
+    def test_fresh_reads_stripe_live(self):
+        subscription = stripe.Subscription.construct_from(self.events[0]['data']['object'], 'sk_test')
+        with mock.patch.object(stripe_client, 'retrieve_subscription', return_value=subscription) as retrieve:
+            data = self.client.get(self.URL, {'fresh': '1'}).data
+        self.assertEqual(retrieve.call_args.kwargs['fresh'], True)
+        self.assertEqual(data['id'], 'sub_fixture')
+        # La respuesta en vivo corrige el espejo (el updated trae cancel_at_period_end=true)
+        self.assertTrue(data['cancel_at_period_end'])
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.cancel_at_period_end)
+
+
+class MembersListViewTests(TestCase):
+    URL = '/api/v1/members/subscriptions/members/list/'
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create(
+            email='admin@nobilis.test', first_name='Ad', last_name='Min',
+            role=Role.objects.create(code='admin', name='Admin', is_admin=True),
+        )
+        self.gold = Plan.objects.create(
+            title='Gold', color='gold', price_year='1000', price=1000, description='Plan',
+            stripe_plan_id='price_gold', price_description='yearly', features=[], requirements=[],
+        )
+        for i, (status_value, is_active) in enumerate([('active', True), ('canceled', False), ('trialing', True)]):
+            user = CustomUser.objects.create(email=f'member{i}@nobilis.test', first_name=f'Member{i}', last_name='Test')
+            MembershipSubscription.objects.create(
+                user_profile=user.profile, plan=self.gold, stripe_subscription_id=f'sub_{i}',
+                status=status_value, is_active=is_active,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_paginated_with_plan_and_status_from_sql(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(self.URL, {'limit': 2, 'ordering': 'email'}).data
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([m['email'] for m in data['results']], ['member0@nobilis.test', 'member1@nobilis.test'])
+        self.assertEqual(data['results'][1]['plan_name'], 'inactive')
+        self.assertEqual(data['results'][1]['status'], 'canceled')
+
+        inactive = self.client.get(self.URL, {'status': 'inactive'}).data
+        self.assertEqual([m['full_name'] for m in inactive['results']], ['Member1 Test'])
+        on_gold = self.client.get(self.URL, {'plan': self.gold.pk, 'joined_from': '2000-01-01'}).data
+        self.assertEqual(on_gold['count'], 2)
+        self.assertEqual(self.client.get(self.URL, {'joined_to': 'yesterday'}).status_code, 400)
+
+    def test_csv_export_is_streamed_for_admins_only(self):
+        response = self.client.get(self.URL, {'export': 'csv', 'ordering': 'email'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'user_id,full_name,email,became_member_at,plan_name,status')
+        self.assertEqual(len(lines), 4)
+        self.assertIn('member2@nobilis.test', lines[3])
+
+        member = CustomUser.objects.get(email='member0@nobilis.test')
+        self.client.force_authenticate(member)
+        self.assertEqual(self.client.get(self.URL, {'export': 'csv'}).status_code, 403)
+
+    def test_full_stream_is_for_admins_only(self):
+        response = self.client.get(self.URL, HTTP_ACCEPT='application/x-ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+        self.client.force_authenticate(CustomUser.objects.get(email='member0@nobilis.test'))
+        for accept in ('application/x-ndjson', 'application/json; stream=true'):
+            self.assertEqual(self.client.get(self.URL, HTTP_ACCEPT=accept).status_code, 403)
+        self.assertEqual(self.client.get(self.URL).status_code, 200)
+
+    def test_stripe_client_stats_for_admins_only(self):
+        url = '/api/v1/members/stripe/stats/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('endpoints', response.data)
+
+        self.client.force_authenticate(CustomUser.objects.get(email='member0@nobilis.test'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class MembershipMetricsTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.gold = Plan.objects.create(
+            title='Gold', color='gold', price_year='1000', price=1000, description='Plan',
+            stripe_plan_id='price_gold', price_description='yearly', features=[], requirements=[],
+        )
+
+        def subscribe(name, days_ago, status_value, ended_days_ago=None):
+            user = CustomUser.objects.create(email=f'{name}@nobilis.test', first_name=name, last_name='Test')
+            sub = MembershipSubscription.objects.create(
+                user_profile=user.profile, plan=self.gold, stripe_subscription_id=f'sub_{name}',
+                status=status_value, is_active=status_value in metrics.ACTIVE_STATUSES,
+                current_period_end=(timezone.now() - dt.timedelta(days=ended_days_ago)) if ended_days_ago is not None else None,
+            )
+            MembershipSubscription.objects.filter(pk=sub.pk).update(
+                created_at=timezone.now() - dt.timedelta(days=days_ago)
+            )
+
+        subscribe('ana', 10, 'active')
+        subscribe('bruno', 8, 'canceled', ended_days_ago=3)
+        subscribe('carla', 1, 'trialing')
+
+    def test_counters_in_one_query(self):
+        with self.assertNumQueries(1):
+            counters = metrics.member_counters()
+        self.assertEqual(counters['total_members'], 3)
+        self.assertEqual(counters['total_active_members'], 2)
+        self.assertEqual(counters['total_inactive_members'], 1)
+
+    def test_backfill_rebuilds_history(self):
+        call_command('snapshot_membership_metrics', backfill=True, stdout=StringIO())
+        snapshots = {s.date: s for s in MembershipSnapshot.objects.all()}
+        self.assertEqual(len(snapshots), 11)
+
+        five_days_ago = snapshots[self.today - dt.timedelta(days=5)]
+        self.assertEqual((five_days_ago.total_members, five_days_ago.active_members), (2, 2))
+        self.assertEqual(five_days_ago.by_plan, {'Gold': 2})
+        self.assertEqual(snapshots[self.today - dt.timedelta(days=3)].churned_members, 1)
+
+        today = snapshots[self.today]
+        self.assertEqual((today.active_members, today.trialing_members), (1, 1))
+        self.assertEqual(snapshots[self.today - dt.timedelta(days=1)].new_members, 1)
+
+        self.assertEqual(metrics.backfill(), 0)
@@ -2,7 +2,7 @@ from django.urls import path
 from membership.views import (ListAvailablePlansView, CreateSubscriptionView, 
                               StripeWebhookView, CancelSubscriptionView, 
                               SubscriptionStatusView, PlanNobilis, AccountOverviewView, PlanPricesView, ShippingAddressView,
-                              MembersSubscriptionsOverviewView, MembersListView, InvitationListCreateView, DependentsListView,
+                              MembersSubscriptionsOverviewView, MembersMetricsHistoryView, MembersListView, StripeClientStatsView, InvitationListCreateView, DependentsListView,
                               IntroductionCatalogListCreateView, IntroductionCatalogDetailView,
                               IntroductionStatusListCreateView, IntroductionStatusDetailView,
                               MemberIntroductionListCreateView, MemberIntroductionDetailView,
@@ -18,8 +18,10 @@ urlpatterns = [
     path('subscriptions/status/', SubscriptionStatusView.as_view(), name='subscription-status'),
     path('subscriptions/cancel/', CancelSubscriptionView.as_view(), name='cancel-subscription'),
     path('subscriptions/members/overview/', MembersSubscriptionsOverviewView.as_view(), name='members-subscriptions-overview'),
+    path('subscriptions/members/metrics/history/', MembersMetricsHistoryView.as_view(), name='members-metrics-history'),
     path('subscriptions/members/list/', MembersListView.as_view(), name='members-list'),
     path('stripe/webhook/', StripeWebhookView.as_view(), name='stripe-webhook'),
+    path('stripe/stats/', StripeClientStatsView.as_view(), name='stripe-client-stats'),
     path('shipping-address/', ShippingAddressView.as_view(), name='shipping-address'),
     path('invitations/', InvitationListCreateView.as_view(), name='invitations-list-create'),
     path('dependents/', DependentsListView.as_view(), name='dependents-list'),
@@ -1,7 +1,8 @@
-from rest_framework import generics, permissions, status
+from rest_framework import filters, generics, permissions, status
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from membership.models import Plan, MembershipSubscription, IntroductionCatalog, IntroductionStatus, MemberIntroduction, InviteeQualificationCatalog, MemberReferral
+from membership.models import Plan, MembershipSubscription, MembershipSnapshot, IntroductionCatalog, IntroductionStatus, MemberIntroduction, InviteeQualificationCatalog, MemberReferral
 from django.utils.decorators import method_decorator
 from membership.serializers import (PriceSerializer, SubscriptionCreateSerializer,
                                     SubscriptionStatusSerializer, PlanNobilisSerializer, PlanNobilisPriceSerializer,
@@ -11,18 +12,26 @@ from membership.serializers import (PriceSerializer, SubscriptionCreateSerialize
 from nsocial.models import UserProfile
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
+import json
 import logging
+import os
 import stripe
 from django.utils import timezone
 import datetime as dt
 from django.conf import settings
 from django.db import models
-from django.db.models import Min
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from notification.models import Notification
-from django.db.models import Q
+from notification.fanout import notify
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Trim
+from api.streaming import EXPORT_FORMATS, StreamingListMixin, export_response, stream_format
+from django.utils.dateparse import parse_date
 from django.contrib.contenttypes.models import ContentType
+from membership import metrics, mirror, webhooks
+from membership.stripe_client import stripe_client
+from membership.paginations import MembersPagination
+from moderation.views import IsAdminRole
 
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -39,7 +48,7 @@ class ListAvailablePlansView(APIView):
         try:
             # Llama a la API de Stripe para obtener precios activos
             # 'expand' incluye el objeto completo del Producto asociado a cada Precio
-            prices = stripe.Price.list(
+            prices = stripe_client.list_prices(
                 active=True,
                 type='recurring', # Asegura que solo obtienes precios de suscripción
                 expand=['data.product'] # ¡Importante para obtener info del producto!
@@ -88,7 +97,7 @@ class CreateSubscriptionView(APIView):
         try:
             # 0. Verificar que el método de pago existe en Stripe
             try:
-                payment_method = stripe.PaymentMethod.retrieve(payment_method_id)
+                payment_method = stripe_client.retrieve_payment_method(payment_method_id)
             except stripe.error.InvalidRequestError as e:
                 logger.error(f"Error: Método de pago no encontrado: {payment_method_id}. Error: {e}")
                 return Response(
@@ -105,7 +114,7 @@ class CreateSubscriptionView(APIView):
             if not customer_id:
                 try:
                     # Intenta crear cliente + adjuntar PM + establecer default
-                    customer = stripe.Customer.create(
+                    customer = stripe_client.create_customer(
                         email=user.email,
                         name=f"{user.first_name} {user.last_name}".strip(),
                         metadata={'django_user_id': user.id},
@@ -125,8 +134,8 @@ class CreateSubscriptionView(APIView):
             #    (Si fue recién creado, ya se intentó en el paso anterior)
             if not customer_created_now:
                 try:
-                    stripe.PaymentMethod.attach(payment_method_id, customer=customer_id)
-                    stripe.Customer.modify(
+                    stripe_client.attach_payment_method(payment_method_id, customer=customer_id)
+                    stripe_client.modify_customer(
                         customer_id,
                         invoice_settings={'default_payment_method': payment_method_id},
                     )
@@ -136,7 +145,8 @@ class CreateSubscriptionView(APIView):
 
             # 4. (Opcional) Guardar/Actualizar detalles del PM en el Perfil local
             try:
-                pm_details = stripe.PaymentMethod.retrieve(payment_method_id)
+                # Marca y últimos 4 no cambian al adjuntarlo: se reusa el PM del paso 0
+                pm_details = payment_method
                 if pm_details.type == 'card':
                     profile.stripe_payment_method_id = pm_details.id
                     profile.card_brand = pm_details.card.brand
@@ -154,7 +164,7 @@ class CreateSubscriptionView(APIView):
 
             # 5. Crear la Suscripción en Stripe
             try:
-                subscription = stripe.Subscription.create(
+                subscription = stripe_client.create_subscription(
                     customer=customer_id,
                     items=[{'price': price_id}],
                     # expand=['latest_invoice.payment_intent'],
@@ -198,6 +208,7 @@ class CreateSubscriptionView(APIView):
 
                 # Puntero de conveniencia en el perfil
                 profile.current_subscription = sub_obj
+                profile.subscription_synced_at = timezone.now()
                 profile.save()
 
                 # 6. Manejar la respuesta de la suscripción
@@ -211,12 +222,12 @@ class CreateSubscriptionView(APIView):
                 # Si expandiste solo 'latest_invoice':
                 if hasattr(subscription, 'latest_invoice') and subscription.latest_invoice and hasattr(subscription.latest_invoice, 'payment_intent') and subscription.latest_invoice.payment_intent:
                      # Solo intenta acceder si la estructura existe
-                     payment_intent_status = getattr(stripe.PaymentIntent.retrieve(subscription.latest_invoice.payment_intent), 'status', None) # Recuperar explícitamente si es necesario
+                     payment_intent_status = getattr(stripe_client.retrieve_payment_intent(subscription.latest_invoice.payment_intent), 'status', None) # Recuperar explícitamente si es necesario
                      if subscription.status == 'incomplete' and payment_intent_status == 'requires_action':
                            # Necesitas el client_secret del PaymentIntent, no está directamente aquí
                            # Recupera el PI completo:
                            try:
-                               pi = stripe.PaymentIntent.retrieve(subscription.latest_invoice.payment_intent)
+                               pi = stripe_client.retrieve_payment_intent(subscription.latest_invoice.payment_intent)
                                response_data['client_secret'] = pi.client_secret
                            except stripe.error.StripeError as pi_error:
                                 logger.error(f"Error recuperando PaymentIntent {subscription.latest_invoice.payment_intent} para SCA: {pi_error}")
@@ -262,7 +273,7 @@ class CancelSubscriptionView(APIView):
 
             # 2. Encontrar la suscripción activa o en prueba del usuario
             # Es más robusto buscar por ambas por si acaso.
-            subscriptions = stripe.Subscription.list(
+            subscriptions = stripe_client.list_subscriptions(
                 customer=customer_id,
                 status='all', # Traemos todas las activas/en prueba/pasadas para estar seguros
                 expand=['data.plan.product'] # Para poder devolver info completa si es necesario
@@ -297,7 +308,7 @@ class CancelSubscriptionView(APIView):
             # 3. Marcar la suscripción para cancelación al final del periodo
             try:
                 subscription_id_to_cancel = active_subscription.id
-                canceled_subscription = stripe.Subscription.modify(
+                canceled_subscription = stripe_client.modify_subscription(
                     subscription_id_to_cancel,
                     cancel_at_period_end=True
                 )
@@ -307,6 +318,10 @@ class CancelSubscriptionView(APIView):
                     MembershipSubscription.objects.filter(stripe_subscription_id=sub_id).update(
                         cancel_at_period_end=True
                     )
+                    # Mantener el espejo del perfil al día hasta que llegue el webhook
+                    UserProfile.objects.filter(pk=profile.pk, stripe_subscription_id=sub_id).update(
+                        cancel_at_period_end=True
+                    )
                 except Exception:
                     pass
 
@@ -346,19 +361,26 @@ class SubscriptionStatusView(APIView):
     def get(self, request, *args, **kwargs):
         user = request.user
         try:
-            profile = get_object_or_404(UserProfile, user=user)
+            profile = get_object_or_404(UserProfile.objects.select_related('current_subscription__plan'), user=user)
             subscription_id = profile.stripe_subscription_id
 
             if not subscription_id:
                 return Response({"success": False, "message": "No subscription record found."}, status=status.HTTP_200_OK) # O 404 si prefieres
 
+            # Por defecto se responde desde el espejo local; ?fresh=1 consulta Stripe en vivo
+            if not mirror.wants_fresh(request):
+                if mirror.is_stale(profile):
+                    mirror.schedule_refresh(profile)
+                return Response(mirror.local_subscription_data(profile), status=status.HTTP_200_OK)
+
             try:
-                stripe_subscription = stripe.Subscription.retrieve(
+                stripe_subscription = stripe_client.retrieve_subscription(
                     subscription_id,
                     expand=[
                         'plan.product',
                         'default_payment_method'
-                        ]
+                        ],
+                    fresh=True,
                 )
 
                 try:
@@ -416,7 +438,8 @@ class SubscriptionStatusView(APIView):
 @method_decorator(csrf_exempt, name='dispatch')
 class StripeWebhookView(APIView):
     """
-    Escucha los eventos enviados por Stripe.
+    Escucha los eventos enviados por Stripe. Solo verifica y guarda el evento;
+    el worker los aplica (ver membership.webhooks).
     """
     permission_classes = [permissions.AllowAny] # Debe ser accesible públicamente
 
@@ -424,11 +447,10 @@ class StripeWebhookView(APIView):
         payload = request.body
         sig_header = request.headers.get('Stripe-Signature')
         endpoint_secret = settings.STRIPE_WEBHOOK_SECRET
-        event = None
 
         # 1. Verificar la firma del Webhook (¡SEGURIDAD!)
         try:
-            event = stripe.Webhook.construct_event(
+            stripe.Webhook.construct_event(
                 payload, sig_header, endpoint_secret
             )
         except ValueError as e:
@@ -444,195 +466,13 @@ class StripeWebhookView(APIView):
              logger.error("Error inesperado construyendo evento webhook: %s", e, exc_info=True)
              return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        # 2. Manejar el evento específico
-        event_type = event['type']
-        data_object = event['data']['object'] # El objeto de Stripe (Invoice, Subscription, etc.)
-
-        if event_type in ['customer.subscription.created', 'customer.subscription.updated',
-                          'customer.subscription.deleted']:
-            sub = data_object  # Objeto Subscription de Stripe
-
-            # Ubicar el perfil: preferiblemente por `customer` si lo guardas
-            profile = None
-            try:
-                customer_id = sub.get('customer')
-                if customer_id:
-                    profile = UserProfile.objects.filter(stripe_customer_id=customer_id).first()
-                if not profile:
-                    profile = UserProfile.objects.filter(stripe_subscription_id=sub.get('id')).first()
-            except Exception:
-                profile = None
-
-            # Resolver plan a partir del price del primer item
-            price_id = None
-            try:
-                items = sub.get('items', {}).get('data', [])
-                if items:
-                    price_id = items[0].get('price', {}).get('id')
-            except Exception:
-                price_id = None
-
-            plan = Plan.objects.filter(stripe_plan_id=price_id).first() if price_id else None
-
-            # Campos comunes
-            status_value = sub.get('status') or ''
-            cancel_flag = sub.get('cancel_at_period_end') or False
-            cpe = sub.get('current_period_end')
-            current_period_end = dt.datetime.fromtimestamp(cpe, tz=dt.timezone.utc) if cpe else None
-            is_active = status_value in ['active', 'trialing'] and not sub.get('canceled_at')
-
-            # Upsert de la fila local
-            sub_obj, _ = MembershipSubscription.objects.update_or_create(
-                stripe_subscription_id=sub.get('id'),
-                defaults={
-                    'user_profile': profile,
-                    'plan': plan,
-                    'status': status_value,
-                    'cancel_at_period_end': cancel_flag,
-                    'current_period_end': current_period_end,
-                    'is_active': is_active,
-                }
-            )
-
-            # Refrescar caché del perfil si lo encontramos
-            if profile:
-                try:
-                    profile.stripe_subscription_id = sub.get('id')
-                    profile.subscription_status = status_value
-                    profile.subscription_current_period_end = current_period_end
-                    profile.cancel_at_period_end = cancel_flag
-                    profile.current_subscription = sub_obj
-                    profile.save()
-                except Exception:
-                    pass
-
-            return Response({'received': True}, status=status.HTTP_200_OK)
-
-
-
-        logger.info(f"Webhook recibido: {event_type}, Event ID: {event.id}")
-
-        # --- Manejadores de Eventos ---
-
-        if event_type == 'invoice.payment_succeeded':
-            # Cliente pagó la factura (inicio de suscripción, renovación)
-            try:
-                invoice = data_object
-                customer_id = invoice.customer
-                subscription_id = invoice.subscription # Puede ser null si no es de suscripción
-
-                if subscription_id: # Solo actuar si es una factura de suscripción
-                    profile = UserProfile.objects.get(stripe_customer_id=customer_id)
-
-                    # Recuperar la suscripción para obtener el estado y fechas actualizadas
-                    stripe_sub = stripe.Subscription.retrieve(subscription_id)
-                    profile.update_subscription_details(stripe_sub)
-
-                    logger.info(f"Pago exitoso procesado para Customer {customer_id}, Sub {subscription_id}. Perfil actualizado.")
-                    # Aquí podrías enviar un email de confirmación de pago/renovación
-                    # usando una tarea asíncrona (ej: Celery)
-                    # send_renewal_confirmation_email.delay(profile.user.id)
-
-            except UserProfile.DoesNotExist:
-                logger.error(f"Webhook {event_type}: UserProfile no encontrado para customer {customer_id}")
-            except stripe.error.StripeError as e:
-                 logger.error(f"Webhook {event_type}: Error de Stripe al procesar {customer_id}: {e}", exc_info=True)
-            except Exception as e:
-                logger.error(f"Webhook {event_type}: Error inesperado al procesar {customer_id}: {e}", exc_info=True)
-
-
-        elif event_type == 'invoice.payment_failed':
-            # Falló el pago de la factura (renovación fallida)
-             try:
-                invoice = data_object
-                customer_id = invoice.customer
-                subscription_id = invoice.subscription
-
-                if subscription_id:
-                    profile = UserProfile.objects.get(stripe_customer_id=customer_id)
-
-                    # Actualizar estado local (ej: 'past_due')
-                    # Stripe actualizará el estado de la suscripción, el evento
-                    # 'customer.subscription.updated' también se disparará.
-                    # Podemos confiar en ese evento o actualizar aquí también.
-                    profile.subscription_status = 'past_due' # O el estado que corresponda
-                    profile.save()
-
-                    logger.warning(f"Pago fallido procesado para Customer {customer_id}, Sub {subscription_id}. Perfil actualizado a past_due.")
-                    # ENVIAR NOTIFICACIÓN AL USUARIO para que actualice su método de pago
-                    # send_payment_failed_email.delay(profile.user.id)
-
-             except UserProfile.DoesNotExist:
-                logger.error(f"Webhook {event_type}: UserProfile no encontrado para customer {customer_id}")
-             except Exception as e:
-                logger.error(f"Webhook {event_type}: Error inesperado al procesar {customer_id}: {e}", exc_info=True)
+        # 2. Guardar el evento crudo; un reintento de Stripe con el mismo id no se duplica
+        stripe_event, created = webhooks.record_event(json.loads(payload))
+        logger.info("Webhook recibido: %s, Event ID: %s%s", stripe_event.type, stripe_event.event_id,
+                    '' if created else ' (duplicado)')
 
-
-        elif event_type == 'customer.subscription.updated':
-            # Suscripción actualizada (cambio de plan, inicio/fin de prueba, marcada para cancelar, cambio de estado)
-            try:
-                subscription = data_object
-                customer_id = subscription.customer
-                profile = UserProfile.objects.get(stripe_customer_id=customer_id)
-
-                # Actualizar todos los detalles relevantes en el perfil
-                profile.update_subscription_details(subscription)
-
-                logger.info(f"Suscripción actualizada procesada para Customer {customer_id}, Sub {subscription.id}. Perfil actualizado.")
-                # Podrías notificar cambios de plan o si cancel_at_period_end cambia
-
-            except UserProfile.DoesNotExist:
-                logger.error(f"Webhook {event_type}: UserProfile no encontrado para customer {customer_id}")
-            except Exception as e:
-                logger.error(f"Webhook {event_type}: Error inesperado al procesar {customer_id}: {e}", exc_info=True)
-
-
-        elif event_type == 'customer.subscription.deleted':
-            # Suscripción eliminada/cancelada definitivamente
-             try:
-                subscription = data_object
-                customer_id = subscription.customer
-                profile = UserProfile.objects.get(stripe_customer_id=customer_id)
-
-                # Limpiar/actualizar detalles de la suscripción en el perfil
-                profile.clear_subscription_details()
-
-                logger.info(f"Suscripción eliminada procesada para Customer {customer_id}, Sub {subscription.id}. Perfil actualizado a cancelado.")
-                # Podrías enviar un email de confirmación de cancelación final
-
-             except UserProfile.DoesNotExist:
-                logger.error(f"Webhook {event_type}: UserProfile no encontrado para customer {customer_id}")
-             except Exception as e:
-                logger.error(f"Webhook {event_type}: Error inesperado al procesar {customer_id}: {e}", exc_info=True)
-
-        elif event_type == 'customer.subscription.trial_will_end':
-             # El periodo de prueba está por terminar (útil para recordatorios)
-             try:
-                 subscription = data_object
-                 customer_id = subscription.customer
-                 profile = UserProfile.objects.get(stripe_customer_id=customer_id)
-
-                 # Enviar recordatorio al usuario
-                 logger.info(f"Prueba por terminar para Customer {customer_id}, Sub {subscription.id}.")
-                 # send_trial_ending_reminder_email.delay(profile.user.id)
-
-             except UserProfile.DoesNotExist:
-                logger.error(f"Webhook {event_type}: UserProfile no encontrado para customer {customer_id}")
-             except Exception as e:
-                logger.error(f"Webhook {event_type}: Error inesperado al procesar {customer_id}: {e}", exc_info=True)
-
-
-        else:
-            # Evento no manejado
-            logger.info(f"Webhook no manejado: {event_type}, Event ID: {event.id}")
-            pass # Ignorar otros eventos si no son relevantes ahora
-
-        # 3. Confirmar recepción a Stripe
-        # Es crucial devolver 200 OK para que Stripe sepa que lo recibiste
-        # y no siga reintentando enviarlo. Incluso si hubo un error al procesar
-        # internamente, usualmente devuelves 200 (y logueas el error) a menos
-        # que sea un error temporal que Stripe debería reintentar.
-        return Response(status=status.HTTP_200_OK)
+        # 3. Confirmar recepción a Stripe de inmediato para que no reintente
+        return Response({'received': True, 'duplicate': not created}, status=status.HTTP_200_OK)
 
 
 class MembersSubscriptionsOverviewView(APIView):
@@ -646,89 +486,163 @@ class MembersSubscriptionsOverviewView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        # Inicio del mes actual (en zona temporal del servidor)
-        now = timezone.now()
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        # Todos los contadores en una sola consulta (ver membership.metrics)
+        return Response(metrics.member_counters(), status=status.HTTP_200_OK)
 
-        # Base queryset
-        qs = MembershipSubscription.objects.all()
 
-        # Miembros totales (distintos perfiles con al menos una suscripción)
-        total_members = qs.values('user_profile').distinct().count()
+class MembersMetricsHistoryView(APIView):
+    """
+    Tendencia diaria de miembros desde los snapshots guardados
+    (`manage.py snapshot_membership_metrics`). ?days= (por defecto 30, máx. 730).
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-        # Activos por flag is_active o por estado en ['active', 'trialing']
-        active_statuses = ['active', 'trialing']
-        active_members_qs = qs.filter(models.Q(is_active=True) | models.Q(status__in=active_statuses))
-        total_active_members = active_members_qs.values('user_profile').distinct().count()
+    def get(self, request, *args, **kwargs):
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 730)
+        except ValueError:
+            raise ValidationError({'days': 'Must be an integer.'})
+        since = timezone.localdate() - dt.timedelta(days=days - 1)
+        snapshots = (
+            MembershipSnapshot.objects.filter(date__gte=since).order_by('date')
+            .values('date', 'total_members', 'active_members', 'trialing_members',
+                    'new_members', 'churned_members', 'by_plan')
+        )
+        return Response(list(snapshots), status=status.HTTP_200_OK)
 
-        # Inactivos = miembros totales - activos (evita doble conteo si hay múltiples suscripciones)
-        total_inactive_members = max(total_members - total_active_members, 0)
 
-        # Nuevos suscriptores en el mes actual (miembros únicos con suscripción creada este mes)
-        new_this_month_qs = qs.filter(created_at__gte=month_start)
-        total_new_subscribers_this_month = new_this_month_qs.values('user_profile').distinct().count()
+class StripeClientStatsView(APIView):
+    """
+    Estadísticas del cliente de Stripe (llamadas, aciertos de caché, errores y
+    latencia por endpoint). Son del proceso que atiende la petición. Solo admins.
+    """
+    permission_classes = [IsAdminRole]
 
-        data = {
-            'total_members': total_members,
-            'total_active_members': total_active_members,
-            'total_inactive_members': total_inactive_members,
-            'total_new_subscribers_this_month': total_new_subscribers_this_month,
-        }
-        return Response(data, status=status.HTTP_200_OK)
+    def get(self, request, *args, **kwargs):
+        return Response({'pid': os.getpid(), 'endpoints': stripe_client.stats()}, status=status.HTTP_200_OK)
 
 
-class MembersListView(APIView):
+class MembersListView(StreamingListMixin, generics.ListAPIView):
     """
-    Lista de miembros con:
+    Lista paginada (limit/offset) de miembros con:
     - user_id
     - full_name
     - email
     - became_member_at (fecha en que se convirtió en miembro: primera suscripción)
     - plan_name (nombre del plan Nobilis actual o 'inactive' si no está activo)
+    - status (estado de la suscripción más reciente)
+
+    Todo se calcula en SQL con subconsultas por perfil. Filtros: ?plan=<id>,
+    ?status=active|inactive|<estado de Stripe>, ?joined_from / ?joined_to
+    (YYYY-MM-DD) y ?search=. Orden: ?ordering=became_member_at, full_name,
+    email o plan_name (con '-' para descendente). ?export=csv|ndjson (solo
+    admins) devuelve todas las filas filtradas, generadas por partes.
+    Accept: application/x-ndjson o application/json; stream=true (solo admins)
+    devuelve el listado completo sin paginar, con las mismas filas (ver
+    api.streaming).
     """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MembersPagination
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['user__first_name', 'user__last_name', 'user__email']
+    ordering_fields = ['became_member_at', 'full_name', 'email', 'plan_name']
+    ordering = ['-became_member_at', '-pk']
 
-    def get(self, request, *args, **kwargs):
-        # Perfiles que tienen al menos una suscripción
-        profiles_qs = (
+    active_statuses = ['active', 'trialing']
+    columns = ['user_id', 'full_name', 'email', 'became_member_at', 'plan_name', 'status']
+
+    def get_queryset(self):
+        subscriptions = MembershipSubscription.objects.filter(user_profile=OuterRef('pk'))
+        # Suscripción "actual": la más reciente activa/trialing
+        current = subscriptions.filter(
+            Q(is_active=True) | Q(status__in=self.active_statuses)
+        ).order_by('-created_at', '-pk')
+        latest = subscriptions.order_by('-created_at', '-pk')
+        first = subscriptions.order_by('created_at')
+
+        queryset = (
             UserProfile.objects
-            .filter(subscriptions__isnull=False)
-            .select_related('user')
-            .prefetch_related(
-                models.Prefetch(
-                    'subscriptions',
-                    queryset=MembershipSubscription.objects.select_related('plan').order_by('-created_at')
-                )
+            .filter(Exists(subscriptions))
+            .annotate(
+                full_name=Trim(Concat('user__first_name', Value(' '), 'user__last_name')),
+                email=F('user__email'),
+                became_member_at=Subquery(first.values('created_at')[:1]),
+                current_plan_id=Subquery(current.values('plan_id')[:1]),
+                plan_name=Coalesce(Subquery(current.values('plan__title')[:1]), Value('inactive')),
+                status=Subquery(latest.values('status')[:1]),
+                is_member_active=Exists(current),
             )
-            .annotate(became_member_at=Min('subscriptions__created_at'))
-            .distinct()
+        )
+        return self.filter_members(queryset)
+
+    def filter_members(self, queryset):
+        params = self.request.query_params
+        plan = params.get('plan')
+        if plan:
+            if not plan.isdigit():
+                raise ValidationError({'plan': 'Must be a plan id.'})
+            queryset = queryset.filter(current_plan_id=int(plan))
+
+        status_value = params.get('status')
+        if status_value == 'active':
+            queryset = queryset.filter(is_member_active=True)
+        elif status_value == 'inactive':
+            queryset = queryset.filter(is_member_active=False)
+        elif status_value:
+            queryset = queryset.filter(status=status_value)
+
+        for param, lookup in (('joined_from', 'became_member_at__date__gte'), ('joined_to', 'became_member_at__date__lte')):
+            value = params.get(param)
+            if value:
+                day = parse_date(value)
+                if day is None:
+                    raise ValidationError({param: 'Use YYYY-MM-DD.'})
+                queryset = queryset.filter(**{lookup: day})
+        return queryset
+
+    def member_rows(self, queryset):
+        return queryset.values_list(
+            'user_id', 'full_name', 'email', 'became_member_at', 'plan_name', 'status',
         )
 
-        active_statuses = ['active', 'trialing']
-        results = []
-        for profile in profiles_qs:
-            user = profile.user
-            # Seleccionar la suscripción "actual" desde las prefeteadas: la más reciente activa/trialing
-            subs = list(getattr(profile, 'subscriptions').all())
-            current_sub = next((s for s in subs if (getattr(s, 'is_active', False) or getattr(s, 'status', None) in active_statuses)), None)
-            is_active = False
-            plan_name = 'inactive'
-            if current_sub:
-                sub_status = getattr(current_sub, 'status', None)
-                is_active = getattr(current_sub, 'is_active', False) or (sub_status in active_statuses)
-                if is_active and getattr(current_sub, 'plan', None):
-                    plan_name = getattr(current_sub.plan, 'title', 'inactive') or 'inactive'
-            results.append({
-                'user_id': getattr(user, 'id', None),
-                'full_name': f"{getattr(user, 'first_name', '')} {getattr(user, 'last_name', '')}".strip(),
-                'email': getattr(user, 'email', None),
-                'became_member_at': getattr(profile, 'became_member_at', None),
-                'plan_name': plan_name,
-            })
-
-        # Orden opcional por became_member_at desc si se desea
-        results.sort(key=lambda x: (x['became_member_at'] is not None, x['became_member_at']), reverse=True)
-        return Response(results, status=status.HTTP_200_OK)
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        export_format = request.query_params.get('export')
+        if export_format in EXPORT_FORMATS:
+            return self.export(queryset, export_format)
+
+        streamed = self.stream_list(request, queryset)
+        if streamed is not None:
+            return streamed
+        page = self.paginate_queryset(self.member_rows(queryset))
+        results = [dict(zip(self.columns, row)) for row in page]
+        return self.get_paginated_response(results)
+
+    def require_admin(self):
+        # El directorio completo (export o stream) solo para admins; el resto pagina
+        if not getattr(self.request.user, 'is_admin', False):
+            raise PermissionDenied('Only admins can export the member list.')
+
+    def stream_list(self, request, queryset):
+        if stream_format(request) is not None:
+            self.require_admin()
+        return super().stream_list(request, queryset)
+
+    def stream_records(self, queryset):
+        for row in self.member_rows(queryset).iterator(chunk_size=self.stream_chunk_size):
+            yield dict(zip(self.columns, row))
+
+    def export(self, queryset, export_format):
+        self.require_admin()
+        user = self.request.user
+
+        rows = (
+            (user_id, full_name, email, became_member_at.isoformat() if became_member_at else None, plan_name, sub_status)
+            for user_id, full_name, email, became_member_at, plan_name, sub_status
+            in self.member_rows(queryset).iterator(chunk_size=2000)
+        )
+        logger.info("Exportación %s de miembros por user %s", export_format, user.pk)
+        return export_response(export_format, self.columns, rows, f'members-{timezone.now():%Y%m%d}', self.request)
 
 
 class PlanNobilis(generics.ListAPIView):
@@ -795,7 +709,7 @@ class AccountOverviewView(APIView):
         subscription_data = None  # Inicializar datos de suscripción
 
         try:
-            profile = get_object_or_404(UserProfile, user=user)
+            profile = get_object_or_404(UserProfile.objects.select_related('current_subscription__plan'), user=user)
             # Construir URL absoluta de la foto de perfil si existe
             try:
                 if getattr(profile, 'profile_picture', None) and getattr(profile.profile_picture, 'url', None):
@@ -808,12 +722,18 @@ class AccountOverviewView(APIView):
             if not subscription_id:
                 # No hay ID de suscripción guardado
                 subscription_data = None #"status": None, "message": "No subscription found."}
+            elif not mirror.wants_fresh(request):
+                # Espejo local mantenido por el webhook; si está viejo se refresca en segundo plano
+                if mirror.is_stale(profile):
+                    mirror.schedule_refresh(profile)
+                subscription_data = mirror.local_subscription_data(profile)
             else:
                 # Intentar obtener datos frescos de Stripe
                 try:
-                    stripe_subscription = stripe.Subscription.retrieve(
+                    stripe_subscription = stripe_client.retrieve_subscription(
                         subscription_id,
-                        expand=['plan.product', 'default_payment_method']
+                        expand=['plan.product', 'default_payment_method'],
+                        fresh=True,
                     )
 
                     # Opcional: Auto-corrección (como en SubscriptionStatusView)
@@ -905,7 +825,7 @@ class DependentsListView(APIView):
 
     def get(self, request, *args, **kwargs):
         User = get_user_model()
-        dependents_qs = User.objects.filter(invited_by=request.user).order_by('-date_joined')
+        dependents_qs = User.objects.filter(invited_by=request.user).select_related('role').order_by('-date_joined')
         serializer = DependentUserSerializer(dependents_qs, many=True)
         return Response({
             'status': True,
@@ -964,7 +884,7 @@ class MemberIntroductionListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        qs = MemberIntroduction.objects.all().order_by('-created_at')
+        qs = MemberIntroduction.objects.select_related('from_user__card', 'to_user__card').order_by('-created_at')
         if getattr(user, 'is_admin', False):
             return qs
         return qs.filter(models.Q(from_user=user) | models.Q(to_user=user))
@@ -1004,7 +924,7 @@ class MemberIntroductionListCreateView(generics.ListCreateAPIView):
 
         amount_cents = int((cost_decimal * 100).quantize(Decimal('1')))
         try:
-            pi = stripe.PaymentIntent.create(
+            pi = stripe_client.create_payment_intent(
                 amount=amount_cents,
                 currency='usd',
                 customer=profile.stripe_customer_id,
@@ -1064,9 +984,9 @@ class MemberIntroductionListCreateView(generics.ListCreateAPIView):
 
         introduction_content_type = ContentType.objects.get_for_model(intro_type)
 
-        Notification.objects.create(
+        notify(
+            [instance.to_user_id],
             actor=instance.from_user,
-            recipient=instance.to_user,
             verb='te ha solicitado una introducción',
             target_content_type=introduction_content_type,  # <-- Nombre correcto
             target_object_id=instance.pk  # <-- Nombre correcto
@@ -1082,7 +1002,7 @@ class MemberIntroductionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroy
 
     def get_queryset(self):
         user = self.request.user
-        return MemberIntroduction.objects.filter(Q(from_user=user) | Q(to_user=user)) #
+        return MemberIntroduction.objects.filter(Q(from_user=user) | Q(to_user=user)).select_related('from_user__card', 'to_user__card') #
 
     def perform_update(self, serializer): #
         instance = serializer.save() #
@@ -1098,14 +1018,12 @@ class MemberIntroductionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroy
 
             # --- CREA la notificación para el solicitante original ---
             if verb:
-                introduction_content_type = ContentType.objects.get_for_model(instance)
-                Notification.objects.create(
+                notify(
+                    [instance.from_user_id],
                     actor=instance.to_user,
-                    recipient=instance.from_user,
                     verb=verb,
-                    target_content_type=introduction_content_type,  # <-- Nombre correcto
-                    target_object_id=instance.pk  # <-- Nombre correcto
-                ) #
+                    target=instance,
+                )
             # ------------------------------------------------------
 
 
@@ -1115,7 +1033,7 @@ class MemberIntroductionDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        qs = MemberIntroduction.objects.all()
+        qs = MemberIntroduction.objects.select_related('from_user__card', 'to_user__card')
         if getattr(user, 'is_admin', False):
             return qs
         return qs.filter(models.Q(from_user=user) | models.Q(to_user=user))
@@ -1180,11 +1098,11 @@ class MemberIntroductionRequestView(generics.CreateAPIView):
 
         # --- 2. CREA la notificación para el destinatario ---
         # Al guardar, se activa 'notify_ws_on_create' automáticamente
-        Notification.objects.create(
+        notify(
+            [introduction.to_user_id],  # Quién recibe la solicitud
             actor=introduction.from_user,  # Quién solicita
-            recipient=introduction.to_user,  # Quién recibe la solicitud
             verb='te ha solicitado una introducción',  # El mensaje
-            action_object=introduction  # El objeto relacionado (la introducción misma)
+            target=introduction  # El objeto relacionado (la introducción misma)
         )
         # ---------------------------------------------------
 
@@ -1218,11 +1136,11 @@ class MemberIntroductionResponseView(generics.UpdateAPIView):
 
         # --- 3. ENVIAR NOTIFICACIÓN DE RESPUESTA ---
         if verb:
-            Notification.objects.create(
+            notify(
+                [introduction.from_user_id],  # Quién recibe la notificación (el solicitante original)
                 actor=introduction.to_user,  # Quién responde (el destinatario original)
-                recipient=introduction.from_user,  # Quién recibe la notificación (el solicitante original)
                 verb=verb,  # El mensaje (aceptado/rechazado)
-                action_object=introduction
+                target=introduction
             )
         # -------------------------------------------
 
@@ -0,0 +1,284 @@
+"""
+Procesamiento de webhooks de Stripe.
+
+StripeWebhookView verifica la firma, guarda el evento crudo en StripeEvent
+(único por `event_id`: los reintentos de Stripe no se duplican) y responde 200
+de inmediato. El worker `manage.py process_stripe_events --loop` aplica los
+eventos pendientes de cada cliente en orden de creación en Stripe; si uno
+falla, los posteriores del mismo cliente esperan a que se reintente (espera
+exponencial hasta STRIPE_EVENT_MAX_ATTEMPTS, después queda 'failed').
+
+Los manejadores trabajan solo con el payload del evento, sin llamadas a
+Stripe, así que `replay_stripe_events` y `backfill_stripe_events --file`
+pueden reprocesar eventos grabados sin red.
+"""
+import datetime as dt
+import logging
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from membership.models import MembershipSubscription, Plan, StripeEvent
+from membership.stripe_client import invoice_subscription_id, stripe_client
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+class ProfileNotFound(Exception):
+    """ El evento llegó antes de que el cliente de Stripe quedara asociado a un perfil; se reintenta. """
+
+
+def _customer_of(payload):
+    obj = payload.get('data', {}).get('object', {})
+    if obj.get('object') == 'customer':
+        return obj.get('id') or ''
+    customer = obj.get('customer') or ''
+    # Con expand=['customer'] llega el objeto entero
+    return customer.get('id', '') if isinstance(customer, dict) else customer
+
+
+def record_event(payload):
+    """
+    Guarda el evento (dict con la forma de la API de Stripe) si no existía.
+    Devuelve (StripeEvent, creado).
+    """
+    stripe_event, created = StripeEvent.objects.get_or_create(
+        event_id=payload['id'],
+        defaults={
+            'type': payload.get('type', ''),
+            'customer_id': _customer_of(payload),
+            'created': dt.datetime.fromtimestamp(payload.get('created') or 0, tz=dt.timezone.utc),
+            'payload': payload,
+        },
+    )
+    if created:
+        # Lo que cambió en Stripe ya no debe servirse desde la caché
+        stripe_client.invalidate_event(payload)
+    return stripe_event, created
+
+
+# --- Manejadores ---
+
+def _to_datetime(ts):
+    return dt.datetime.fromtimestamp(ts, tz=dt.timezone.utc) if ts else None
+
+
+def _profile_for(customer_id, subscription_id=None):
+    from nsocial.models import UserProfile
+
+    profile = None
+    if customer_id:
+        profile = UserProfile.objects.filter(stripe_customer_id=customer_id).first()
+    if profile is None and subscription_id:
+        profile = UserProfile.objects.filter(stripe_subscription_id=subscription_id).first()
+    return profile
+
+
+def apply_subscription_event(event):
+    """ customer.subscription.created / updated / deleted """
+    sub = event.data.object
+    profile = _profile_for(sub.get('customer'), sub.get('id'))
+
+    # Resolver plan a partir del price del primer item
+    price = {}
+    items = sub.get('items') or {}
+    if items.get('data'):
+        price = items['data'][0].get('price') or {}
+    price_id = price.get('id')
+    plan = Plan.objects.filter(stripe_plan_id=price_id).first() if price_id else None
+
+    status_value = sub.get('status') or ''
+    cancel_flag = sub.get('cancel_at_period_end') or False
+    current_period_end = _to_datetime(sub.get('current_period_end'))
+    is_active = status_value in ['active', 'trialing'] and not sub.get('canceled_at')
+
+    if profile is None:
+        # user_profile es obligatorio en MembershipSubscription. El checkout guarda
+        # stripe_customer_id después de crear la suscripción: el worker lo reintenta
+        raise ProfileNotFound(f"No hay perfil para customer {sub.get('customer')}")
+
+    sub_obj, _ = MembershipSubscription.objects.update_or_create(
+        stripe_subscription_id=sub.get('id'),
+        defaults={
+            'user_profile': profile,
+            'plan': plan,
+            'status': status_value,
+            'cancel_at_period_end': cancel_flag,
+            'current_period_end': current_period_end,
+            'is_active': is_active,
+            'currency': price.get('currency') or '',
+            'interval_count': (price.get('recurring') or {}).get('interval_count'),
+        }
+    )
+
+    profile.stripe_subscription_id = sub.get('id')
+    profile.subscription_status = status_value
+    profile.subscription_current_period_end = current_period_end
+    profile.cancel_at_period_end = cancel_flag
+    profile.current_subscription = sub_obj
+    profile.subscription_synced_at = timezone.now()
+    profile.save()
+
+
+def apply_invoice_paid(event):
+    """
+    invoice.payment_succeeded: la suscripción queda activa hasta el fin del
+    periodo facturado. El customer.subscription.updated que manda Stripe
+    trae el resto de detalles; aquí no se consulta a Stripe.
+    """
+    invoice = event.data.object
+    subscription_id = invoice_subscription_id(invoice)
+    if not subscription_id:
+        return
+    profile = _profile_for(invoice.get('customer'), subscription_id)
+    if profile is None:
+        # Misma carrera con el checkout que en apply_subscription_event
+        raise ProfileNotFound(f"No hay perfil para customer {invoice.get('customer')}")
+
+    lines = (invoice.get('lines') or {}).get('data') or []
+    period_end = _to_datetime(max((line.get('period') or {}).get('end') or 0 for line in lines)) if lines else None
+
+    profile.stripe_subscription_id = subscription_id
+    profile.subscription_status = 'active'
+    if period_end:
+        profile.subscription_current_period_end = period_end
+    profile.subscription_synced_at = timezone.now()
+    profile.save()
+
+    updates = {'status': 'active', 'is_active': True}
+    if period_end:
+        updates['current_period_end'] = period_end
+    MembershipSubscription.objects.filter(stripe_subscription_id=subscription_id).update(**updates)
+    logger.info("Pago exitoso procesado para Customer %s, Sub %s.", invoice.get('customer'), subscription_id)
+
+
+def apply_invoice_failed(event):
+    invoice = event.data.object
+    subscription_id = invoice_subscription_id(invoice)
+    if not subscription_id:
+        return
+    profile = _profile_for(invoice.get('customer'), subscription_id)
+    if profile is None:
+        # Misma carrera con el checkout que en apply_subscription_event
+        raise ProfileNotFound(f"No hay perfil para customer {invoice.get('customer')}")
+
+    # Stripe también manda customer.subscription.updated con el estado definitivo
+    profile.subscription_status = 'past_due'
+    profile.save()
+    MembershipSubscription.objects.filter(stripe_subscription_id=subscription_id).update(status='past_due')
+    logger.warning("Pago fallido procesado para Customer %s, Sub %s.", invoice.get('customer'), subscription_id)
+
+
+def log_trial_will_end(event):
+    sub = event.data.object
+    logger.info("Prueba por terminar para Customer %s, Sub %s.", sub.get('customer'), sub.get('id'))
+
+
+HANDLERS = {
+    'customer.subscription.created': apply_subscription_event,
+    'customer.subscription.updated': apply_subscription_event,
+    'customer.subscription.deleted': apply_subscription_event,
+    'invoice.payment_succeeded': apply_invoice_paid,
+    'invoice.payment_failed': apply_invoice_failed,
+    'customer.subscription.trial_will_end': log_trial_will_end,
+}
+
+
+# --- Aplicación ---
+
+def apply_event(stripe_event):
+    handler = HANDLERS.get(stripe_event.type)
+    if handler is None:
+        logger.info("Webhook no manejado: %s, Event ID: %s", stripe_event.type, stripe_event.event_id)
+        return
+    handler(stripe.Event.construct_from(stripe_event.payload, settings.STRIPE_SECRET_KEY))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def _pending(customer_id):
+    return StripeEvent.objects.filter(
+        customer_id=customer_id, status=StripeEvent.STATUS_PENDING,
+    ).order_by('created', 'pk')
+
+
+def _lock_pending(customer_id):
+    return list(_pending(customer_id).select_for_update(skip_locked=True))
+
+
+def process_customer(customer_id, now=None):
+    """
+    Aplica en orden los eventos pendientes de un cliente. Se detiene en el
+    primero que falle o que aún no deba reintentarse. Devuelve (aplicados, fallidos).
+    """
+    now = now or timezone.now()
+    applied = failed = 0
+    with transaction.atomic():
+        # skip_locked salta filas, no clientes: si otro worker tiene bloqueados eventos
+        # anteriores de este cliente, aquí solo se aplican los que van antes que ellos
+        events = []
+        for event, pk in zip(_lock_pending(customer_id), _pending(customer_id).values_list('pk', flat=True)):
+            if event.pk != pk:
+                break
+            events.append(event)
+        done = []
+        for event in events:
+            if event.next_attempt_at > now:
+                break
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    apply_event(event)
+            except Exception as e:
+                failed += 1
+                event.last_error = str(e)[:2000]
+                if event.attempts >= settings.STRIPE_EVENT_MAX_ATTEMPTS:
+                    event.status = StripeEvent.STATUS_FAILED
+                    logger.error("Evento Stripe %s descartado tras %s intentos: %s", event.event_id, event.attempts, e, exc_info=True)
+                    done.append(event)
+                    continue
+                event.next_attempt_at = now + retry_delay(event.attempts)
+                logger.warning("Evento Stripe %s falló (intento %s): %s", event.event_id, event.attempts, e)
+                done.append(event)
+                break
+            event.status = StripeEvent.STATUS_PROCESSED
+            event.processed_at = timezone.now()
+            event.last_error = ''
+            applied += 1
+            done.append(event)
+        StripeEvent.objects.bulk_update(
+            done, ['status', 'attempts', 'next_attempt_at', 'last_error', 'processed_at'],
+        )
+    return applied, failed
+
+
+def process_pending(limit=None):
+    """ Procesa los clientes con eventos pendientes vencidos. Devuelve (aplicados, fallidos). """
+    now = timezone.now()
+    customers = (
+        StripeEvent.objects.filter(status=StripeEvent.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by('customer_id').values_list('customer_id', flat=True).distinct()
+    )
+    if limit:
+        customers = customers[:limit]
+    applied = failed = 0
+    for customer_id in list(customers):
+        a, f = process_customer(customer_id, now=now)
+        applied += a
+        failed += f
+    return applied, failed
+
+
+def requeue(queryset):
+    """ Vuelve a dejar pendientes los eventos indicados (para replay). """
+    return queryset.update(
+        status=StripeEvent.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(), last_error='',
+    )
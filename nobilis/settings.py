@@ -81,7 +81,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'djangorestframework_camel_case.middleware.CamelCaseMiddleWare',
+    'api.camel_case.CamelCaseMiddleware',
 ]
 
 ROOT_URLCONF = 'nobilis.urls'
@@ -227,23 +227,32 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
+
+    # Renueva el access token con los claims de nsocial.tokens al día
+    "TOKEN_REFRESH_SERIALIZER": "nsocial.tokens.ClaimsTokenRefreshSerializer",
 }
 
+# Autenticación por claims en peticiones de lectura (nsocial.authentication)
+JWT_CLAIMS_AUTH = config("JWT_CLAIMS_AUTH", cast=bool, default=False)
+JWT_CLAIMS_VERSION_TTL = config("JWT_CLAIMS_VERSION_TTL", cast=int, default=30)  # segundos
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication; con JWT_CLAIMS_AUTH las lecturas usan los claims del token
+        'nsocial.authentication.ClaimsJWTAuthentication',
     ), 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination', 
     'PAGE_SIZE': 5,
     'DJANGO_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_RENDERER_CLASSES': (
-        'djangorestframework_camel_case.render.CamelCaseJSONRenderer',
+        # api.camel_case: misma salida que djangorestframework_camel_case, con las claves memorizadas
+        'api.camel_case.CamelCaseJSONRenderer',
         'djangorestframework_camel_case.render.CamelCaseBrowsableAPIRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
-        'djangorestframework_camel_case.parser.CamelCaseFormParser',
-        'djangorestframework_camel_case.parser.CamelCaseMultiPartParser',
-        'djangorestframework_camel_case.parser.CamelCaseJSONParser',
+        'api.camel_case.CamelCaseFormParser',
+        'api.camel_case.CamelCaseMultiPartParser',
+        'api.camel_case.CamelCaseJSONParser',
     ),
     'DEFAULT_THROTTLE_RATES': {
             'anon': '100/day',  # For anonymous users
@@ -251,6 +260,13 @@ REST_FRAMEWORK = {
     }
 }
 
+# Segundos que una respuesta de catálogo puede vivir en caché (además de la invalidación por signals)
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", cast=int, default=300)
+
+# Autocompletado de ciudades (api.city_index): resultados por búsqueda y presupuesto de tiempo
+CITY_AUTOCOMPLETE_LIMIT = config("CITY_AUTOCOMPLETE_LIMIT", cast=int, default=20)
+CITY_AUTOCOMPLETE_BUDGET_MS = config("CITY_AUTOCOMPLETE_BUDGET_MS", cast=int, default=50)
+
 CORS_ALLOW_ALL_ORIGINS = config("CORS_ALLOW_ALL_ORIGINS", cast=bool, default=True)
 
 CORS_ALLOW_CREDENTIALS = config("CORS_ALLOW_CREDENTIALS", cast=bool, default=True)
@@ -283,6 +299,16 @@ EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", cast=str, default=None)
 EMAIL_USE_TLS = config("EMAIL_USE_TLS", cast=bool, default=True)  # Use EMAIL_PORT 587 for TLS
 EMAIL_USE_SSL = config("EMAIL_USE_SSL", cast=bool, default=False)  # EUse MAIL_PORT 465 for SSL
 
+# Cola de correo saliente (notification.mail); el worker es `manage.py send_queued_mail --loop`
+MAIL_QUEUE_SYNC = config("MAIL_QUEUE_SYNC", cast=bool, default=False)
+MAIL_QUEUE_BATCH_SIZE = config("MAIL_QUEUE_BATCH_SIZE", cast=int, default=50)
+MAIL_QUEUE_MAX_ATTEMPTS = config("MAIL_QUEUE_MAX_ATTEMPTS", cast=int, default=5)
+MAIL_QUEUE_RETRY_BASE = config("MAIL_QUEUE_RETRY_BASE", cast=int, default=60)  # segundos
+MAIL_QUEUE_RETRY_MAX = config("MAIL_QUEUE_RETRY_MAX", cast=int, default=3600)
+
+# Segundos que se cachea la respuesta de nsocial.emails.email_status
+EMAIL_LOOKUP_CACHE_TIMEOUT = config("EMAIL_LOOKUP_CACHE_TIMEOUT", cast=int, default=60)
+
 ADMIN_USER_NAME=config("ADMIN_USER_NAME", default="Admin user")
 ADMIN_USER_EMAIL=config("ADMIN_USER_EMAIL", default=None)
 
@@ -298,12 +324,42 @@ if all([ADMIN_USER_NAME, ADMIN_USER_EMAIL]):
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET')
-
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
-    }
+# Eventos de webhook (membership.webhooks); el worker es `manage.py process_stripe_events --loop`
+STRIPE_EVENT_MAX_ATTEMPTS = config('STRIPE_EVENT_MAX_ATTEMPTS', cast=int, default=8)
+# TTL (segundos) de las lecturas cacheadas por membership.stripe_client; 0 = sin caché
+STRIPE_CACHE_TTLS = {
+    'price.list': 300,
+    'payment_method.retrieve': 300,
+    'subscription.retrieve': 30,
 }
+# Antigüedad máxima del espejo local de suscripción antes de refrescarlo en segundo plano
+SUBSCRIPTION_MIRROR_MAX_AGE = timedelta(minutes=config('SUBSCRIPTION_MIRROR_MAX_AGE_MINUTES', cast=int, default=60))
+
+# Caché de usuarios del handshake WebSocket (notification.auth_cache)
+WS_USER_CACHE_TTL = config("WS_USER_CACHE_TTL", cast=int, default=60)
+WS_USER_CACHE_SIZE = config("WS_USER_CACHE_SIZE", cast=int, default=10000)
+
+# Channel layer (ver notification.layers). En producción usar REDIS_URL (requiere
+# channels_redis): es la única capa que comparten los dynos web y los workers.
+# CHANNEL_LAYER_PATH activa explícitamente la capa SQLite, solo para desarrollo local
+# con varios procesos en la misma máquina. Sin ninguna de las dos queda la
+# InMemoryChannelLayer de arriba (un solo proceso).
+REDIS_URL = config("REDIS_URL", default=None)
+CHANNEL_LAYER_PATH = config("CHANNEL_LAYER_PATH", default=None)
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "notification.layers.RedisPresenceChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        }
+    }
+elif CHANNEL_LAYER_PATH:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "notification.layers.SQLiteChannelLayer",
+            "CONFIG": {"path": CHANNEL_LAYER_PATH},
+        }
+    }
 
 AWS_ACCESS_KEY_ID=config("AWS_ACCESS_KEY_ID", cast=str, default=None)
 AWS_SECRET_ACCESS_KEY=config("AWS_SECRET_ACCESS_KEY", cast=str, default=None)
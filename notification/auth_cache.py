@@ -0,0 +1,68 @@
+"""
+Caché en memoria de usuarios para el handshake del WebSocket.
+
+Evita una consulta (y un hilo de database_sync_to_async) por conexión cuando
+muchos clientes se reconectan a la vez. Las entradas duran WS_USER_CACHE_TTL
+segundos y como máximo se guardan WS_USER_CACHE_SIZE usuarios (LRU). Los
+signals de notification.signals la invalidan al guardar/borrar un usuario
+(desactivación, cambio de rol) o un rol; el TTL cubre los cambios hechos en
+otros procesos o con queryset.update().
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class UserCache:
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, user_id):
+        # El claim user_id puede venir como str; las claves son siempre str
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, user):
+        user_id = str(user_id)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id=None):
+        """ Quita un usuario, o todos si no se indica. """
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(user_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+user_cache = UserCache(ttl=settings.WS_USER_CACHE_TTL, max_size=settings.WS_USER_CACHE_SIZE)
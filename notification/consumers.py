@@ -2,6 +2,7 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from asgiref.sync import async_to_sync
+from .presence import mark_connected, mark_disconnected
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
@@ -13,11 +14,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         self.user = user
         self.group_name = f'user_{user.id}_notifications'
         await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await mark_connected(self.channel_layer, user.id, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await mark_disconnected(self.channel_layer, self.user.id, self.channel_name)
 
     async def receive(self, text_data=None, bytes_data=None):
         # For now, we only support ping/pong or mark-all-read from WS if needed
@@ -35,3 +38,5 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         payload = event.get('payload', {})
         await self.send(text_data=json.dumps(payload))
 
+    async def unread_count(self, event):
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'count': event.get('count', 0)}))
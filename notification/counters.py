@@ -0,0 +1,64 @@
+"""
+Contador de no leídas por usuario (UnreadCounter).
+
+Se mantiene con UPDATEs atómicos (F()) al crear notificaciones, marcarlas como
+leídas o borrarlas (post_delete en notification.signals), así
+/notifications/unread-count/ es una lectura por PK. La fila se crea en 0 junto
+con el usuario; los usuarios anteriores (o creados con bulk_create) la
+obtienen la primera vez que se consulta, con un recuento bajo bloqueo.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Notification, UnreadCounter
+
+
+def ensure_counters(user_ids):
+    """ Contadores en 0 para usuarios recién creados (aún no tienen notificaciones). """
+    UnreadCounter.objects.bulk_create([UnreadCounter(user_id=pk, unread=0) for pk in user_ids], ignore_conflicts=True)
+
+
+def _seed(user_id):
+    # Primero la fila (así los increment() ya no se pierden) y después el COUNT con la
+    # fila bloqueada: un increment() concurrente espera al recuento o el recuento a él.
+    UnreadCounter.objects.get_or_create(user_id=user_id, defaults={'unread': 0})
+    with transaction.atomic():
+        counter = UnreadCounter.objects.select_for_update().get(user_id=user_id)
+        counter.unread = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        counter.save(update_fields=['unread'])
+    return counter.unread
+
+
+def unread_count(user_id):
+    count = UnreadCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+    if count is not None:
+        return count
+    return _seed(user_id)
+
+
+def unread_counts(user_ids):
+    """ {user_id: no leídas} para varios usuarios. """
+    counts = dict(UnreadCounter.objects.filter(user_id__in=user_ids).values_list('user_id', 'unread'))
+    for user_id in set(user_ids) - set(counts):
+        counts[user_id] = unread_count(user_id)
+    return counts
+
+
+def increment(user_ids):
+    """ Suma 1 por cada aparición del usuario en `user_ids` (un UPDATE por cantidad distinta). """
+    by_amount = {}
+    for user_id, amount in Counter(user_ids).items():
+        by_amount.setdefault(amount, []).append(user_id)
+    for amount, ids in by_amount.items():
+        UnreadCounter.objects.filter(user_id__in=ids).update(unread=F('unread') + amount)
+
+
+def decrement(user_id, amount=1):
+    UnreadCounter.objects.filter(user_id=user_id).update(unread=Greatest(F('unread') - amount, 0))
+
+
+def reset(user_id):
+    UnreadCounter.objects.filter(user_id=user_id).update(unread=0)
@@ -0,0 +1,113 @@
+"""
+Creación y envío de notificaciones en lote.
+
+`notify()` crea una fila por destinatario con un solo bulk_create y, cuando la
+transacción hace commit, publica todos los mensajes WebSocket en una única
+llamada al channel layer (los group_send se esperan juntos). Así el costo de
+una petición no crece con el número de destinatarios ni se envían mensajes de
+filas que terminaron en rollback. Solo se publica a usuarios conectados (ver
+notification.presence).
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from . import counters
+from .models import Notification
+from .presence import online_user_ids
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def group_name_for(user_id):
+    return f'user_{user_id}_notifications'
+
+
+def notify(recipients, verb, actor=None, target=None, description='',
+           target_content_type=None, target_object_id=None):
+    """
+    Crea una notificación para cada destinatario (usuarios o IDs) y agenda su
+    envío por WebSocket tras el commit. Devuelve las notificaciones creadas.
+    """
+    if target is not None:
+        target_content_type = ContentType.objects.get_for_model(target)
+        target_object_id = target.pk
+
+    notifications = [
+        Notification(
+            recipient_id=getattr(recipient, 'pk', recipient),
+            actor=actor,
+            verb=verb,
+            description=description,
+            target_content_type=target_content_type,
+            target_object_id=target_object_id,
+        )
+        for recipient in recipients
+    ]
+    if not notifications:
+        return []
+    Notification.objects.bulk_create(notifications)
+    counters.increment([n.recipient_id for n in notifications])
+    transaction.on_commit(lambda: publish(notifications))
+    return notifications
+
+
+def unread_count_message(count):
+    return {'type': 'unread_count', 'count': count}
+
+
+def publish(notifications):
+    """
+    Envía las notificaciones (y el nuevo contador de no leídas) a los grupos de
+    sus destinatarios en un solo lote. Los destinatarios sin sockets abiertos
+    se omiten (ni se serializan).
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not notifications:
+        return
+    online = online_user_ids({n.recipient_id for n in notifications}, channel_layer)
+    if not online:
+        return
+    messages = [
+        (group_name_for(n.recipient_id), {'type': 'notify', 'payload': NotificationSerializer(n).data})
+        for n in notifications if n.recipient_id in online
+    ]
+    messages += [
+        (group_name_for(user_id), unread_count_message(count))
+        for user_id, count in counters.unread_counts(online).items()
+    ]
+    send_batch(channel_layer, messages)
+
+
+def publish_unread_count(user_id):
+    """ Envía el contador de no leídas al usuario si está conectado. """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not online_user_ids([user_id], channel_layer):
+        return
+    send_batch(channel_layer, [(group_name_for(user_id), unread_count_message(counters.unread_count(user_id)))])
+
+
+def send_batch(channel_layer, messages):
+    if hasattr(channel_layer, 'group_send_batch'):
+        # Corre en on_commit: un fallo de la capa no debe convertirse en un 500
+        try:
+            async_to_sync(channel_layer.group_send_batch)(messages)
+        except Exception as e:
+            logger.error("Error publicando notificaciones por WebSocket: %s", e, exc_info=True)
+        return
+
+    async def send_all():
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, message) for group, message in messages),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Error publicando notificación por WebSocket: %s", result)
+
+    async_to_sync(send_all)()
@@ -0,0 +1,268 @@
+"""
+Channel layers para las notificaciones.
+
+- SQLiteChannelLayer: capa entre procesos sin broker externo. Mensajes, grupos y
+  presencia viven en un archivo SQLite compartido por todos los workers de una
+  misma máquina (daphne x N, manage.py). Solo para desarrollo local y tests, y
+  solo si se pide con CHANNEL_LAYER_PATH: el archivo no se comparte entre hosts
+  (los dynos del Procfile no se verían) y cada receive() lo consulta en bucle.
+- RedisPresenceChannelLayer: RedisChannelLayer de channels_redis con la misma
+  API de presencia; se usa cuando hay REDIS_URL. Es la capa de producción: la
+  única que comparten los dynos web y los workers.
+
+Presencia: cada socket abierto registra (usuario, canal) al conectar y lo borra
+al desconectar; las entradas caducan con group_expiry por si un proceso muere
+sin desconectar. `presence_online()` permite no serializar ni publicar para
+usuarios sin sockets abiertos (ver notification.fanout.publish).
+"""
+import asyncio
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id);
+CREATE TABLE IF NOT EXISTS groups (
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (grp, channel)
+);
+CREATE TABLE IF NOT EXISTS presence (
+    key TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (key, channel)
+);
+"""
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Channel layer respaldada por un archivo SQLite (modo WAL). `receive()`
+    consulta el archivo cada `poll_interval` segundos mientras no haya mensajes.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.05, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.client_prefix = uuid.uuid4().hex[:12]
+        self._local = threading.local()
+        self._schema_ready = False
+
+    # --- Acceso al archivo (en hilos, fuera del event loop) ---
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        if not self._schema_ready:
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _write(self, fn, *args):
+        conn = self._db()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn, *args)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def _read(self, fn, *args):
+        return fn(self._db(), *args)
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._write, fn, *args)
+
+    # --- Channel layer API ---
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        await self._run(self._send, channel, pickle.dumps(message))
+
+    def _send(self, conn, channel, body):
+        now = time.time()
+        (queued,) = conn.execute(
+            'SELECT COUNT(*) FROM messages WHERE channel = ? AND expires > ?', (channel, now)
+        ).fetchone()
+        if queued >= self.get_capacity(channel):
+            raise ChannelFull(channel)
+        conn.execute('INSERT INTO messages (channel, expires, body) VALUES (?, ?, ?)',
+                     (channel, now + self.expiry, body))
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        while True:
+            body = await asyncio.to_thread(self._pop, channel)
+            if body is not None:
+                return pickle.loads(body)
+            await asyncio.sleep(self.poll_interval)
+
+    def _pop(self, channel):
+        # Lectura sin bloqueo primero; solo se toma el lock de escritura si hay mensaje
+        pending = self._db().execute('SELECT 1 FROM messages WHERE channel = ? LIMIT 1', (channel,)).fetchone()
+        if pending is None:
+            return None
+        return self._write(self._take, channel)
+
+    def _take(self, conn, channel):
+        conn.execute('DELETE FROM messages WHERE expires <= ?', (time.time(),))
+        row = conn.execute(
+            'SELECT id, body FROM messages WHERE channel = ? ORDER BY id LIMIT 1', (channel,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute('DELETE FROM messages WHERE id = ?', (row[0],))
+        return row[1]
+
+    async def new_channel(self, prefix='specific'):
+        return f'{prefix}.{self.client_prefix}!{uuid.uuid4().hex[:12]}'
+
+    async def flush(self):
+        def _flush(conn):
+            conn.execute('DELETE FROM messages')
+            conn.execute('DELETE FROM groups')
+            conn.execute('DELETE FROM presence')
+        await self._run(_flush)
+
+    async def close(self):
+        pass
+
+    # --- Grupos ---
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._upsert, 'groups', 'grp', group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._delete, 'groups', 'grp', group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._run(self._group_send, group, pickle.dumps(message))
+
+    async def group_send_batch(self, messages):
+        """ Varios group_send [(grupo, mensaje), ...] en una sola transacción. """
+        bodies = []
+        for group, message in messages:
+            assert isinstance(message, dict), "Message is not a dict"
+            self.require_valid_group_name(group)
+            bodies.append((group, pickle.dumps(message)))
+
+        def _batch(conn):
+            for group, body in bodies:
+                self._group_send(conn, group, body)
+        await self._run(_batch)
+
+    def _group_send(self, conn, group, body):
+        now = time.time()
+        channels = [row[0] for row in conn.execute(
+            'SELECT channel FROM groups WHERE grp = ? AND expires > ?', (group, now)
+        )]
+        for channel in channels:
+            try:
+                self._send(conn, channel, body)
+            except ChannelFull:
+                # Igual que las demás capas: un canal lleno no detiene el envío al grupo
+                pass
+
+    def _upsert(self, conn, table, column, key, channel):
+        conn.execute(
+            f'INSERT OR REPLACE INTO {table} ({column}, channel, expires) VALUES (?, ?, ?)',
+            (key, channel, time.time() + self.group_expiry),
+        )
+
+    def _delete(self, conn, table, column, key, channel):
+        conn.execute(f'DELETE FROM {table} WHERE {column} = ? AND channel = ?', (key, channel))
+
+    # --- Presencia ---
+
+    async def presence_add(self, key, channel):
+        await self._run(self._upsert, 'presence', 'key', key, channel)
+
+    async def presence_discard(self, key, channel):
+        await self._run(self._delete, 'presence', 'key', key, channel)
+
+    async def presence_online(self, keys):
+        """ Subconjunto de `keys` con al menos un socket abierto. """
+        keys = list(keys)
+        if not keys:
+            return set()
+
+        def _online(conn):
+            placeholders = ','.join('?' * len(keys))
+            rows = conn.execute(
+                f'SELECT DISTINCT key FROM presence WHERE expires > ? AND key IN ({placeholders})',
+                [time.time(), *keys],
+            )
+            return {row[0] for row in rows}
+        # Solo lectura: sin BEGIN IMMEDIATE (no bloquea a los que escriben)
+        return await asyncio.to_thread(self._read, _online)
+
+
+try:
+    from channels_redis.core import RedisChannelLayer
+except ImportError:  # channels_redis está en requirements.txt; sin él, REDIS_URL no puede funcionar
+
+    class RedisChannelLayer:
+        def __init__(self, *args, **kwargs):
+            raise ImproperlyConfigured('REDIS_URL requiere channels_redis (pip install -r requirements.txt).')
+
+
+class RedisPresenceChannelLayer(RedisChannelLayer):
+    """ RedisChannelLayer con la API de presencia de SQLiteChannelLayer. """
+
+    def _presence_key(self, key):
+        return f'{self.prefix}:presence:{key}'
+
+    async def presence_add(self, key, channel):
+        presence_key = self._presence_key(key)
+        connection = self.connection(self.consistent_hash(key))
+        await connection.zadd(presence_key, {channel: time.time()})
+        await connection.expire(presence_key, self.group_expiry)
+
+    async def presence_discard(self, key, channel):
+        connection = self.connection(self.consistent_hash(key))
+        await connection.zrem(self._presence_key(key), channel)
+
+    async def presence_online(self, keys):
+        online = set()
+        cutoff = time.time() - self.group_expiry
+        for key in keys:
+            connection = self.connection(self.consistent_hash(key))
+            presence_key = self._presence_key(key)
+            await connection.zremrangebyscore(presence_key, 0, cutoff)
+            if await connection.zcard(presence_key):
+                online.add(key)
+        return online
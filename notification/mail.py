@@ -0,0 +1,148 @@
+"""
+Cola de correos salientes.
+
+Las vistas no hablan con el servidor SMTP: `queue_mail()` guarda el correo en
+OutboundEmail dentro de la misma transacción de la petición (si hay rollback no
+se envía nada) y el worker `manage.py send_queued_mail --loop` los envía en
+lotes, reutilizando una sola conexión SMTP por lote. Un fallo reprograma el
+correo con espera exponencial hasta MAIL_QUEUE_MAX_ATTEMPTS; después queda en
+'failed' (ver queue_stats() y el admin).
+
+Con backends que no salen de la máquina (locmem en tests, console en local) o
+MAIL_QUEUE_SYNC=True el correo se envía tras el commit, sin worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+_LOCAL_BACKENDS = (
+    'django.core.mail.backends.locmem.EmailBackend',
+    'django.core.mail.backends.console.EmailBackend',
+)
+
+
+def sends_synchronously():
+    return getattr(settings, 'MAIL_QUEUE_SYNC', False) or settings.EMAIL_BACKEND in _LOCAL_BACKENDS
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """ Misma firma que send_mail(); devuelve el OutboundEmail creado. """
+    email = OutboundEmail.objects.create(
+        subject=subject[:255],
+        body=message,
+        from_email=from_email or '',
+        to=list(recipient_list),
+    )
+    if sends_synchronously():
+        transaction.on_commit(lambda: send_pending(ids=[email.pk]))
+    return email
+
+
+def queue_mass_mail(datatuple):
+    """
+    Como send_mass_mail(): `datatuple` de (subject, message, from_email,
+    recipient_list). Un solo INSERT para todo el lote; devuelve los OutboundEmail.
+    """
+    emails = OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject[:255], body=message, from_email=from_email or '', to=list(recipients))
+        for subject, message, from_email, recipients in datatuple
+    ])
+    if emails and sends_synchronously():
+        ids = [email.pk for email in emails]
+        transaction.on_commit(lambda: send_pending(batch_size=len(ids), ids=ids))
+    return emails
+
+
+def retry_delay(attempts):
+    """ Espera antes del siguiente intento: base * 2^(intentos-1), con tope. """
+    delay = settings.MAIL_QUEUE_RETRY_BASE * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.MAIL_QUEUE_RETRY_MAX))
+
+
+def _message(email, connection):
+    return EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        connection=connection,
+    )
+
+
+def _failed(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    if email.attempts >= settings.MAIL_QUEUE_MAX_ATTEMPTS:
+        email.status = OutboundEmail.STATUS_FAILED
+        logger.error("Correo %s descartado tras %s intentos: %s", email.pk, email.attempts, error)
+    else:
+        email.next_attempt_at = now + retry_delay(email.attempts)
+        logger.warning("Fallo enviando correo %s (intento %s): %s", email.pk, email.attempts, error)
+
+
+def send_pending(batch_size=None, ids=None):
+    """
+    Envía un lote de correos pendientes cuyo próximo intento ya venció.
+    Devuelve (enviados, fallidos). Las filas del lote quedan bloqueadas
+    (skip_locked) para que varios workers no envíen el mismo correo.
+    """
+    batch_size = batch_size or settings.MAIL_QUEUE_BATCH_SIZE
+    now = timezone.now()
+    sent = failed = 0
+
+    with transaction.atomic():
+        pending = OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+            status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now,
+        )
+        if ids is not None:
+            pending = pending.filter(pk__in=ids)
+        batch = list(pending.order_by('next_attempt_at', 'pk')[:batch_size])
+        if not batch:
+            return 0, 0
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            for email in batch:
+                _failed(email, e, now)
+            OutboundEmail.objects.bulk_update(batch, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+            return 0, len(batch)
+
+        try:
+            for email in batch:
+                try:
+                    connection.send_messages([_message(email, connection)])
+                except Exception as e:
+                    _failed(email, e, now)
+                    failed += 1
+                else:
+                    email.status = OutboundEmail.STATUS_SENT
+                    email.sent_at = timezone.now()
+                    email.attempts += 1
+                    email.last_error = ''
+                    sent += 1
+        finally:
+            connection.close()
+        OutboundEmail.objects.bulk_update(
+            batch, ['attempts', 'last_error', 'status', 'next_attempt_at', 'sent_at'],
+        )
+    return sent, failed
+
+
+def queue_stats():
+    """ Conteos por estado, en una sola consulta. """
+    return OutboundEmail.objects.aggregate(
+        pending=Count('pk', filter=Q(status=OutboundEmail.STATUS_PENDING)),
+        failed=Count('pk', filter=Q(status=OutboundEmail.STATUS_FAILED)),
+        sent=Count('pk', filter=Q(status=OutboundEmail.STATUS_SENT)),
+    )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notification.mail import queue_stats, send_pending
+
+
+class Command(BaseCommand):
+    help = "Sends queued outbound emails (OutboundEmail). With --loop it keeps running as the mail worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails sent per SMTP connection.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls when the queue is idle.')
+        parser.add_argument('--stats', action='store_true', help='Print pending/failed/sent counts and exit.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = queue_stats()
+            self.stdout.write(f"pending={stats['pending']} failed={stats['failed']} sent={stats['sent']}")
+            return
+
+        while True:
+            close_old_connections()
+            sent, failed = send_pending(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} email(s), {failed} failed.')
+            if not options['loop']:
+                break
+            if not (sent or failed):
+                time.sleep(options['interval'])
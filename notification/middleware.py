@@ -5,32 +5,41 @@ from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
+from .auth_cache import user_cache
 
 
 @database_sync_to_async
-def get_user_from_token(token_key):
-    """
-    Intenta autenticar al usuario basado en el token JWT.
-    """
+def load_user(user_id):
+    """ Carga el usuario activo (con su rol) y lo guarda en la caché. """
     # 1. Importa y obtén el modelo User AQUÍ DENTRO.
     from django.contrib.auth import get_user_model
     User = get_user_model()
 
-    try:
-        # 2. Decodificar el token
-        token = AccessToken(token_key)
+    user = User.objects.select_related('role').filter(id=user_id, is_active=True).first()
+    if user is not None:
+        user_cache.set(user_id, user)
+    return user
 
-        # 3. Obtener el ID de usuario del token
-        user_id = token['user_id']
 
-        # 4. Obtener el usuario de la base de datos
-        return User.objects.get(id=user_id)
-
-    except (InvalidToken, TokenError, User.DoesNotExist, KeyError):
-        # 5. Si el token es inválido o el usuario no existe,
-        # devolver un usuario anónimo.
+async def get_user_from_token(token_key):
+    """
+    Intenta autenticar al usuario basado en el token JWT. Si el usuario está
+    en la caché no se consulta la base de datos.
+    """
+    try:
+        # 2. Decodificar el token y obtener el ID de usuario
+        user_id = AccessToken(token_key)['user_id']
+    except (InvalidToken, TokenError, KeyError):
         return AnonymousUser()
 
+    # 3. Caché primero; si no, la base de datos
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await load_user(user_id)
+
+    # 4. Si el usuario no existe o está inactivo, devolver un usuario anónimo.
+    return user or AnonymousUser()
+
 
 class JwtAuthMiddleware:
     """
@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 
 class Notification(models.Model):
@@ -36,6 +37,64 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listado paginado por cursor y filtro de no leídas
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notif_recipient_read_created'),
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_created'),
+        ]
 
     def __str__(self) -> str:
         return f"Notification to {self.recipient} - {self.verb}"
+
+
+class UnreadCounter(models.Model):
+    """
+    Contador de notificaciones no leídas por usuario (ver notification.counters).
+    Se crea junto con el usuario; para usuarios anteriores, la primera vez que se
+    consulta, a partir de un COUNT.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.user_id}: {self.unread} unread"
+
+
+class OutboundEmail(models.Model):
+    """
+    Cola de correos salientes: las vistas encolan (ver notification.mail) y el
+    worker `manage.py send_queued_mail` los envía tras el commit, con reintentos.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NotificationCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre (created_at, id): cada página es un
+    rango del índice (recipient, created_at, id), sin OFFSET.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
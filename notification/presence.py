@@ -0,0 +1,38 @@
+"""
+Presencia de usuarios en el WebSocket de notificaciones.
+
+Se apoya en la channel layer configurada (ver notification.layers). Si la capa
+no implementa presencia (p.ej. InMemoryChannelLayer) se asume que todos los
+usuarios están conectados y se publica siempre, como antes.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def presence_key(user_id):
+    return f'user_{user_id}'
+
+
+def supports_presence(channel_layer):
+    return hasattr(channel_layer, 'presence_online')
+
+
+async def mark_connected(channel_layer, user_id, channel_name):
+    if supports_presence(channel_layer):
+        await channel_layer.presence_add(presence_key(user_id), channel_name)
+
+
+async def mark_disconnected(channel_layer, user_id, channel_name):
+    if supports_presence(channel_layer):
+        await channel_layer.presence_discard(presence_key(user_id), channel_name)
+
+
+def online_user_ids(user_ids, channel_layer=None):
+    """ Subconjunto de `user_ids` con al menos un socket abierto. """
+    user_ids = set(user_ids)
+    channel_layer = channel_layer or get_channel_layer()
+    if not user_ids or not supports_presence(channel_layer):
+        return user_ids
+    keys = {presence_key(user_id): user_id for user_id in user_ids}
+    online = async_to_sync(channel_layer.presence_online)(keys)
+    return {keys[key] for key in online}
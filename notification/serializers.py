@@ -15,5 +15,9 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     def get_actor_name(self, obj):
         if obj.actor:
+            # Nombre desde ProfileCard (select_related('actor__card')) si ya existe
+            card = getattr(obj.actor, 'card', None)
+            if card is not None and card.full_name:
+                return card.full_name
             return getattr(obj.actor, 'get_full_name', lambda: str(obj.actor))()
         return None
@@ -1,25 +1,45 @@
-import json
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from . import counters
+from .auth_cache import user_cache
 from .models import Notification
-from .serializers import NotificationSerializer
+from .fanout import publish
 
 
 @receiver(post_save, sender=Notification)
 def notify_ws_on_create(sender, instance: Notification, created: bool, **kwargs):
+    # Notification.objects.create() individual; los lotes de notify() no pasan por aquí
     if not created:
         return
-    channel_layer = get_channel_layer()
-    if channel_layer is None:
-        return
-    group_name = f'user_{instance.recipient_id}_notifications'
-    payload = NotificationSerializer(instance).data
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'notify',
-            'payload': payload
-        }
-    )
+    if not instance.is_read:
+        counters.increment([instance.recipient_id])
+    transaction.on_commit(lambda: publish([instance]))
+
+
+@receiver(post_delete, sender=Notification)
+def discount_deleted_notification(sender, instance: Notification, **kwargs):
+    # Borrados desde el admin o el ORM (queryset.delete() también dispara post_delete)
+    if not instance.is_read:
+        counters.decrement(instance.recipient_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_unread_counter(sender, instance, created, **kwargs):
+    if created:
+        counters.ensure_counters([instance.pk])
+
+
+# --- Caché de usuarios del WebSocket (notification.auth_cache) ---
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_ws_user(sender, instance, **kwargs):
+    # Desactivación, cambio de rol o cualquier otro cambio del usuario
+    user_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender='nsocial.Role')
+def invalidate_ws_users_for_role(sender, instance, **kwargs):
+    # is_admin/code de un rol afecta a todos sus usuarios
+    user_cache.invalidate()
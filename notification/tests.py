@@ -1,3 +1,240 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core import mail
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from nsocial.models import CustomUser
+from notification.auth_cache import user_cache
+from notification.fanout import group_name_for, notify, publish
+from notification.layers import RedisPresenceChannelLayer, SQLiteChannelLayer
+from notification.mail import queue_mail, queue_stats, send_pending
+from notification.middleware import get_user_from_token
+from notification.models import Notification, OutboundEmail, UnreadCounter
+from notification.presence import mark_connected
+
+
+def receive(layer, channel, timeout=2):
+    return async_to_sync(asyncio.wait_for)(layer.receive(channel), timeout)
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_group_send_crosses_layer_instances(self):
+        # Dos instancias sobre el mismo archivo = dos procesos
+        worker_a, worker_b = SQLiteChannelLayer(self.path), SQLiteChannelLayer(self.path)
+        channel = async_to_sync(worker_a.new_channel)()
+        async_to_sync(worker_a.group_add)('user_1_notifications', channel)
+
+        async_to_sync(worker_b.group_send)('user_1_notifications', {'type': 'notify', 'payload': {'id': 1}})
+        self.assertEqual(receive(worker_a, channel)['payload'], {'id': 1})
+
+    def test_presence(self):
+        layer = SQLiteChannelLayer(self.path)
+        async_to_sync(layer.presence_add)('user_1', 'specific.a!1')
+        async_to_sync(layer.presence_add)('user_1', 'specific.a!2')
+        async_to_sync(layer.presence_discard)('user_1', 'specific.a!1')
+        self.assertEqual(async_to_sync(layer.presence_online)(['user_1', 'user_2']), {'user_1'})
+
+
+class FakeRedisSortedSets:
+    """ Lo que usa la presencia de redis.asyncio: sorted sets en memoria. """
+
+    def __init__(self):
+        self.sets = {}
+
+    async def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update(mapping)
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def zrem(self, key, member):
+        self.sets.get(key, {}).pop(member, None)
+
+    async def zremrangebyscore(self, key, low, high):
+        members = self.sets.get(key, {})
+        for member in [m for m, score in members.items() if low <= score <= high]:
+            del members[member]
+
+    async def zcard(self, key):
+        return len(self.sets.get(key, {}))
+
+
+@override_settings(CHANNEL_LAYERS={
+    'default': {'BACKEND': 'notification.layers.RedisPresenceChannelLayer',
+                'CONFIG': {'hosts': ['redis://localhost:6379/0']}},
+})
+class RedisPresenceChannelLayerTests(SimpleTestCase):
+
+    def test_backend_loads_from_settings(self):
+        # Lo que carga settings.py con REDIS_URL (necesita channels_redis)
+        self.assertIsInstance(get_channel_layer(), RedisPresenceChannelLayer)
+
+    def test_presence(self):
+        layer = get_channel_layer()
+        with mock.patch.object(layer, 'connection', return_value=FakeRedisSortedSets()):
+            async_to_sync(layer.presence_add)('user_1', 'specific.a!1')
+            async_to_sync(layer.presence_add)('user_1', 'specific.a!2')
+            async_to_sync(layer.presence_discard)('user_1', 'specific.a!1')
+            self.assertEqual(async_to_sync(layer.presence_online)(['user_1', 'user_2']), {'user_1'})
+            async_to_sync(layer.presence_discard)('user_1', 'specific.a!2')
+            self.assertEqual(async_to_sync(layer.presence_online)(['user_1']), set())
+
+
+class NotificationFanoutTests(TestCase):
+
+    def setUp(self):
+        # Capa SQLite en un archivo temporal: nunca la del proyecto (CHANNEL_LAYER_PATH)
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        layers = override_settings(CHANNEL_LAYERS={
+            'default': {'BACKEND': 'notification.layers.SQLiteChannelLayer', 'CONFIG': {'path': path}},
+        })
+        layers.enable()
+        self.addCleanup(layers.disable)
+        self.layer = get_channel_layer()
+        async_to_sync(self.layer.flush)()
+        self.users = [
+            CustomUser.objects.create(email=f'admin{i}@nobilis.test', first_name='Admin', last_name=str(i))
+            for i in range(20)
+        ]
+
+    def test_constant_queries_and_publish_after_commit(self):
+        channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(group_name_for(self.users[3].pk), channel)
+        async_to_sync(mark_connected)(self.layer, self.users[3].pk, channel)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            # INSERT de las filas + UPDATE de los contadores
+            with self.assertNumQueries(2):
+                notify(self.users, verb='has joined the waiting list')
+        self.assertEqual(Notification.objects.count(), 20)
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        message = receive(self.layer, channel)
+        self.assertEqual(message['type'], 'notify')
+        self.assertEqual(message['payload']['recipient'], self.users[3].pk)
+
+    def test_layer_failure_is_logged_not_raised(self):
+        channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(mark_connected)(self.layer, self.users[0].pk, channel)
+        notifications = notify(self.users[:1], verb='hello')
+        with mock.patch.object(self.layer, 'group_send_batch', side_effect=OSError('disk I/O error')), \
+                self.assertLogs('notification.fanout', 'ERROR'):
+            publish(notifications)
+
+    def test_offline_recipients_are_not_serialized(self):
+        notifications = notify(self.users[:2], verb='hello')
+        with mock.patch('notification.fanout.NotificationSerializer') as serializer:
+            publish(notifications)
+        serializer.assert_not_called()
+
+
+class WebSocketUserCacheTests(TestCase):
+
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        user_cache.invalidate()
+        self.user = CustomUser.objects.create(email='ws@nobilis.test', first_name='Ws', last_name='User')
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_second_handshake_skips_database(self):
+        self.assertEqual(async_to_sync(get_user_from_token)(self.token).pk, self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(get_user_from_token)(self.token).pk, self.user.pk)
+        stats = user_cache.stats()
+        self.assertEqual((stats['hits'] >= 1, stats['misses'] >= 1), (True, True))
+
+    def test_deactivation_invalidates(self):
+        async_to_sync(get_user_from_token)(self.token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertTrue(async_to_sync(get_user_from_token)(self.token).is_anonymous)
+
+
+class UnreadCounterTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='reader@nobilis.test', first_name='Rea', last_name='Der')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def unread(self):
+        return self.client.get('/api/v1/notifications/unread-count/').data['unread']
+
+    def test_counter_follows_create_and_read(self):
+        Notification.objects.create(recipient=self.user, verb='first')
+        self.assertEqual(self.unread(), 1)
+        notifications = notify([self.user, self.user], verb='batch')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.unread(), 3)
+
+        self.client.post(f'/api/v1/notifications/{notifications[0].pk}/read/')
+        self.client.post(f'/api/v1/notifications/{notifications[0].pk}/read/')
+        self.assertEqual(self.unread(), 2)
+        self.client.post('/api/v1/notifications/mark-all-read/')
+        self.assertEqual(self.unread(), 0)
+
+    def test_deletes_and_legacy_users(self):
+        notify([self.user] * 3, verb='bulk')
+        Notification.objects.filter(recipient=self.user)[:1].get().delete()
+        self.assertEqual(self.unread(), 2)
+
+        # Usuario sin contador (anterior a los contadores): se recuenta al consultarlo
+        UnreadCounter.objects.filter(user=self.user).delete()
+        self.assertEqual(self.unread(), 2)
+
+    def test_cursor_pagination(self):
+        notify([self.user] * 30, verb='bulk')
+        first = self.client.get('/api/v1/notifications/', {'page_size': 20}).data
+        self.assertEqual(len(first['results']), 20)
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(second['results']), 10)
+        ids = [n['id'] for n in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 30)
+
+        # Sin parámetros: la paginación limit/offset de siempre
+        legacy = self.client.get('/api/v1/notifications/').data
+        self.assertEqual((legacy['count'], len(legacy['results'])), (30, 5))
+
+
+@override_settings(MAIL_QUEUE_MAX_ATTEMPTS=2)
+class OutboundEmailQueueTests(TestCase):
+
+    def test_sent_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_mail('Hello', 'Body', 'admin@nobilis.test', ['member@nobilis.test'])
+            self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['member@nobilis.test'])
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_SENT)
+
+    def test_failures_are_retried_then_marked_failed(self):
+        email = queue_mail('Hello', 'Body', None, ['member@nobilis.test'])
+        send_messages = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        with mock.patch(send_messages, side_effect=OSError('smtp down')):
+            self.assertEqual(send_pending(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (OutboundEmail.STATUS_PENDING, 1))
+            # No vuelve a intentarse hasta que vence la espera
+            self.assertEqual(send_pending(), (0, 0))
+
+            OutboundEmail.objects.update(next_attempt_at=email.created_at)
+            send_pending()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.STATUS_FAILED)
+        self.assertEqual(email.last_error, 'smtp down')
+        self.assertEqual(queue_stats(), {'pending': 0, 'failed': 1, 'sent': 0})
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import NotificationListView, MarkNotificationReadView, MarkAllReadView
+from .views import NotificationListView, MarkNotificationReadView, MarkAllReadView, UnreadCountView
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notification-list'),
+    path('unread-count/', UnreadCountView.as_view(), name='notification-unread-count'),
     path('<int:pk>/read/', MarkNotificationReadView.as_view(), name='notification-read'),
     path('mark-all-read/', MarkAllReadView.as_view(), name='notification-mark-all-read'),
 ]
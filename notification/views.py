@@ -1,28 +1,58 @@
+from django.db import transaction
 from rest_framework import generics, permissions, status
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from . import counters
+from .fanout import publish_unread_count
 from .models import Notification
+from .paginations import NotificationCursorPagination
 from .serializers import NotificationSerializer
 
 
 class NotificationListView(generics.ListAPIView):
+    """
+    Notificaciones del usuario. Por defecto, paginación limit/offset (PAGE_SIZE y
+    count, como siempre); con ?cursor= o ?page_size= se pagina por cursor, sin
+    OFFSET ni COUNT. ?unread=1 devuelve solo las no leídas.
+    """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        qs = Notification.objects.filter(recipient=self.request.user).select_related('actor__card')
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            qs = qs.filter(is_read=False)
+        return qs
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            cursor = 'cursor' in params or 'page_size' in params
+            self._paginator = NotificationCursorPagination() if cursor else LimitOffsetPagination()
+        return self._paginator
+
+
+class UnreadCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread": counters.unread_count(request.user.id)})
 
 
 class MarkNotificationReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        try:
-            notif = Notification.objects.get(pk=pk, recipient=request.user)
-        except Notification.DoesNotExist:
+        if not Notification.objects.filter(pk=pk, recipient=request.user).exists():
             return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
-        notif.is_read = True
-        notif.save(update_fields=["is_read"])
+        with transaction.atomic():
+            # Solo descuenta si realmente pasó de no leída a leída
+            changed = Notification.objects.filter(pk=pk, recipient=request.user, is_read=False).update(is_read=True)
+            if changed:
+                counters.decrement(request.user.id)
+                transaction.on_commit(lambda: publish_unread_count(request.user.id))
         return Response({"status": "ok"})
 
 
@@ -30,5 +60,8 @@ class MarkAllReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        with transaction.atomic():
+            Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+            counters.reset(request.user.id)
+            transaction.on_commit(lambda: publish_unread_count(request.user.id))
         return Response({"status": "ok"})
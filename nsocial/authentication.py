@@ -0,0 +1,66 @@
+"""
+Autenticación JWT por claims.
+
+Con JWT_CLAIMS_AUTH=True las peticiones de lectura (GET/HEAD/OPTIONS) con un
+access token emitido por nsocial.tokens no cargan CustomUser ni Role: el
+usuario es un ClaimsUser armado con los claims del token, y `profile_id` y
+`subscription_status` vienen como atributos. Solo se consulta la versión de los
+claims (cacheada, ver nsocial.tokens.current_auth_version); si no coincide el
+token se rechaza para que el cliente lo renueve.
+
+Las escrituras y los tokens sin claims (emitidos antes) siguen el camino normal
+de JWTAuthentication, que lee al usuario de la base.
+"""
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from nsocial.models import ClaimsUser, Role
+from nsocial.tokens import CLAIMS_KEY, VERSION_CLAIM, current_auth_version
+
+
+def claims_user(token):
+    """ ClaimsUser a partir de un access token validado, o None si no trae claims. """
+    claims = token.get(CLAIMS_KEY)
+    if not isinstance(claims, dict) or VERSION_CLAIM not in token:
+        return None
+    user_id = token[api_settings.USER_ID_CLAIM]
+    if token[VERSION_CLAIM] != current_auth_version(user_id):
+        raise InvalidToken({'detail': 'Token claims are outdated, refresh the token.', 'code': 'token_outdated'})
+
+    role = claims.get('role')
+    user = ClaimsUser(
+        pk=int(user_id),
+        email=claims.get('email', ''),
+        first_name=claims.get('first_name', ''),
+        last_name=claims.get('last_name', ''),
+        is_active=True,
+        is_staff=claims.get('is_staff', False),
+        is_superuser=claims.get('is_superuser', False),
+        auth_version=token[VERSION_CLAIM],
+        role=Role(pk=role['id'], code=role['code'], name=role['name'], is_admin=role['is_admin']) if role else None,
+    )
+    user.profile_id = claims.get('profile_id')
+    user.subscription_status = claims.get('subscription_status')
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+
+    def authenticate(self, request):
+        if not settings.JWT_CLAIMS_AUTH or request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = claims_user(validated_token)
+        if user is None:
+            user = self.get_user(validated_token)
+        return user, validated_token
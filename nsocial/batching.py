@@ -0,0 +1,35 @@
+"""
+Trabajo por usuario diferido hasta el commit.
+
+`schedule_for_users(name, action, user_ids)` junta todos los ids que se piden
+con el mismo `name` dentro de una transacción y llama una sola vez a
+`action(ids)` tras el commit (p.ej. borrar y recrear los clubs de un perfil
+reindexa una vez). Lo usan nsocial.search y nsocial.cards.
+"""
+from django.db import transaction
+
+
+class _UserBatch:
+    def __init__(self, action, user_ids):
+        self.action = action
+        self.ids = set(user_ids)
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.action(self.ids)
+
+
+def schedule_for_users(name, action, user_ids):
+    user_ids = [pk for pk in user_ids if pk is not None]
+    if not user_ids:
+        return
+    conn = transaction.get_connection()
+    batches = conn.__dict__.setdefault('_user_batches', {})
+    batch = batches.get(name)
+    # Tras un rollback la lista de callbacks se vacía y el lote anterior se descarta
+    if batch is not None and not batch.done and any(entry[1] is batch for entry in conn.run_on_commit):
+        batch.ids.update(user_ids)
+        return
+    batch = batches[name] = _UserBatch(action, user_ids)
+    transaction.on_commit(batch)
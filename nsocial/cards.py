@@ -0,0 +1,105 @@
+"""
+Tarjetas de miembro (ProfileCard).
+
+Resumen de cada usuario para listados y resultados de búsqueda: nombre,
+alias_title, headline, ciudad, foto, título del plan actual y tipo de
+introducción. Se guarda desnormalizado en una sola tabla para que un listado
+sea una consulta sin importar el tamaño de la página (en lugar de unir
+CustomUser + UserProfile + MembershipSubscription + Plan +
+UserIntroductionPreference).
+
+Los signals (nsocial.signals) llaman a `schedule_card_refresh()`, que
+recalcula las tarjetas tras el commit, agrupadas por transacción.
+`manage.py rebuild_profile_cards` las reconstruye todas.
+"""
+from django.db import transaction
+
+from nsocial.batching import schedule_for_users
+
+CARD_FIELDS = (
+    'first_name', 'last_name', 'full_name', 'email', 'alias_title', 'headline', 'city', 'picture',
+    'plan_title', 'introduction_type', 'is_active',
+)
+# Campos de CustomUser / UserProfile de los que sale la tarjeta (ver card_values())
+USER_CARD_FIELDS = ('first_name', 'last_name', 'email', 'is_active')
+PROFILE_CARD_FIELDS = ('alias_title', 'introduction_headline', 'city', 'profile_picture', 'current_subscription')
+
+
+def _source_users():
+    from nsocial.models import CustomUser
+    return CustomUser.objects.select_related(
+        'profile__current_subscription__plan',
+        'profile__introduction_preference__introduction_type',
+    )
+
+
+def card_values(user):
+    """ Campos de la tarjeta de `user` (cargado como en _source_users()). """
+    profile = getattr(user, 'profile', None)
+    subscription = getattr(profile, 'current_subscription', None) if profile else None
+    plan = getattr(subscription, 'plan', None) if subscription else None
+    preference = getattr(profile, 'introduction_preference', None) if profile else None
+    introduction = getattr(preference, 'introduction_type', None) if preference else None
+    return {
+        'first_name': user.first_name or '',
+        'last_name': user.last_name or '',
+        'full_name': f'{user.first_name} {user.last_name}'.strip(),
+        'email': user.email,
+        'alias_title': (profile.alias_title if profile else '') or '',
+        'headline': (profile.introduction_headline if profile else '') or '',
+        'city': (profile.city if profile else '') or '',
+        'picture': (profile.profile_picture.name if profile and profile.profile_picture else '') or '',
+        'plan_title': (plan.title if plan else '') or '',
+        'introduction_type': (introduction.title if introduction else '') or '',
+        'is_active': user.is_active,
+    }
+
+
+def build_cards(user_ids):
+    """ Tarjetas calculadas (sin guardar) de los usuarios indicados. """
+    from nsocial.models import ProfileCard
+    return [ProfileCard(user_id=user.pk, **card_values(user)) for user in _source_users().filter(pk__in=list(user_ids))]
+
+
+def refresh_cards(user_ids):
+    """ Recalcula y guarda las tarjetas de los usuarios indicados. """
+    from nsocial.models import ProfileCard
+
+    cards = build_cards(user_ids)
+    if cards:
+        ProfileCard.objects.bulk_create(
+            cards, update_conflicts=True, unique_fields=['user'], update_fields=[*CARD_FIELDS, 'updated_at'],
+        )
+    return cards
+
+
+def rebuild_all(batch_size=500):
+    from nsocial.models import CustomUser, ProfileCard
+
+    ids = list(CustomUser.objects.order_by('pk').values_list('pk', flat=True))
+    with transaction.atomic():
+        ProfileCard.objects.exclude(user_id__in=ids).delete()
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            refresh_cards(ids[start:start + batch_size])
+    return len(ids)
+
+
+def schedule_card_refresh(user_ids):
+    schedule_for_users('profile_cards', refresh_cards, user_ids)
+
+
+def cards_for(user_ids):
+    """
+    Tarjetas de `user_ids` en ese orden, en una consulta. Las que aún no existen
+    (antes del primer rebuild_profile_cards) se calculan sin guardarlas: las
+    lecturas no escriben.
+    """
+    from nsocial.models import ProfileCard
+
+    user_ids = list(user_ids)
+    cards = ProfileCard.objects.in_bulk(user_ids)
+    missing = [pk for pk in user_ids if pk not in cards]
+    if missing:
+        cards.update({card.user_id: card for card in build_cards(missing)})
+    return [cards[pk] for pk in user_ids if pk in cards]
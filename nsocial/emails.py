@@ -0,0 +1,164 @@
+"""
+Correos normalizados y consulta de "¿conocemos este correo?".
+
+CustomUser, WaitingList, UserInvitation y MemberReferral guardan
+`email_canonical` (minúsculas, sin espacios) con índice. Invariante:
+email_canonical == canonical_email(email) en cada fila. Lo mantienen save()
+(CanonicalEmailMixin) y bulk_create()/bulk_update()/update() del manager
+(CanonicalEmailQuerySet; el check nsocial.E001 exige que esos modelos lo usen).
+El SQL crudo tiene que calcularlo por su cuenta. `email_status()` responde con una sola consulta
+(UNION de las cuatro búsquedas indexadas) en qué estado está un correo en
+cada tabla, y guarda la respuesta en caché EMAIL_LOOKUP_CACHE_TIMEOUT
+segundos; los signals (nsocial.signals) la borran cuando cambia alguna fila de
+ese correo. Las comprobaciones previas a una escritura usan `cached=False`.
+"""
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.apps import apps
+from django.core import checks
+from django.db import models
+from django.db.models import Case, CharField, F, Value, When
+from django.db.models.functions import Lower, Trim
+
+USER, WAITING_LIST, INVITATION, REFERRAL = 'user', 'waiting_list', 'invitation', 'referral'
+
+
+def canonical_email(email):
+    return (email or '').strip().lower()
+
+
+class CanonicalEmailMixin:
+    """ Para modelos con `email` y `email_canonical`: lo recalcula en cada save(). """
+
+    def save(self, *args, **kwargs):
+        self.email_canonical = canonical_email(self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'email' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'email_canonical'}
+        super().save(*args, **kwargs)
+
+
+class CanonicalEmailQuerySet(models.QuerySet):
+    """ bulk_create(), bulk_update() y update() no pasan por save(): calculan email_canonical igual. """
+
+    def bulk_create(self, objs, *args, update_fields=None, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.email_canonical = canonical_email(obj.email)
+        if update_fields and 'email' in update_fields:
+            update_fields = {*update_fields, 'email_canonical'}
+        return super().bulk_create(objs, *args, update_fields=update_fields, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs, fields = list(objs), list(fields)
+        if 'email' in fields:
+            for obj in objs:
+                obj.email_canonical = canonical_email(obj.email)
+            if 'email_canonical' not in fields:
+                fields.append('email_canonical')
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if 'email' in kwargs:
+            email = kwargs['email']
+            # Con una expresión (F(), Concat(), ...) se calcula en la base de datos
+            kwargs['email_canonical'] = canonical_email(email) if isinstance(email, str) else Lower(Trim(email))
+        return super().update(**kwargs)
+
+
+@checks.register(checks.Tags.models)
+def check_canonical_email_managers(app_configs=None, **kwargs):
+    errors = []
+    for model in apps.get_models():
+        if issubclass(model, CanonicalEmailMixin) and not issubclass(
+                model._default_manager._queryset_class, CanonicalEmailQuerySet):
+            errors.append(checks.Error(
+                'Models with CanonicalEmailMixin need a manager built on CanonicalEmailQuerySet.',
+                hint='bulk_create() and update() would leave email_canonical empty or stale.',
+                obj=model, id='nsocial.E001',
+            ))
+    return errors
+
+
+@dataclass(frozen=True)
+class EmailStatus:
+    email: str
+    user: str = None                # 'active' / 'inactive'
+    waiting_list: tuple = ()        # estados de las entradas en la lista de espera
+    invitation: str = None          # 'accepted' / 'pending'
+    referred: bool = False
+
+    @property
+    def has_user(self):
+        return self.user is not None
+
+    @property
+    def approved(self):
+        from waitinglist.models import WaitingList
+        return WaitingList.STATUS_APPROVED in self.waiting_list
+
+    @property
+    def known(self):
+        return self.has_user or bool(self.waiting_list) or self.invitation is not None or self.referred
+
+
+def _cache_key(canonical):
+    return 'email-status:' + hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def _lookup(canonical):
+    from membership.models import MemberReferral, UserInvitation
+    from nsocial.models import CustomUser
+    from waitinglist.models import WaitingList
+
+    def tagged(queryset, kind, state):
+        return queryset.filter(email_canonical=canonical).annotate(
+            kind=Value(kind, output_field=CharField()), state=state,
+        ).values_list('kind', 'state')
+
+    users = tagged(CustomUser.objects, USER, Case(
+        When(is_active=True, then=Value('active')), default=Value('inactive'), output_field=CharField(),
+    ))
+    entries = tagged(WaitingList.objects, WAITING_LIST, F('status'))
+    invitations = tagged(UserInvitation.objects, INVITATION, Case(
+        When(accepted_at__isnull=False, then=Value('accepted')), default=Value('pending'), output_field=CharField(),
+    ))
+    referrals = tagged(MemberReferral.objects, REFERRAL, Value('referred', output_field=CharField()))
+    # Sin ORDER BY: los modelos tienen ordering por defecto y UNION no lo admite por parte
+    return list(users.order_by().union(
+        entries.order_by(), invitations.order_by(), referrals.order_by(), all=True,
+    ))
+
+
+def email_status(email, cached=True):
+    canonical = canonical_email(email)
+    if not canonical:
+        return EmailStatus(email='')
+    key = _cache_key(canonical)
+    rows = cache.get(key) if cached else None
+    if rows is None:
+        rows = _lookup(canonical)
+        cache.set(key, rows, settings.EMAIL_LOOKUP_CACHE_TIMEOUT)
+
+    by_kind = {}
+    for kind, state in rows:
+        by_kind.setdefault(kind, []).append(state)
+    invitations = by_kind.get(INVITATION, [])
+    users = by_kind.get(USER, [])
+    return EmailStatus(
+        email=canonical,
+        user=users[0] if users else None,
+        waiting_list=tuple(by_kind.get(WAITING_LIST, ())),
+        invitation=('accepted' if 'accepted' in invitations else 'pending') if invitations else None,
+        referred=REFERRAL in by_kind,
+    )
+
+
+def forget_email(email):
+    """ Borra la respuesta cacheada de un correo (lo llaman los signals). """
+    canonical = canonical_email(email)
+    if canonical:
+        cache.delete(_cache_key(canonical))
@@ -0,0 +1,148 @@
+from django.db.models import Prefetch
+from django.http import Http404
+from nsocial.models import ClaimsUser, UserProfile
+
+
+# Relaciones 1-1 (y FK) que se resuelven con JOINs en la consulta principal.
+FULL_PROFILE_SELECT_RELATED = (
+    'user',
+    'personal_detail',
+    'professional_profile',
+    'recognition',
+    'introduction_preference__introduction_type',
+    'current_subscription__plan',
+)
+
+
+def _relatives_prefetch():
+    # Import local para evitar import circular (api.models -> nsocial.models)
+    from api.models import Relative
+    return Prefetch(
+        'user__relatives',
+        queryset=Relative.objects.select_related('relationship').order_by('-created_at'),
+    )
+
+
+def full_profile_queryset():
+    """
+    Queryset de UserProfile con todo el grafo que recorre FullProfileSerializer.
+
+    El número de consultas es fijo sin importar el tamaño de las listas:
+    1 para el perfil con sus relaciones 1-1 y una por cada lista prefetcheada
+    (clubs, work_positions, education, on_board, non_profit_involvement,
+    expertise, videos, social_media_profiles y relatives).
+    """
+    return (
+        UserProfile.objects
+        .select_related(*FULL_PROFILE_SELECT_RELATED)
+        .prefetch_related(
+            'social_media_profiles',
+            'personal_detail__clubs',
+            'professional_profile__work_positions',
+            'professional_profile__education',
+            'professional_profile__on_board',
+            'professional_profile__non_profit_involvement',
+            'expertise',
+            'videos',
+            _relatives_prefetch(),
+        )
+    )
+
+
+def basic_profile_queryset():
+    """
+    Queryset liviano para las vistas que solo leen campos propios del perfil,
+    el usuario, la preferencia de introducción y las redes sociales.
+    """
+    return (
+        UserProfile.objects
+        .select_related('user', 'introduction_preference__introduction_type')
+        .prefetch_related('social_media_profiles')
+    )
+
+
+def own_profile_queryset():
+    """
+    Queryset para las vistas que escriben en el perfil propio: las relaciones
+    1-1 que tocan (datos personales, profesionales y reconocimientos) en la
+    misma consulta.
+    """
+    return UserProfile.objects.select_related('user', 'personal_detail', 'professional_profile', 'recognition')
+
+
+PROFILE_QUERYSETS = {
+    'own': own_profile_queryset,
+    'basic': basic_profile_queryset,
+    'full': full_profile_queryset,
+}
+
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def load_profile(user, queryset=None, create=True):
+    """
+    Devuelve el perfil de `user` cargado con `queryset` (por defecto el grafo
+    completo). El signal create_user_profile lo crea junto con el usuario; si
+    aun así falta (usuarios anteriores al signal) se crea solo con create=True,
+    y si no se lanza UserProfile.DoesNotExist.
+    """
+    if queryset is None:
+        queryset = full_profile_queryset()
+    # user_id y no user: request.user puede ser un ClaimsUser (nsocial.authentication)
+    try:
+        return queryset.get(user_id=user.pk)
+    except UserProfile.DoesNotExist:
+        if not create:
+            raise
+        UserProfile.objects.get_or_create(user_id=user.pk)
+        return queryset.get(user_id=user.pk)
+
+
+def _profile_cache(request):
+    # Se guarda en el HttpRequest de Django, compartido por el Request de DRF
+    request = getattr(request, '_request', request)
+    return request.__dict__.setdefault('_nsocial_profiles', {})
+
+
+def _claims_profile_id(user):
+    # ClaimsUser (nsocial.authentication) trae el id del perfil en el token
+    if isinstance(user, ClaimsUser):
+        return user.profile_id
+    return None
+
+
+def request_profile(request, kind='own'):
+    """
+    Perfil del usuario autenticado, cargado una sola vez por petición con el
+    queryset `kind` de PROFILE_QUERYSETS ('full' sirve también para los demás).
+    Con un ClaimsUser se busca por el `profile_id` del token.
+    En GET/HEAD/OPTIONS nunca escribe: si el perfil no existe responde 404.
+    """
+    cache = _profile_cache(request)
+    profile = cache.get(kind) or cache.get('full')
+    if profile is None:
+        profile_id = _claims_profile_id(request.user)
+        try:
+            if profile_id:
+                profile = PROFILE_QUERYSETS[kind]().get(pk=profile_id)
+            else:
+                profile = load_profile(
+                    request.user, PROFILE_QUERYSETS[kind](), create=request.method not in _SAFE_METHODS,
+                )
+        except UserProfile.DoesNotExist:
+            raise Http404('Profile not found.')
+        cache[kind] = profile
+    return profile
+
+
+def request_profile_id(request):
+    """
+    Id del perfil del usuario autenticado. Con un ClaimsUser sale del token sin
+    consultar la base; si no, del perfil de request_profile.
+    """
+    return _claims_profile_id(request.user) or request_profile(request).pk
+
+
+def forget_request_profile(request):
+    """ Descarta los perfiles memorizados (tras escribir, para releerlos al día). """
+    _profile_cache(request).clear()
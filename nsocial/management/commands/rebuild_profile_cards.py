@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from nsocial.cards import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuilds every member's ProfileCard (the denormalized summary used by list endpoints)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Cards written per transaction.')
+
+    def handle(self, *args, **options):
+        count = rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} profile card(s).'))
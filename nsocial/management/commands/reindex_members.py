@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from nsocial.search import reindex_all
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the member search index (MemberSearchTerm) from every active member's profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Members indexed per transaction.')
+
+    def handle(self, *args, **options):
+        count = reindex_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} member(s).'))
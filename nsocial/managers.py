@@ -1,7 +1,9 @@
 from django.contrib.auth.base_user import BaseUserManager
 
+from nsocial.emails import CanonicalEmailQuerySet
 
-class CustomUserManager(BaseUserManager):
+
+class CustomUserManager(BaseUserManager.from_queryset(CanonicalEmailQuerySet)):
     def create_user(self, email, password, **extra_fields):
         if not email:
             raise ValueError('The email must be set')
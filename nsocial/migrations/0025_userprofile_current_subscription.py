@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('membership', '0016_alter_shippingaddress_card_last_4_and_more'),
+        ('nsocial', '0024_alter_userprofile_profile_picture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='current_subscription',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='membership.membershipsubscription'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='subscription_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
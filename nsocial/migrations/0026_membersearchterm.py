@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nsocial', '0025_userprofile_current_subscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='nsocial_mem_term_14d06d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'term'), name='unique_member_search_term')],
+            },
+        ),
+    ]
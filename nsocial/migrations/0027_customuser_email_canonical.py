@@ -0,0 +1,48 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+
+
+def fill_email_canonical(apps, schema_editor):
+    CustomUser = apps.get_model('nsocial', 'CustomUser')
+    users = CustomUser.objects.annotate(canonical=Lower(Trim('email')))
+
+    # Antes del índice único: si hay cuentas cuyo correo solo difiere en mayúsculas
+    # se aborta aquí, diciendo cuáles, en lugar de fallar en el ALTER
+    clashing = (users.values('canonical').annotate(accounts=Count('pk'))
+                .filter(accounts__gt=1).values_list('canonical', flat=True))
+    conflicts = []
+    for email in clashing:
+        ids = users.filter(canonical=email).order_by('pk').values_list('pk', flat=True)
+        conflicts.append(f"{email}: ids {', '.join(map(str, ids))}")
+    if conflicts:
+        raise RuntimeError(
+            'These accounts share an email that differs only in letter case; merge them or change '
+            'one of the addresses before running this migration:\n' + '\n'.join(conflicts)
+        )
+
+    CustomUser.objects.update(email_canonical=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nsocial', '0026_membersearchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='email_canonical',
+            field=models.CharField(default='', editable=False, max_length=254),
+            preserve_default=False,
+        ),
+        # Si ya hay correos que solo difieren en mayúsculas, fill_email_canonical los
+        # lista y aborta: hay que unificar esas cuentas antes de migrar
+        migrations.RunPython(fill_email_canonical, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customuser',
+            name='email_canonical',
+            field=models.CharField(editable=False, max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nsocial', '0027_customuser_email_canonical'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('first_name', models.CharField(blank=True, default='', max_length=30)),
+                ('last_name', models.CharField(blank=True, default='', max_length=30)),
+                ('full_name', models.CharField(blank=True, default='', max_length=61)),
+                ('email', models.EmailField(blank=True, default='', max_length=254)),
+                ('alias_title', models.CharField(blank=True, default='', max_length=50)),
+                ('headline', models.TextField(blank=True, default='')),
+                ('city', models.CharField(blank=True, default='', max_length=255)),
+                ('picture', models.CharField(blank=True, default='', max_length=255)),
+                ('plan_title', models.CharField(blank=True, default='', max_length=100)),
+                ('introduction_type', models.CharField(blank=True, default='', max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['is_active', 'full_name'], name='profile_card_active_name')],
+            },
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.utils import timezone
 from nsocial.managers import CustomUserManager
+from nsocial.emails import CanonicalEmailMixin
 from api.models import LanguageCatalog
 import datetime
 from django.conf import settings
@@ -28,9 +29,11 @@ class Role(models.Model):
         verbose_name_plural = 'Roles'
 
 
-class CustomUser(AbstractBaseUser, PermissionsMixin):
+class CustomUser(CanonicalEmailMixin, AbstractBaseUser, PermissionsMixin):
     username = None
     email = models.EmailField(unique=True)
+    # Minúsculas y sin espacios (ver nsocial.emails); único sin importar mayúsculas
+    email_canonical = models.CharField(max_length=254, unique=True, editable=False)
     first_name = models.CharField(max_length=30, verbose_name='Name')
     last_name = models.CharField(max_length=30, verbose_name='Last Name')
     role = models.ForeignKey('Role', null=True, blank=True, on_delete=models.SET_NULL, related_name='users', verbose_name='Role')
@@ -38,6 +41,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False, verbose_name='Is Staff')
     is_active = models.BooleanField(default=True, verbose_name='Is Active')
     date_joined = models.DateTimeField(default=timezone.now, verbose_name='Date Joined')
+    # Claim "ver" de los access tokens: al cambiar rol, estado o suscripción sube y
+    # los tokens emitidos antes dejan de valer para la autenticación por claims (nsocial.tokens)
+    auth_version = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -61,6 +67,19 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         verbose_name_plural = 'Users'
 
 
+class ClaimsUser(CustomUser):
+    """
+    Usuario construido con los claims del access token, sin consultar la base
+    (nsocial.authentication). Solo para peticiones de lectura: no se puede guardar.
+    """
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise TypeError('ClaimsUser is built from token claims and cannot be saved.')
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     introduction_headline = models.TextField(max_length=220, null=True, blank=True)
@@ -96,6 +115,11 @@ class UserProfile(models.Model):
     card_brand = models.CharField(max_length=50, blank=True, null=True)
     card_last4 = models.CharField(max_length=4, blank=True, null=True)
 
+    # Espejo local de la suscripción (mantenido por webhooks); ver membership.mirror
+    current_subscription = models.ForeignKey('membership.MembershipSubscription', on_delete=models.SET_NULL,
+                                             null=True, blank=True, related_name='+')
+    subscription_synced_at = models.DateTimeField(blank=True, null=True)
+
     def __str__(self):
         return f'{self.user} Profile'
 
@@ -112,14 +136,25 @@ class UserProfile(models.Model):
             self.subscription_current_period_end = datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc) if ts else None
         except Exception:
             self.subscription_current_period_end = None
+        # Tarjeta por defecto, solo si Stripe la devolvió expandida
+        payment_method = getattr(stripe_subscription, 'default_payment_method', None)
+        card = getattr(payment_method, 'card', None) if payment_method and not isinstance(payment_method, str) else None
+        if card is not None:
+            self.stripe_payment_method_id = getattr(payment_method, 'id', self.stripe_payment_method_id)
+            self.card_brand = getattr(card, 'brand', None)
+            self.card_last4 = getattr(card, 'last4', None)
+        self.subscription_synced_at = timezone.now()
         self.save()
 
         # Sincronizar/crear fila en MembershipSubscription
-        price_id = None
+        price_id = currency = interval_count = None
         try:
             items = getattr(stripe_subscription, 'items', None)
             if items and getattr(items, 'data', None):
-                price_id = items.data[0].price.id
+                price = items.data[0].price
+                price_id = price.id
+                currency = getattr(price, 'currency', None)
+                interval_count = getattr(getattr(price, 'recurring', None), 'interval_count', None)
         except Exception:
             pass
 
@@ -134,6 +169,8 @@ class UserProfile(models.Model):
                 'cancel_at_period_end': getattr(stripe_subscription, 'cancel_at_period_end', False),
                 'current_period_end': self.subscription_current_period_end,
                 'is_active': getattr(stripe_subscription, 'status', '') in ['active', 'trialing'] and not getattr(stripe_subscription, 'canceled_at', None),
+                'currency': currency or '',
+                'interval_count': interval_count,
             }
         )
 
@@ -317,3 +354,46 @@ class UserIntroductionPreference(models.Model):
     class Meta:
         verbose_name = 'User Introduction Preference'
         verbose_name_plural = 'User Introduction Preferences'
+
+
+class MemberSearchTerm(models.Model):
+    """
+    Índice invertido de la búsqueda de miembros: un término normalizado por
+    fila con el peso del campo más importante donde aparece (ver nsocial.search).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['term'])]
+        constraints = [models.UniqueConstraint(fields=['user', 'term'], name='unique_member_search_term')]
+
+    def __str__(self):
+        return f"{self.term} -> {self.user_id}"
+
+
+class ProfileCard(models.Model):
+    """
+    Resumen de un miembro para listados (ver nsocial.cards): se mantiene por
+    signals y se reconstruye con `manage.py rebuild_profile_cards`.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    first_name = models.CharField(max_length=30, blank=True, default='')
+    last_name = models.CharField(max_length=30, blank=True, default='')
+    full_name = models.CharField(max_length=61, blank=True, default='')
+    email = models.EmailField(blank=True, default='')
+    alias_title = models.CharField(max_length=50, blank=True, default='')
+    headline = models.TextField(blank=True, default='')
+    city = models.CharField(max_length=255, blank=True, default='')
+    picture = models.CharField(max_length=255, blank=True, default='')  # nombre en el storage
+    plan_title = models.CharField(max_length=100, blank=True, default='')
+    introduction_type = models.CharField(max_length=100, blank=True, default='')
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['is_active', 'full_name'], name='profile_card_active_name')]
+
+    def __str__(self):
+        return self.full_name or self.email
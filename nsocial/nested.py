@@ -0,0 +1,61 @@
+"""
+Escritura de colecciones anidadas por diferencias.
+
+Los serializers de perfil reemplazan listas completas (clubs, work_positions,
+relatives, ...) y los items no traen id. `sync_collection()` empareja por
+posición las filas existentes (orden de pk) con los items recibidos: las
+iguales no se tocan, las distintas se reescriben con un bulk_update, lo que
+sobra del payload se inserta con un bulk_create y lo que sobra de la base se
+borra con un DELETE. El resultado mantiene el orden del payload, igual que
+borrar y recrear, con como mucho cuatro consultas por lista.
+
+bulk_create/bulk_update/queryset.delete() no disparan signals: quien llame
+debe reindexar (nsocial.search.schedule_reindex) si la lista entra en el índice.
+"""
+from django.db import transaction
+
+
+def _writable_fields(model, fk_name):
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and field.name != fk_name
+        and not getattr(field, 'auto_now', False) and not getattr(field, 'auto_now_add', False)
+    ]
+
+
+def sync_collection(manager, items):
+    """
+    Deja en `manager` (related manager de un FK inverso, p.ej. personal_detail.clubs)
+    exactamente las filas descritas por `items` (lista de dicts de campos).
+    Devuelve {'created', 'updated', 'deleted'}.
+    """
+    model = manager.model
+    fk_name = manager.field.name
+    parent = manager.instance
+    fields = _writable_fields(model, fk_name)
+
+    with transaction.atomic():
+        # Consulta nueva: el caché del prefetch puede estar desactualizado
+        existing = list(model.objects.filter(**{fk_name: parent}).order_by('pk'))
+        wanted = [model(**{fk_name: parent}, **item) for item in items]
+
+        changed = []
+        for current, new in zip(existing, wanted):
+            # attname: en los FK compara el id sin cargar el objeto relacionado
+            if any(getattr(current, f.attname) != getattr(new, f.attname) for f in fields):
+                new.pk = current.pk
+                changed.append(new)
+        if changed:
+            model.objects.bulk_update(changed, [f.name for f in fields])
+
+        created = wanted[len(existing):]
+        if created:
+            model.objects.bulk_create(created)
+
+        stale = [row.pk for row in existing[len(wanted):]]
+        if stale:
+            model.objects.filter(pk__in=stale).delete()
+
+    if changed or created or stale:
+        manager._remove_prefetched_objects()
+    return {'created': len(created), 'updated': len(changed), 'deleted': len(stale)}
@@ -0,0 +1,200 @@
+"""
+Búsqueda de miembros.
+
+Cada miembro activo tiene sus términos (palabras normalizadas: sin acentos y en
+minúsculas) en MemberSearchTerm, con el peso del campo donde aparecen: nombre,
+alias_title, expertise, industrias, hobbies, clubs, city/often_in y la parte
+local del email.
+
+Una consulta se resuelve con búsquedas por prefijo sobre el índice de `term` y
+por igualdad contra las variantes a distancia 1 de cada palabra (errores de
+tipeo). En PostgreSQL el prefijo es un LIKE 'x%' (índice varchar_pattern_ops
+que Django crea para CharField); en SQLite, donde LIKE ... ESCAPE no usa
+índices, se usa un rango binario equivalente. Todas las palabras de la consulta
+deben coincidir; el orden es por la suma de peso x calidad de coincidencia,
+calculada en la base de datos (GROUP BY usuario) junto con el LIMIT de la página.
+
+El índice se actualiza tras el commit cuando cambia el perfil (signals en
+nsocial.signals) y se reconstruye entero con `manage.py reindex_members`.
+"""
+import operator
+from functools import reduce
+
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Max, Q, Value, When
+
+from api.city_index import normalize
+from nsocial.batching import schedule_for_users
+
+NAME, ALIAS, EXPERTISE, INTEREST, PLACE, EMAIL = 10, 6, 4, 3, 2, 1
+
+EXACT, PREFIX, TYPO = 1.0, 0.6, 0.5
+MAX_QUERY_TOKENS = 6
+MIN_TYPO_LENGTH = 4
+MAX_TYPO_LENGTH = 14
+TERM_MAX_LENGTH = 64
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+
+# Campos de CustomUser / UserProfile que entran en el índice (los signals no
+# reindexan los save(update_fields=...) que no tocan ninguno, p.ej. last_login)
+USER_INDEX_FIELDS = ('first_name', 'last_name', 'email', 'is_active')
+PROFILE_INDEX_FIELDS = ('alias_title', 'city', 'often_in')
+
+
+def _terms(text):
+    return [t[:TERM_MAX_LENGTH] for t in normalize(text).split() if len(t) >= 2]
+
+
+def member_terms(user):
+    """
+    Términos de un usuario -> peso. Espera el usuario con profile,
+    personal_detail, clubs, professional_profile y expertise cargados
+    (ver indexable_users()).
+    """
+    weights = {}
+
+    def add(text, weight):
+        for term in _terms(text):
+            if weights.get(term, 0) < weight:
+                weights[term] = weight
+
+    add(user.first_name, NAME)
+    add(user.last_name, NAME)
+    # Solo la parte local: el dominio (gmail, com, ...) coincidiría con casi todos
+    add(user.email.partition('@')[0].replace('.', ' '), EMAIL)
+
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return weights
+    add(profile.alias_title, ALIAS)
+    add(profile.city, PLACE)
+    add(profile.often_in, PLACE)
+    for expertise in profile.expertise.all():
+        add(expertise.title, EXPERTISE)
+
+    personal = getattr(profile, 'personal_detail', None)
+    if personal is not None:
+        add(personal.hobbies, INTEREST)
+        for club in personal.clubs.all():
+            add(club.name, INTEREST)
+
+    professional = getattr(profile, 'professional_profile', None)
+    if professional is not None:
+        add(professional.industries, INTEREST)
+    return weights
+
+
+def indexable_users():
+    from nsocial.models import CustomUser
+    return (
+        CustomUser.objects.filter(is_active=True)
+        .select_related('profile__personal_detail', 'profile__professional_profile')
+        .prefetch_related('profile__expertise', 'profile__personal_detail__clubs')
+    )
+
+
+def index_members(user_ids):
+    """ Reescribe los términos de los usuarios indicados (los inactivos quedan fuera). """
+    from nsocial.models import MemberSearchTerm
+
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        MemberSearchTerm.objects.filter(user_id__in=user_ids).delete()
+        rows = [
+            MemberSearchTerm(user_id=user.pk, term=term, weight=weight)
+            for user in indexable_users().filter(pk__in=user_ids)
+            for term, weight in member_terms(user).items()
+        ]
+        MemberSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+def reindex_all(batch_size=500):
+    from nsocial.models import CustomUser, MemberSearchTerm
+
+    MemberSearchTerm.objects.all().delete()
+    ids = list(CustomUser.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        index_members(ids[start:start + batch_size])
+    return len(ids)
+
+
+def schedule_reindex(user_id):
+    """
+    Reindexa al usuario tras el commit. Varios cambios en la misma transacción
+    (p.ej. borrar y recrear los clubs) se agrupan en un solo reindexado.
+    """
+    schedule_for_users('member_search', index_members, [user_id])
+
+
+def typo_variants(word):
+    """ Variantes a distancia de edición 1 (borrado, transposición, reemplazo, inserción). """
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    variants = set()
+    for left, right in splits:
+        if right:
+            variants.add(left + right[1:])
+            for c in _ALPHABET:
+                variants.add(left + c + right[1:])
+        if len(right) > 1:
+            variants.add(left + right[1] + right[0] + right[2:])
+        for c in _ALPHABET:
+            variants.add(left + c + right)
+    variants.discard(word)
+    return variants
+
+
+def _prefix_filter(token):
+    if connection.vendor == 'sqlite':
+        return Q(term__gte=token, term__lt=token + '\uffff')
+    return Q(term__startswith=token)
+
+
+def _token_score(token):
+    """ Mejor peso x calidad de coincidencia de `token` entre los términos de cada usuario (0 si ninguno). """
+    matches = [
+        When(term=token, then=F('weight') * EXACT),
+        When(_prefix_filter(token), then=F('weight') * PREFIX),
+    ]
+    if MIN_TYPO_LENGTH <= len(token) <= MAX_TYPO_LENGTH:
+        matches.append(When(term__in=typo_variants(token), then=F('weight') * TYPO))
+    return Max(Case(*matches, default=Value(0.0), output_field=FloatField()))
+
+
+def _token_filter(token):
+    condition = _prefix_filter(token)
+    if MIN_TYPO_LENGTH <= len(token) <= MAX_TYPO_LENGTH:
+        condition |= Q(term__in=typo_variants(token))
+    return condition
+
+
+def search_members(query):
+    """
+    IDs de usuario que coinciden con todas las palabras de `query`, del más
+    relevante al menos. Devuelve un queryset: el ranking, el COUNT y la página
+    (LIMIT/OFFSET) se resuelven en la base de datos.
+    """
+    from nsocial.models import MemberSearchTerm
+
+    tokens = list(dict.fromkeys(t[:TERM_MAX_LENGTH] for t in normalize(query).split()))[:MAX_QUERY_TOKENS]
+    # El índice se actualiza tras el commit (y no ve los update() en bloque): se filtra aquí también
+    terms = MemberSearchTerm.objects.filter(user__is_active=True)
+    if not tokens:
+        return terms.none().values_list('user_id', flat=True)
+
+    scores = {f'score_{i}': _token_score(token) for i, token in enumerate(tokens)}
+    matching = reduce(operator.or_, map(_token_filter, tokens))
+    return (
+        terms.filter(matching)
+        .values('user_id')
+        .annotate(**scores)
+        # Todas las palabras deben coincidir
+        .filter(**{f'{name}__gt': 0 for name in scores})
+        .annotate(score=reduce(operator.add, map(F, scores)))
+        .order_by('-score', 'user_id')
+        .values_list('user_id', flat=True)
+    )
+
+
+def index_is_empty():
+    from nsocial.models import MemberSearchTerm
+    return not MemberSearchTerm.objects.exists()
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from membership.serializers import SubscriptionStatusSerializer, MembershipSubscriptionSerializer
+from membership.stripe_client import stripe_client
+from nsocial.emails import email_status
 from nsocial.models import (
     CustomUser,
     UserProfile,
@@ -17,11 +19,17 @@ from nsocial.models import (
     Experience,
     Author,
     Role,
-    UserIntroductionPreference
+    UserIntroductionPreference,
+    ProfileCard,
 )
 import stripe
 import logging
 from django.contrib.auth.password_validation import validate_password
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from nsocial.nested import sync_collection
+from nsocial.search import schedule_reindex
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +45,13 @@ class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['email', 'password']
+
+    def validate_email(self, value):
+        # email_canonical es único: Foo@x.com choca con foo@x.com (el UniqueValidator solo ve el exacto)
+        if email_status(value, cached=False).has_user:
+            raise serializers.ValidationError("A user with this email already exists.")
+        return value
+
     def create(self, validated_data):
         user = CustomUser.objects.create_user(
             validated_data['email'],
@@ -53,6 +68,25 @@ class CurrentUserSerializer(serializers.ModelSerializer):
         fields =('first_name', 'last_name', 'email', 'id', 'profile_picture')
 
 
+class ProfileCardSerializer(serializers.ModelSerializer):
+    """ Resumen de miembro desde ProfileCard (nsocial.cards); mismas claves que CurrentUserSerializer y algunas más. """
+    id = serializers.IntegerField(source='user_id', read_only=True)
+    profile_picture = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProfileCard
+        fields = ('first_name', 'last_name', 'email', 'id', 'profile_picture', 'full_name', 'alias_title',
+                  'headline', 'city', 'plan_title', 'introduction_type')
+        read_only_fields = fields
+
+    def get_profile_picture(self, obj):
+        if not obj.picture:
+            return None
+        url = default_storage.url(obj.picture)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
 class SetNewPasswordSerializer(serializers.Serializer):
     new_password = serializers.CharField(required=True)
     refresh_token = serializers.CharField(required=True)
@@ -272,9 +306,10 @@ class FullProfileSerializer(UserProfileSerializer):
 
         # Opción B: consultar Stripe y serializar con SubscriptionStatusSerializer
         try:
-            stripe_sub = stripe.Subscription.retrieve(
+            stripe_sub = stripe_client.retrieve_subscription(
                 obj.stripe_subscription_id,
-                expand=['plan.product', 'default_payment_method']
+                expand=['plan.product', 'default_payment_method'],
+                fresh=True,
             )
 
             # Sincronización opcional de campos cacheados con lo que devuelve Stripe
@@ -317,10 +352,12 @@ class FullProfileSerializer(UserProfileSerializer):
             qs = getattr(user, 'relatives', None)
             if qs is None:
                 return []
-            return RelativeSerializer(qs.all().order_by('-created_at'), many=True).data
+            # Relative ya se ordena por -created_at; usar .all() aprovecha el prefetch
+            return RelativeSerializer(qs.all(), many=True).data
         except Exception:
             return []
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # 1) Extraer bloques anidados para no interferir con campos simples
         personal_data = validated_data.pop('personal_detail', None)
@@ -353,15 +390,11 @@ class FullProfileSerializer(UserProfileSerializer):
             )
             return obj
 
-        # Helper para manejar listas (borrar y recrear es lo más simple)
-        def update_many_related(model, parent_instance, fk_field_name, related_name, data):
+        # Listas: se escriben por diferencias (nsocial.nested), sin signals por fila
+        def update_many_related(parent_instance, related_name, data):
             if data is None:
                 return
-            # Borramos los objetos existentes
-            getattr(parent_instance, related_name).all().delete()
-            # Creamos los nuevos usando el nombre correcto del FK
-            for item_data in data:
-                model.objects.create(**{fk_field_name: parent_instance}, **item_data)
+            sync_collection(getattr(parent_instance, related_name), data)
 
         # 3) Personal Details y Clubs
         if personal_data is not None:
@@ -370,7 +403,7 @@ class FullProfileSerializer(UserProfileSerializer):
                 PersonalDetail, PersonalDetailSerializer, 'personal_detail', personal_data
             )
             if personal_detail_obj:
-                update_many_related(Club, personal_detail_obj, 'personal_detail', 'clubs', clubs_data)
+                update_many_related(personal_detail_obj, 'clubs', clubs_data)
 
         # 4) Professional Profile y sus listas
         if professional_data is not None:
@@ -382,21 +415,20 @@ class FullProfileSerializer(UserProfileSerializer):
                 ProfessionalProfile, ProfessionalProfileSerializer, 'professional_profile', professional_data
             )
             if prof_profile_obj:
-                update_many_related(WorkPosition, prof_profile_obj, 'professional_profile', 'work_positions', work_data)
-                update_many_related(Education, prof_profile_obj, 'professional_profile', 'education', edu_data)
-                update_many_related(BoardPosition, prof_profile_obj, 'professional_profile', 'on_board', board_data)
-                update_many_related(NonProfitInvolvement, prof_profile_obj, 'professional_profile', 'non_profit_involvement', non_profit_data)
+                update_many_related(prof_profile_obj, 'work_positions', work_data)
+                update_many_related(prof_profile_obj, 'education', edu_data)
+                update_many_related(prof_profile_obj, 'on_board', board_data)
+                update_many_related(prof_profile_obj, 'non_profit_involvement', non_profit_data)
 
         # 5) Recognition (1-1)
         if recognition_data is not None:
             update_or_create_one_to_one(Recognition, RecognitionSerializer, 'recognition', recognition_data)
 
         # 6) Expertise (FK directo a UserProfile)
-        if expertise_data is not None:
-            instance.expertise.all().delete()
-            for item_data in expertise_data:
-                Expertise.objects.create(user_profile=instance, **item_data)
+        update_many_related(instance, 'expertise', expertise_data)
 
+        # Clubs y expertise entran en el índice de búsqueda; los bulk no disparan signals
+        schedule_reindex(instance.user_id)
         return instance
 
 class ExperienceSerializer(serializers.ModelSerializer):
@@ -469,7 +501,8 @@ class AdminProfileSerializer(FullProfileSerializer):
             qs = getattr(user, 'relatives', None)
             if qs is None:
                 return []
-            return RelativeSerializer(qs.all().order_by('-created_at'), many=True).data
+            # Relative ya se ordena por -created_at; usar .all() aprovecha el prefetch
+            return RelativeSerializer(qs.all(), many=True).data
         except Exception:
             return []
 
@@ -638,6 +671,50 @@ class AdminProfileConfidentialSerializer(serializers.ModelSerializer):
             'relatives',
         ]
 
+    def _replace_relatives(self, relatives_payload):
+        from api.models import RelationshipCatalog
+        user = self.context.get('request').user if self.context and self.context.get('request') else None
+        if user is None or not getattr(user, 'is_authenticated', False):
+            raise serializers.ValidationError({'relatives': 'Authentication required.'})
+
+        # Skip invalid entries silently (minimal behavior); could also raise error
+        items = [item for item in relatives_payload or [] if isinstance(item, dict) and item.get('first_name')]
+
+        # Relationships by id, or by name as a fallback, resolved in one query
+        rel_ids, rel_names = set(), set()
+        for item in items:
+            if item.get('relationship_id') is not None:
+                rel_ids.add(str(item['relationship_id']))
+            rel_name = item.get('relationship') or item.get('relationship_name')
+            if rel_name:
+                rel_names.add(str(rel_name))
+        by_id, by_name = {}, {}
+        if rel_ids or rel_names:
+            numeric_ids = [int(pk) for pk in rel_ids if pk.isdigit()]
+            for rel in RelationshipCatalog.objects.filter(Q(id__in=numeric_ids) | Q(name__in=rel_names)):
+                by_id[str(rel.pk)] = rel
+                by_name[rel.name] = rel
+
+        relatives = []
+        for item in items:
+            rel_obj = None
+            if item.get('relationship_id') is not None:
+                rel_obj = by_id.get(str(item['relationship_id']))
+            if rel_obj is None:
+                rel_name = item.get('relationship') or item.get('relationship_name')
+                rel_obj = by_name.get(str(rel_name)) if rel_name else None
+            if rel_obj is None:
+                # If relationship is missing or invalid, skip this relative
+                continue
+            relatives.append({
+                'first_name': item['first_name'],
+                'last_name': item.get('last_name', '') or '',
+                'year_of_birth': item.get('year_of_birth'),
+                'relationship': rel_obj,
+            })
+        sync_collection(user.relatives, relatives)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         # Extract write-only sections first
         contact_methods = validated_data.pop('contact_methods', None)
@@ -669,44 +746,9 @@ class AdminProfileConfidentialSerializer(serializers.ModelSerializer):
         # Relatives replacement (if provided)
         if relatives_payload is not None:
             try:
-                from api.models import Relative, RelationshipCatalog
-                user = self.context.get('request').user if self.context and self.context.get('request') else None
-                if user is None or not getattr(user, 'is_authenticated', False):
-                    raise serializers.ValidationError({'relatives': 'Authentication required.'})
-
-                # Remove all existing relatives for this user
-                Relative.objects.filter(user=user).delete()
-
-                for item in relatives_payload or []:
-                    if not isinstance(item, dict):
-                        continue
-                    first_name = item.get('first_name')
-                    if not first_name:
-                        # Skip invalid entries silently (minimal behavior); could also raise error
-                        continue
-                    last_name = item.get('last_name', '') or ''
-                    year_of_birth = item.get('year_of_birth')
-
-                    rel_obj = None
-                    rel_id = item.get('relationship_id')
-                    if rel_id is not None:
-                        rel_obj = RelationshipCatalog.objects.filter(id=rel_id).first()
-                    if rel_obj is None:
-                        # Optional: attempt by name
-                        rel_name = item.get('relationship') or item.get('relationship_name')
-                        if rel_name:
-                            rel_obj = RelationshipCatalog.objects.filter(name=str(rel_name)).first()
-                    if rel_obj is None:
-                        # If relationship is missing or invalid, skip this relative
-                        continue
-
-                    Relative.objects.create(
-                        user=user,
-                        first_name=first_name,
-                        last_name=last_name,
-                        year_of_birth=year_of_birth,
-                        relationship=rel_obj,
-                    )
+                # Savepoint: si falla, el resto del perfil se guarda igual
+                with transaction.atomic():
+                    self._replace_relatives(relatives_payload)
             except Exception:
                 # Fail silently for relatives block to keep minimal surface; could log
                 pass
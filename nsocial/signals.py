@@ -1,9 +1,157 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
-from .models import UserProfile
+from django.db import transaction
+from .models import CustomUser, UserProfile, PersonalDetail, ProfessionalProfile, Club, Expertise, UserIntroductionPreference
+from .cards import USER_CARD_FIELDS, PROFILE_CARD_FIELDS, schedule_card_refresh
+from .emails import forget_email
+from .search import USER_INDEX_FIELDS, PROFILE_INDEX_FIELDS, schedule_reindex
+from .tokens import USER_CLAIM_FIELDS, PROFILE_CLAIM_FIELDS, bump_auth_version
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
+
+
+def _saves_any(update_fields, fields):
+    # update_fields=None: save() completo
+    return update_fields is None or not update_fields.isdisjoint(fields)
+
+
+# --- Índice de búsqueda de miembros (nsocial.search) ---
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_user(sender, instance, update_fields=None, **kwargs):
+    if _saves_any(update_fields, USER_INDEX_FIELDS):
+        schedule_reindex(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def reindex_profile(sender, instance, update_fields=None, **kwargs):
+    if _saves_any(update_fields, PROFILE_INDEX_FIELDS):
+        schedule_reindex(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=PersonalDetail)
+@receiver([post_save, post_delete], sender=ProfessionalProfile)
+@receiver([post_save, post_delete], sender=Expertise)
+def reindex_profile_section(sender, instance, **kwargs):
+    user_id = UserProfile.objects.filter(pk=instance.user_profile_id).values_list('user_id', flat=True).first()
+    schedule_reindex(user_id)
+
+
+@receiver([post_save, post_delete], sender=Club)
+def reindex_club(sender, instance, **kwargs):
+    user_id = (PersonalDetail.objects.filter(pk=instance.personal_detail_id)
+               .values_list('user_profile__user_id', flat=True).first())
+    schedule_reindex(user_id)
+
+
+# --- Caché de nsocial.emails.email_status ---
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+@receiver(pre_save, sender='waitinglist.WaitingList')
+@receiver(pre_save, sender='membership.UserInvitation')
+@receiver(pre_save, sender='membership.MemberReferral')
+def track_previous_email(sender, instance, update_fields=None, **kwargs):
+    # Si cambia el correo también hay que olvidar el estado de la dirección anterior
+    instance._previous_email = None
+    if instance._state.adding or instance.pk is None or (update_fields is not None and 'email' not in update_fields):
+        return
+    instance._previous_email = sender._base_manager.filter(pk=instance.pk).values_list('email', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+@receiver([post_save, post_delete], sender='waitinglist.WaitingList')
+@receiver([post_save, post_delete], sender='membership.UserInvitation')
+@receiver([post_save, post_delete], sender='membership.MemberReferral')
+def forget_email_status(sender, instance, **kwargs):
+    emails = {instance.email, getattr(instance, '_previous_email', None)} - {None, ''}
+    instance._previous_email = None
+    # Tras el commit, para que una lectura concurrente no vuelva a cachear el estado anterior
+    transaction.on_commit(lambda: [forget_email(email) for email in emails])
+
+
+
+# --- Tarjetas de miembro (nsocial.cards) ---
+
+def _profile_users(**filters):
+    return list(UserProfile.objects.filter(**filters).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_user_card(sender, instance, update_fields=None, **kwargs):
+    if _saves_any(update_fields, USER_CARD_FIELDS):
+        schedule_card_refresh([instance.pk])
+
+
+@receiver(post_save, sender=UserProfile)
+def refresh_profile_card(sender, instance, update_fields=None, **kwargs):
+    if _saves_any(update_fields, PROFILE_CARD_FIELDS):
+        schedule_card_refresh([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=UserIntroductionPreference)
+@receiver([post_save, post_delete], sender='membership.MembershipSubscription')
+def refresh_card_for_profile_relation(sender, instance, **kwargs):
+    schedule_card_refresh(_profile_users(pk=instance.user_profile_id))
+
+
+@receiver(post_save, sender='membership.Plan')
+def refresh_cards_for_plan(sender, instance, created, **kwargs):
+    if not created:
+        schedule_card_refresh(_profile_users(current_subscription__plan=instance))
+
+
+@receiver(post_save, sender='membership.IntroductionCatalog')
+def refresh_cards_for_introduction_type(sender, instance, created, **kwargs):
+    if not created:
+        schedule_card_refresh(_profile_users(introduction_preference__introduction_type=instance))
+
+
+
+# --- Versión de los claims del token (nsocial.tokens) ---
+
+def _claims_changed(instance, fields):
+    if instance._state.adding or instance.pk is None:
+        return False
+    old = type(instance)._base_manager.filter(pk=instance.pk).values(*fields).first()
+    return old is not None and any(old[f] != getattr(instance, f) for f in fields)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def track_user_claims(sender, instance, update_fields=None, **kwargs):
+    fields = [f for f in USER_CLAIM_FIELDS if update_fields is None or f in update_fields
+              or f.removesuffix('_id') in update_fields]
+    instance._claims_changed = bool(fields) and _claims_changed(instance, fields)
+
+
+@receiver(pre_save, sender=UserProfile)
+def track_profile_claims(sender, instance, update_fields=None, **kwargs):
+    fields = [f for f in PROFILE_CLAIM_FIELDS if update_fields is None or f in update_fields]
+    instance._claims_changed = bool(fields) and _claims_changed(instance, fields)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_user_claims(sender, instance, **kwargs):
+    if getattr(instance, '_claims_changed', False):
+        bump_auth_version([instance.pk])
+        # Los tokens que se emitan con esta instancia ya llevan la versión nueva
+        instance.auth_version += 1
+        instance._claims_changed = False
+
+
+@receiver(post_save, sender=UserProfile)
+def bump_profile_claims(sender, instance, **kwargs):
+    if getattr(instance, '_claims_changed', False):
+        bump_auth_version([instance.user_id])
+        instance._claims_changed = False
+
+
+@receiver(post_save, sender='nsocial.Role')
+@receiver(pre_delete, sender='nsocial.Role')
+def bump_role_claims(sender, instance, created=False, **kwargs):
+    # code/name/is_admin viajan en el token de cada usuario del rol
+    if not created:
+        bump_auth_version(CustomUser.objects.filter(role=instance).values_list('pk', flat=True))
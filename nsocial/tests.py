@@ -0,0 +1,339 @@
+import socket
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.management import call_command
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from nsocial.emails import check_canonical_email_managers, email_status
+from api.models import InviteTmpToken, RelationshipCatalog
+from nsocial.loaders import request_profile
+from nsocial.models import Club, CustomUser, PersonalDetail, ProfileCard, Recognition, Role, SocialMediaProfile, UserProfile
+from nsocial.nested import sync_collection
+from nsocial.serializers import CustomUserSerializer
+from nsocial.search import search_members
+from waitinglist.models import WaitingList
+
+
+class MemberSearchTests(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana = CustomUser.objects.create(email='ana@nobilis.test', first_name='Ana', last_name='Müller')
+            self.bruno = CustomUser.objects.create(email='bruno@nobilis.test', first_name='Bruno', last_name='Rossi')
+            self.bruno.profile.alias_title = 'Muller Foundation chair'
+            self.bruno.profile.city = 'Zürich, Switzerland'
+            self.bruno.profile.save()
+
+    def test_ranked_accent_folded_match(self):
+        # El apellido pesa más que el alias
+        self.assertEqual(list(search_members('muller')), [self.ana.pk, self.bruno.pk])
+        self.assertEqual(list(search_members('zurich')), [self.bruno.pk])
+
+    def test_typo_and_prefix(self):
+        self.assertEqual(list(search_members('rosi')), [self.bruno.pk])
+        self.assertEqual(list(search_members('bru zur')), [self.bruno.pk])
+        self.assertEqual(list(search_members('ana zurich')), [])
+        # El dominio del correo no se indexa
+        self.assertEqual(list(search_members('nobilis')), [])
+
+    def test_profile_save_reindexes(self):
+        profile = self.ana.profile
+        profile.often_in = 'Lisbon'
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual(list(search_members('lisbon')), [self.ana.pk])
+
+    def test_last_login_does_not_reindex(self):
+        with mock.patch('nsocial.signals.schedule_reindex') as schedule:
+            update_last_login(None, self.ana)
+            self.ana.profile.save(update_fields=['biography'])
+            schedule.assert_not_called()
+            self.ana.save(update_fields=['last_name'])
+            schedule.assert_called_once_with(self.ana.pk)
+
+    def test_endpoint_paginates(self):
+        client = APIClient()
+        client.force_authenticate(self.ana)
+        response = client.get('/api/v1/users/search/', {'search': 'muller', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([u['id'] for u in response.data['results']], [self.ana.pk])
+
+    def test_endpoint_skips_inactive_before_paginating(self):
+        client = APIClient()
+        client.force_authenticate(self.bruno)
+        # update() no pasa por los signals: el índice todavía tiene a Ana
+        CustomUser.objects.filter(pk=self.ana.pk).update(is_active=False)
+        response = client.get('/api/v1/users/search/', {'search': 'muller', 'limit': 1})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual([u['id'] for u in response.data['results']], [self.bruno.pk])
+
+        # Sin término, las mismas claves que con el índice
+        fallback = client.get('/api/v1/users/search/').data
+        self.assertEqual([u['id'] for u in fallback['results']], [self.bruno.pk])
+        self.assertEqual(set(fallback['results'][0]), set(response.data['results'][0]))
+
+
+class EmailStatusTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        CustomUser.objects.create(email='Carla@Nobilis.test', first_name='Carla', last_name='Test')
+
+    def test_lookup_is_case_insensitive_single_query_and_cached(self):
+        with self.assertNumQueries(1):
+            found = email_status('  carla@NOBILIS.test ')
+        self.assertTrue(found.has_user)
+        self.assertEqual(found.email, 'carla@nobilis.test')
+        with self.assertNumQueries(0):
+            self.assertTrue(email_status('carla@nobilis.test').has_user)
+        self.assertFalse(email_status('nobody@nobilis.test').known)
+
+    def test_email_change_forgets_previous_address(self):
+        self.assertTrue(email_status('carla@nobilis.test').has_user)
+        user = CustomUser.objects.get(email='Carla@Nobilis.test')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.email = 'carla.new@nobilis.test'
+            user.save()
+        with self.assertNumQueries(1):
+            self.assertFalse(email_status('carla@nobilis.test').has_user)
+
+    def test_signup_rejects_email_differing_only_in_case(self):
+        serializer = CustomUserSerializer(data={'email': 'CARLA@nobilis.test', 'password': 'S3cure-pass!'})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('email', serializer.errors)
+
+    def test_bulk_writes_keep_canonical_email(self):
+        # email_canonical == canonical_email(email) también sin pasar por save()
+        users = CustomUser.objects.bulk_create([
+            CustomUser(email='Eli@Nobilis.test', first_name='Eli', last_name='Test'),
+            CustomUser(email='Fran@Nobilis.test', first_name='Fran', last_name='Test'),
+        ])
+        self.assertEqual([u.email_canonical for u in users], ['eli@nobilis.test', 'fran@nobilis.test'])
+
+        CustomUser.objects.filter(pk=users[0].pk).update(email='Elisa@Nobilis.test')
+        users[1].email = 'Francisca@Nobilis.test'
+        CustomUser.objects.bulk_update([users[1]], ['email'])
+        self.assertEqual(
+            set(CustomUser.objects.filter(pk__in=[u.pk for u in users]).values_list('email_canonical', flat=True)),
+            {'elisa@nobilis.test', 'francisca@nobilis.test'},
+        )
+        self.assertEqual(check_canonical_email_managers(), [])
+
+    def test_exists_endpoint_sees_changes(self):
+        url = '/api/v1/waitinglist/exists/'
+        self.assertEqual(self.client.post(url, {'email': 'dora@nobilis.test'}).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            WaitingList.objects.create(first_name='Dora', last_name='Test', email='Dora@Nobilis.test',
+                                       status=WaitingList.STATUS_APPROVED)
+        self.assertEqual(self.client.post(url, {'email': 'DORA@nobilis.test'}).status_code, 409)
+
+
+class NestedCollectionWriteTests(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = CustomUser.objects.create(email='dora@nobilis.test', first_name='Dora', last_name='Test')
+            self.personal = PersonalDetail.objects.create(user_profile=self.user.profile)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_diff_keeps_unchanged_rows_and_payload_order(self):
+        sync_collection(self.personal.clubs, [{'name': 'A', 'city': 'Rome'}, {'name': 'B', 'city': 'Oslo'}])
+        first = list(Club.objects.filter(personal_detail=self.personal).order_by('pk'))
+
+        with self.assertNumQueries(5):  # savepoint, lectura, UPDATE, INSERT y release
+            counts = sync_collection(self.personal.clubs, [
+                {'name': 'A', 'city': 'Rome'}, {'name': 'C', 'city': 'Lima'}, {'name': 'D', 'city': 'Quito'},
+            ])
+        self.assertEqual(counts, {'created': 1, 'updated': 1, 'deleted': 0})
+        clubs = list(Club.objects.filter(personal_detail=self.personal).order_by('pk'))
+        self.assertEqual([c.name for c in clubs], ['A', 'C', 'D'])
+        self.assertEqual(clubs[0].pk, first[0].pk)
+
+        counts = sync_collection(self.personal.clubs, [{'name': 'A', 'city': 'Rome'}])
+        self.assertEqual(counts, {'created': 0, 'updated': 0, 'deleted': 2})
+
+    def test_profile_endpoints_write_lists(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/v1/full-profile/', {
+                'personalDetail': {'clubs': [{'name': 'Yacht Club', 'city': 'Monaco'}]},
+                'expertise': [{'title': 'Sailing', 'content': 'Offshore', 'pricing': '10', 'rate': 'hour'}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['name'] for c in response.data['personal_detail']['clubs']], ['Yacht Club'])
+        # bulk_create no dispara signals: el serializer reindexa
+        self.assertEqual(list(search_members('yacht')), [self.user.pk])
+
+        brother = RelationshipCatalog.objects.create(name='Brother')
+        response = self.client.patch('/api/v1/admin-profile/confidential/', {
+            'relatives': [
+                {'firstName': 'Leo', 'relationshipId': brother.pk},
+                {'firstName': 'Max', 'relationship': 'Brother'},
+                {'firstName': 'Nobody', 'relationship': 'Unknown'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(self.user.relatives.values_list('first_name', flat=True)), ['Leo', 'Max'])
+
+
+class RequestProfileTests(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = CustomUser.objects.create(email='iris@nobilis.test', first_name='Iris', last_name='Test')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_loads_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(1):
+            profile = request_profile(request)
+            self.assertIs(request_profile(request), profile)
+            self.assertEqual(profile.user.email, self.user.email)
+
+    def test_reads_never_create_profile(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        response = self.client.get('/api/v1/admin-profile/confidential/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_writes_create_missing_one_to_one(self):
+        response = self.client.put('/api/v1/profile/recognition/', {'additionalLinks': ['https://a.test']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Recognition.objects.get(user_profile=self.user.profile).additional_links, ['https://a.test'])
+
+
+class ProfileCardTests(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users = [
+                CustomUser.objects.create(email=f'eva{i}@nobilis.test', first_name=f'Eva{i}', last_name='Sailor')
+                for i in range(3)
+            ]
+
+    def test_signals_keep_card_in_sync(self):
+        profile = self.users[0].profile
+        profile.alias_title = 'Harbour master'
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        card = ProfileCard.objects.get(user=self.users[0])
+        self.assertEqual((card.full_name, card.alias_title), ('Eva0 Sailor', 'Harbour master'))
+
+        ProfileCard.objects.all().delete()
+        call_command('rebuild_profile_cards', stdout=StringIO())
+        self.assertEqual(ProfileCard.objects.count(), 3)
+
+    def test_last_login_does_not_refresh_card(self):
+        # Lo que hace token_pair() en cada login
+        with mock.patch('nsocial.signals.schedule_card_refresh') as schedule:
+            update_last_login(None, self.users[0])
+            self.users[0].profile.save(update_fields=['biography'])
+            schedule.assert_not_called()
+            self.users[0].profile.save(update_fields=['city'])
+            schedule.assert_called_once_with([self.users[0].pk])
+
+    def test_search_page_is_served_from_cards(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        # índice (3) + tarjetas de la página (1), con cualquier tamaño de página
+        with self.assertNumQueries(4):
+            data = client.get('/api/v1/users/search/', {'search': 'sailor', 'limit': 3}).data
+        self.assertEqual(data['count'], 3)
+        self.assertEqual({r['full_name'] for r in data['results']}, {'Eva0 Sailor', 'Eva1 Sailor', 'Eva2 Sailor'})
+
+
+class TokenIssueTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='fran@nobilis.test', first_name='Fran', last_name='Test', is_active=False)
+        self.client = APIClient()
+
+    def _no_network(self):
+        return mock.patch.object(socket.socket, 'connect', side_effect=AssertionError('outbound connection'))
+
+    def test_activation_and_reset_mint_tokens_in_process(self):
+        InviteTmpToken.objects.create(user_email=self.user.email, user_token='invite-token', user_id=self.user.pk)
+        with self._no_network():
+            start = time.perf_counter()
+            response = self.client.put('/api/v1/activate-account/',
+                                       {'newPassword': 'S3cure-pass!', 'refreshToken': 'invite-token'}, format='json')
+            elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'refresh', 'access', 'subscription'})
+        self.assertEqual(int(AccessToken(response.data['access'])['user_id']), self.user.pk)
+        # Sin la llamada HTTP a /token/ no hay esperas de red
+        self.assertLess(elapsed, 3)
+
+        self.user.refresh_from_db()
+        reset = {
+            'user': urlsafe_base64_encode(force_bytes(self.user.pk)),
+            'token': PasswordResetTokenGenerator().make_token(self.user),
+            'password': 'An0ther-secure!',
+        }
+        with self._no_network():
+            response = self.client.post('/api/v1/reset-password/confirm/', reset, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+        login = self.client.post('/api/v1/token/', {'email': self.user.email, 'password': 'An0ther-secure!'}, format='json')
+        self.assertEqual(set(login.data), {'refresh', 'access', 'subscription'})
+
+
+@override_settings(JWT_CLAIMS_AUTH=True)
+class ClaimsAuthenticationTests(TestCase):
+    URL = '/api/v1/members/dependents/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='gus@nobilis.test', password='S3cure-pass!', first_name='Gus', last_name='Test',
+            role=Role.objects.create(code='member', name='Member'),
+        )
+        self.tokens = APIClient().post('/api/v1/token/', {'email': self.user.email, 'password': 'S3cure-pass!'},
+                                       format='json').data
+        self.client = APIClient()
+
+    def _get(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get(self.URL)
+
+    def test_reads_skip_user_query_until_claims_change(self):
+        self._get(self.tokens['access'])  # cachea la versión
+        with self.assertNumQueries(1):  # solo la consulta de la vista
+            response = self._get(self.tokens['access'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user.role_code, 'member')
+
+        with override_settings(JWT_CLAIMS_AUTH=False), self.assertNumQueries(2):  # + usuario
+            self._get(self.tokens['access'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = Role.objects.create(code='admin', name='Admin', is_admin=True)
+            self.user.save()
+        response = self._get(self.tokens['access'])
+        self.assertEqual(response.status_code, 401)
+
+        refreshed = APIClient().post('/api/v1/token/refresh/', {'refresh': self.tokens['refresh']}, format='json').data
+        response = self._get(refreshed['access'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.wsgi_request.user.is_admin)
+
+    def test_reads_use_the_profile_id_claim(self):
+        SocialMediaProfile.objects.create(user_profile=self.user.profile, platform_name='x', profile_url='https://x.com/gus')
+        self._get(self.tokens['access'])  # cachea la versión
+        with self.assertNumQueries(2):  # count + página, sin buscar el perfil del usuario
+            response = self.client.get('/api/v1/social-profiles/')
+        self.assertEqual([p['platform_name'] for p in response.data['results']], ['x'])
+        self.assertEqual(request_profile(response.wsgi_request).pk, self.user.profile.pk)
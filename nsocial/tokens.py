@@ -0,0 +1,149 @@
+"""
+Emisión de tokens JWT dentro del proceso.
+
+`issue_tokens(user)` devuelve lo mismo que POST /api/v1/token/
+(TokenObtainPairWithSubscriptionView): {'refresh', 'access', 'subscription'}.
+Las vistas que activan una cuenta o restablecen la contraseña lo usan en vez de
+llamar por HTTP a nuestro propio endpoint de login.
+
+Los access tokens llevan además, en el claim "nb", lo que las vistas de lectura
+necesitan del usuario (email, nombre, rol, admin, perfil y estado de la
+suscripción) y "ver" = CustomUser.auth_version. Con JWT_CLAIMS_AUTH,
+nsocial.authentication arma el usuario con esos claims sin consultar la base.
+Los signals suben auth_version cuando cambia alguno de esos datos; un token con
+una versión anterior se rechaza (401) y el cliente lo renueva en /token/refresh/,
+que vuelve a leer al usuario.
+"""
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+CLAIMS_KEY = 'nb'
+VERSION_CLAIM = 'ver'
+
+# Campos que viajan en el token: si cambian, sube auth_version
+USER_CLAIM_FIELDS = ('email', 'first_name', 'last_name', 'role_id', 'is_active', 'is_staff', 'is_superuser')
+PROFILE_CLAIM_FIELDS = ('subscription_status',)
+
+
+def subscription_summary(user):
+    """ Datos cacheados de la suscripción en el perfil (sin llamar a Stripe), o None. """
+    from nsocial.models import UserProfile
+
+    profile = UserProfile.objects.filter(user=user).first()
+    if profile is None or not profile.stripe_subscription_id:
+        return None
+    return {
+        'id': profile.stripe_subscription_id,
+        'status': profile.subscription_status,
+        'current_period_end': profile.subscription_current_period_end,
+        'cancel_at_period_end': profile.cancel_at_period_end,
+        'card': (
+            {'brand': profile.card_brand, 'last4': profile.card_last4}
+            if profile.card_last4 else None
+        )
+    }
+
+
+# --- Claims ---
+
+def user_claims(user):
+    from nsocial.models import UserProfile
+
+    role = user.role
+    profile = UserProfile.objects.filter(user_id=user.pk).values('pk', 'subscription_status').first() or {}
+    return {
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'role': {'id': role.pk, 'code': role.code, 'name': role.name, 'is_admin': role.is_admin} if role else None,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'profile_id': profile.get('pk'),
+        'subscription_status': profile.get('subscription_status'),
+    }
+
+
+def add_claims(access, user):
+    access[CLAIMS_KEY] = user_claims(user)
+    access[VERSION_CLAIM] = user.auth_version
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """ RefreshToken cuyo access token lleva los claims de nsocial (también al renovarlo). """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token._user = user
+        return token
+
+    @property
+    def access_token(self):
+        from nsocial.models import CustomUser
+
+        access = super().access_token
+        user = getattr(self, '_user', None)
+        if user is None:
+            # /token/refresh/: se vuelve a leer al usuario para emitir claims al día
+            user = CustomUser.objects.select_related('role').filter(pk=self[api_settings.USER_ID_CLAIM]).first()
+        if user is not None:
+            add_claims(access, user)
+        return access
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+def token_pair(user):
+    """ (refresh, access) como strings. """
+    refresh = ClaimsRefreshToken.for_user(user)
+    if api_settings.UPDATE_LAST_LOGIN:
+        update_last_login(None, user)
+    return str(refresh), str(refresh.access_token)
+
+
+def issue_tokens(user):
+    refresh, access = token_pair(user)
+    return {'refresh': refresh, 'access': access, 'subscription': subscription_summary(user)}
+
+
+# --- Versión de los claims ---
+
+def _version_key(user_id):
+    return f'auth-version:{user_id}'
+
+
+def current_auth_version(user_id):
+    """
+    auth_version vigente, cacheada JWT_CLAIMS_VERSION_TTL segundos. Con LocMem la
+    invalidación solo llega al proceso que hizo el cambio; el TTL acota el resto.
+    """
+    from nsocial.models import CustomUser
+
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = CustomUser.objects.filter(pk=user_id).values_list('auth_version', flat=True).first()
+        if version is None:
+            return None
+        cache.set(key, version, settings.JWT_CLAIMS_VERSION_TTL)
+    return version
+
+
+def bump_auth_version(user_ids):
+    """ Invalida los claims emitidos a estos usuarios (UPDATE sin signals). """
+    from nsocial.models import CustomUser
+
+    user_ids = [pk for pk in user_ids if pk is not None]
+    if not user_ids:
+        return
+    CustomUser.objects.filter(pk__in=user_ids).update(auth_version=F('auth_version') + 1)
+    keys = [_version_key(pk) for pk in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -12,22 +12,25 @@ from .serializers import (
     AdminProfileBasicSerializer,
     AdminProfileConfidentialSerializer,
     AdminProfileBiographySerializer,
+    ProfileCardSerializer,
 )
-from .models import CustomUser, UserProfile, SocialMediaProfile, Experience, Role, Recognition, Expertise
+from .models import CustomUser, UserProfile, SocialMediaProfile, Experience, Role, Recognition, Expertise, UserVideo
+from .loaders import request_profile, request_profile_id, forget_request_profile
+from .search import search_members, index_is_empty
+from .cards import cards_for
+from .tokens import issue_tokens
 from rest_framework import generics, status, filters
 from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly, IsAuthenticated
 from rest_framework.response import Response
-import requests
 from rest_framework.views import APIView
-from django.urls import reverse
 from nsocial.serializers import ChangePasswordSerializer, SetNewPasswordSerializer, PasswordResetConfirmSerializer
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.core.mail import send_mail
+from notification.mail import queue_mail
 from django.conf import settings
-from django.contrib.sites.shortcuts import get_current_site
+from django.http import Http404
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 
@@ -74,15 +77,9 @@ class SetNewPasswordView(generics.GenericAPIView):
                 user.is_active = True
                 user.set_password(new_password)
                 user.save(update_fields=['password', 'is_active'])
-                
-                data = {'email': invite.user_email, 'password': new_password}
-                current_site = get_current_site(request).domain
-                relative_link = reverse('token_obtain_pair')
-
-                r = requests.post(f'http://{current_site}{relative_link}', data=data) 
                 invite.delete()
-                if r.status_code == 200:
-                    return Response(r.json(), status=status.HTTP_200_OK)  
+                # Misma respuesta que /api/v1/token/, emitida aquí sin llamar al endpoint por HTTP
+                return Response(issue_tokens(user), status=status.HTTP_200_OK)
         else:
             return Response({'error': 'invalid invitation'}, status=status.HTTP_403_FORBIDDEN)
         return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -96,10 +93,10 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         try:
-            obj = UserProfile.objects.get(user=self.request.user)
+            obj = request_profile(self.request, 'basic')
             self.check_object_permissions(self.request, obj)
             return obj
-        except UserProfile.DoesNotExist:
+        except Http404:
             #from django.http import Http404
             #raise Http404
             return Response({
@@ -143,14 +140,8 @@ class ForgotMyPassword(APIView):
             "The link will expire in 1 hour.\n\n"
             "Thank You."
         )
-        try:
-            send_mail(subject, message, settings.ADMIN_USER_EMAIL, [user.email])
-        except Exception as e:
-            print(f"Error sending email: {e}")
-            return Response({
-                "success": False,
-                "message": "There was a problem sending the email."
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Se envía tras la respuesta (worker de notification.mail), con reintentos
+        queue_mail(subject, message, settings.ADMIN_USER_EMAIL, [user.email])
 
         return Response({'detail': 'If an account exists with this email, reset instructions will be sent.'}, status=status.HTTP_200_OK)    
 
@@ -172,13 +163,7 @@ class PasswordResetConfirmView(APIView):
             p = serializer.validated_data['password']
             user.set_password(p)
             user.save()
-
-            data = {"email": user, 'password': p}
-            current_site = get_current_site(request).domain
-            relative_link = reverse('token_obtain_pair')
-            r = requests.post(f'https://{current_site}{relative_link}', data=data) 
-            if r.status_code == 200:
-                return Response(r.json(), status=status.HTTP_200_OK)
+            return Response(issue_tokens(user), status=status.HTTP_200_OK)
         else:
             return Response({'error': 'The reset link is invalid or has expired.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -190,7 +175,7 @@ class SocialMediaProfileListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
 
-        return SocialMediaProfile.objects.filter(user_profile=self.request.user.profile)
+        return SocialMediaProfile.objects.filter(user_profile_id=request_profile_id(self.request))
 
     def get_serializer(self, *args, **kwargs):
 
@@ -201,7 +186,7 @@ class SocialMediaProfileListCreateView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         # Asigna automáticamente el perfil del usuario actual al crear un nuevo objeto
-        serializer.save(user_profile=self.request.user.profile)
+        serializer.save(user_profile_id=request_profile_id(self.request))
 
 class SocialMediaProfileRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -212,22 +197,36 @@ class SocialMediaProfileRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroy
 
     def get_queryset(self):
         # El usuario solo puede afectar a sus propios perfiles sociales
-        return SocialMediaProfile.objects.filter(user_profile=self.request.user.profile)
+        return SocialMediaProfile.objects.filter(user_profile_id=request_profile_id(self.request))
 
 
-class AdminProfileView(generics.RetrieveUpdateAPIView):
+class LoadedProfileMixin:
+    """
+    Carga el perfil del usuario autenticado una vez por petición con un número
+    fijo de consultas (ver nsocial.loaders.request_profile) y lo recarga tras
+    un update, ya que las relaciones prefetcheadas quedan obsoletas después de
+    escribir.
+    """
+    profile_kind = 'full'
+
+    def get_object(self):
+        return request_profile(self.request, self.profile_kind)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        forget_request_profile(self.request)
+        serializer.instance = self.get_object()
+
+
+class AdminProfileView(LoadedProfileMixin, generics.RetrieveUpdateAPIView):
     """
     View to retrieve/update only postal_address and often_in, including relatives list (read-only).
     """
     serializer_class = AdminProfileSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_object(self):
-        profile, _ = UserProfile.objects.get_or_create(user=self.request.user)
-        return profile
-
 
-class AdminProfileBasicView(generics.RetrieveUpdateAPIView):
+class AdminProfileBasicView(LoadedProfileMixin, generics.RetrieveUpdateAPIView):
     """
     Endpoint: /api/admin-profile/basic/
     Allows GET and PUT/PATCH to update basic admin profile fields:
@@ -237,9 +236,7 @@ class AdminProfileBasicView(generics.RetrieveUpdateAPIView):
     serializer_class = AdminProfileBasicSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_object(self):
-        profile, _ = UserProfile.objects.get_or_create(user=self.request.user)
-        return profile
+    profile_kind = 'basic'
 
 
 class AdminProfileConfidentialView(generics.RetrieveUpdateAPIView):
@@ -253,22 +250,16 @@ class AdminProfileConfidentialView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        profile, _ = UserProfile.objects.get_or_create(user=self.request.user)
-        return profile
+        return request_profile(self.request)
 
 
-class FullProfileView(generics.RetrieveUpdateAPIView):
+class FullProfileView(LoadedProfileMixin, generics.RetrieveUpdateAPIView):
     """
     Vista para ver y actualizar el perfil completo del usuario autenticado.
     """
     serializer_class = FullProfileSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_object(self):
-        # Buscamos/creamos el perfil del usuario autenticado
-        profile, _ = UserProfile.objects.get_or_create(user=self.request.user)
-        return profile
-
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
         raw = self.request.query_params.get('fresh_subscription')
@@ -285,11 +276,11 @@ class UserVideoListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         # Mostramos solo los videos del usuario que hace la petición
-        return self.request.user.profile.videos.all().order_by('-uploaded_at')
+        return UserVideo.objects.filter(user_profile_id=request_profile_id(self.request)).order_by('-uploaded_at')
 
     def perform_create(self, serializer):
         # Asignamos el perfil del usuario automáticamente al subir un video
-        serializer.save(user_profile=self.request.user.profile)
+        serializer.save(user_profile_id=request_profile_id(self.request))
 
 
 class UserVideoDestroyView(generics.DestroyAPIView):
@@ -298,7 +289,7 @@ class UserVideoDestroyView(generics.DestroyAPIView):
 
     def get_queryset(self):
         # El usuario solo puede eliminar sus propios videos
-        return self.request.user.profile.videos.all()
+        return UserVideo.objects.filter(user_profile_id=request_profile_id(self.request))
 
 
 class ExperienceListView(generics.ListAPIView):
@@ -359,7 +350,7 @@ class ProfilePictureUpdateView(APIView):
         file_obj = request.FILES.get('profile_picture') or request.data.get('profile_picture')
         if not file_obj:
             return Response({'detail': 'profile_picture is required'}, status=status.HTTP_400_BAD_REQUEST)
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        profile = request_profile(request)
         profile.profile_picture = file_obj
         profile.save(update_fields=['profile_picture'])
         # Devolver la ruta (URL) donde quedó accesible la imagen
@@ -388,7 +379,7 @@ class AdminProfileBiographyView(APIView):
         serializer = AdminProfileBiographySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        profile = request_profile(request)
 
         # Update biography if present
         if 'biiology' in data:  # safeguard typo won't ever trigger; real key below
@@ -464,8 +455,11 @@ class RecognitionUpdateView(APIView):
                 cleaned.append({'desc': desc, 'url': url})
             recog_list = cleaned
 
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
-        recognition_obj, _ = Recognition.objects.get_or_create(user_profile=profile)
+        profile = request_profile(request)
+        try:
+            recognition_obj = profile.recognition
+        except Recognition.DoesNotExist:
+            recognition_obj = Recognition.objects.create(user_profile=profile)
 
         updates = {}
         if recog_list is not None:
@@ -518,8 +512,7 @@ class ExpertiseUpdateView(APIView):
         if not isinstance(items, list):
             return Response({'detail': 'expertise must be an array'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Ensure user profile exists
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        profile = request_profile(request)
 
         # Replace existing expertise entries
         profile.expertise.all().delete()
@@ -571,17 +564,31 @@ class ExpertiseUpdateView(APIView):
 
 class UserSearchView(generics.ListAPIView):
     """
-    Endpoint para buscar usuarios por nombre, apellido o email.
+    Endpoint para buscar miembros por nombre, alias, ciudad, often_in,
+    industrias, hobbies, clubs y expertise (ver nsocial.search), con ranking,
+    tolerancia a errores de tipeo y paginación (limit/offset).
 
     Uso: GET /api/v1/users/search/?search=termino_buscado
     """
     # Solo buscamos entre usuarios activos
-    queryset = CustomUser.objects.filter(is_active=True)
-    serializer_class = CurrentUserSerializer  # Reutiliza el serializer simple de usuario
+    queryset = CustomUser.objects.filter(is_active=True).order_by('pk')
+    serializer_class = ProfileCardSerializer
     permission_classes = [IsAuthenticated]  # Solo usuarios autenticados pueden buscar
 
     # --- Configuración del filtro ---
+    # Solo se usa si el índice aún no se construyó (manage.py reindex_members)
     filter_backends = [filters.SearchFilter]
-    # Campos en los que se buscará (case-insensitive)
     search_fields = ['first_name', 'last_name', 'email']
 
+    def list(self, request, *args, **kwargs):
+        term = request.query_params.get('search', '').strip()
+        if not term or index_is_empty():
+            ids = self.filter_queryset(self.get_queryset()).values_list('pk', flat=True)
+        else:
+            # search_members() ya descarta los inactivos: las páginas salen completas
+            ids = search_members(term)
+
+        # Resultados desde ProfileCard: una consulta sin importar el tamaño de la página
+        page = cards_for(self.paginate_queryset(ids))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
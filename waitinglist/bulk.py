@@ -0,0 +1,185 @@
+"""
+Aprobación y rechazo en lote de la lista de espera.
+
+`approve_entries(ids)` valida todas las entradas con una consulta (bloqueadas
+con select_for_update), busca en otra los correos que ya tienen usuario y crea
+usuarios, perfiles, direcciones de envío y tokens de activación con un
+bulk_create por tabla. bulk_create no dispara los post_save de CustomUser, así
+que aquí se hace lo que hacen los signals (perfil, dirección, reindexado,
+tarjeta de miembro, contador de no leídas y caché de nsocial.emails). Los
+correos se encolan con un solo INSERT y salen tras el commit.
+
+Ambas funciones devuelven un resultado por id, en el orden recibido:
+{'id', 'status', 'email', 'error'} con status approved/rejected/skipped.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+from api.models import InviteTmpToken
+from membership.models import ShippingAddress
+from notification import counters
+from notification.mail import queue_mass_mail
+from nsocial.cards import schedule_card_refresh
+from nsocial.emails import forget_email
+from nsocial.models import CustomUser, Role, UserProfile
+from nsocial.search import schedule_reindex
+from waitinglist.models import WaitingList
+
+DEFAULT_ROLE_ID = 2  # FINAL USER
+
+APPROVED, REJECTED, SKIPPED = 'approved', 'rejected', 'skipped'
+
+ERROR_NOT_FOUND = 'Waiting list entry not found.'
+ERROR_PROCESSED = 'This request has already been processed.'
+ERROR_USER_EXISTS = 'A user with this email already exists in the system.'
+ERROR_DUPLICATE = 'Another entry in this batch has the same email.'
+
+
+def approval_message(first_name, token):
+    abslink = f'{settings.CURRENT_SITE}/activate-account/{token}/{first_name}/'
+    subject = 'You have been accepted into Nobilis!'
+    message = (
+        f"Hello {first_name},\n\n"
+        f"Congratulations! Your application to join Nobilis has been approved.\n\n"
+        f"To activate your account and set your password, please click the following link:\n"
+        f"{abslink}\n\n"
+        f"Welcome to the community!\n\n"
+        f"Greetings,\nThe Nobilis Team"
+    )
+    return subject, message
+
+
+def rejection_message(first_name):
+    subject = 'Update on your application at Nobilis'
+    message = (
+        f"Hello {first_name}\n\n"
+        f"Unfortunately, we have rejected your request to join Nobilis.\n\n"
+        f"Greetings,\nThe Nobilis Team"
+    )
+    return subject, message
+
+
+def _result(pk, status, entry=None, error=None):
+    return {'id': pk, 'status': status, 'email': entry.email if entry else None, 'error': error}
+
+
+def _locked_entries(ids):
+    return WaitingList.objects.select_for_update().in_bulk(ids)
+
+
+def _forget_on_commit(emails):
+    emails = list(emails)
+    transaction.on_commit(lambda: [forget_email(email) for email in emails])
+
+
+@transaction.atomic
+def approve_entries(ids):
+    """ Aprueba las entradas pendientes de `ids`. Lanza Role.DoesNotExist si falta el rol por defecto. """
+    ids = list(dict.fromkeys(ids))
+    entries = _locked_entries(ids)
+    pending = [entries[pk] for pk in ids if pk in entries and entries[pk].status == WaitingList.STATUS_PENDING]
+
+    existing = set(CustomUser.objects.filter(
+        email_canonical__in={entry.email_canonical for entry in pending},
+    ).values_list('email_canonical', flat=True))
+
+    to_approve, clashing, seen = [], [], set()
+    errors = {}
+    for entry in pending:
+        if entry.email_canonical in existing:
+            # Igual que approve(): si ya hay usuario la solicitud se rechaza
+            clashing.append(entry)
+            errors[entry.pk] = ERROR_USER_EXISTS
+        elif entry.email_canonical in seen:
+            errors[entry.pk] = ERROR_DUPLICATE
+        else:
+            seen.add(entry.email_canonical)
+            to_approve.append(entry)
+
+    if to_approve:
+        role = Role.objects.get(pk=DEFAULT_ROLE_ID)
+        users = []
+        for entry in to_approve:
+            user = CustomUser(
+                email=CustomUser.objects.normalize_email(entry.email),
+                first_name=entry.first_name, last_name=entry.last_name,
+                is_active=False, role=role,
+            )
+            user.set_unusable_password()
+            users.append(user)
+        users = CustomUser.objects.bulk_create(users)
+
+        # Lo que harían los post_save de CustomUser
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+        ShippingAddress.objects.bulk_create([ShippingAddress(user=user) for user in users])
+        user_ids = [user.pk for user in users]
+        for pk in user_ids:
+            schedule_reindex(pk)
+        schedule_card_refresh(user_ids)
+        counters.ensure_counters(user_ids)
+
+        tokens = [uuid.uuid4().hex for _ in users]
+        InviteTmpToken.objects.bulk_create([
+            InviteTmpToken(user_email=user.email, user_token=token, user_id=user.pk)
+            for user, token in zip(users, tokens)
+        ])
+        queue_mass_mail([
+            (*approval_message(user.first_name, token), settings.ADMIN_USER_EMAIL, [user.email])
+            for user, token in zip(users, tokens)
+        ])
+        WaitingList.objects.filter(pk__in=[entry.pk for entry in to_approve]).update(
+            status=WaitingList.STATUS_APPROVED,
+        )
+
+    if clashing:
+        WaitingList.objects.filter(pk__in=[entry.pk for entry in clashing]).update(
+            status=WaitingList.STATUS_REJECTED,
+        )
+    _forget_on_commit(entry.email for entry in to_approve + clashing)
+
+    approved = {entry.pk for entry in to_approve}
+    rejected = {entry.pk for entry in clashing}
+    results = []
+    for pk in ids:
+        entry = entries.get(pk)
+        if entry is None:
+            results.append(_result(pk, SKIPPED, error=ERROR_NOT_FOUND))
+        elif pk in approved:
+            results.append(_result(pk, APPROVED, entry))
+        elif pk in rejected:
+            results.append(_result(pk, REJECTED, entry, errors[pk]))
+        else:
+            results.append(_result(pk, SKIPPED, entry, errors.get(pk, ERROR_PROCESSED)))
+    return results
+
+
+@transaction.atomic
+def reject_entries(ids, reason, notes=''):
+    """ Rechaza las entradas pendientes de `ids` con el mismo motivo y notas. """
+    ids = list(dict.fromkeys(ids))
+    entries = _locked_entries(ids)
+    pending = [entries[pk] for pk in ids if pk in entries and entries[pk].status == WaitingList.STATUS_PENDING]
+
+    if pending:
+        WaitingList.objects.filter(pk__in=[entry.pk for entry in pending]).update(
+            status=WaitingList.STATUS_REJECTED, rejection_reason=reason, notes=notes,
+        )
+        queue_mass_mail([
+            (*rejection_message(entry.first_name), settings.ADMIN_USER_EMAIL, [entry.email])
+            for entry in pending
+        ])
+        _forget_on_commit(entry.email for entry in pending)
+
+    rejected = {entry.pk for entry in pending}
+    results = []
+    for pk in ids:
+        entry = entries.get(pk)
+        if entry is None:
+            results.append(_result(pk, SKIPPED, error=ERROR_NOT_FOUND))
+        elif pk in rejected:
+            results.append(_result(pk, REJECTED, entry))
+        else:
+            results.append(_result(pk, SKIPPED, entry, ERROR_PROCESSED))
+    return results
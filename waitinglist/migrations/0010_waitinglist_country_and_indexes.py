@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+def fill_country(apps, schema_editor):
+    WaitingList = apps.get_model('waitinglist', 'WaitingList')
+    entries = []
+    for entry in WaitingList.objects.exclude(city__isnull=True).filter(city__contains=',').only('pk', 'city').iterator():
+        entry.country = entry.city.rsplit(',', 1)[-1].strip()
+        entries.append(entry)
+    WaitingList.objects.bulk_update(entries, ['country'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waitinglist', '0009_alter_rejectionreason_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitinglist',
+            name='country',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Country (derived)'),
+        ),
+        migrations.RunPython(fill_country, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='waitinglist',
+            index=models.Index(fields=['status', '-created_at'], name='waitinglist_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='waitinglist',
+            index=models.Index(fields=['created_at'], name='waitinglist_created'),
+        ),
+        migrations.AddIndex(
+            model_name='waitinglist',
+            index=models.Index(fields=['email'], name='waitinglist_email'),
+        ),
+        migrations.AddIndex(
+            model_name='waitinglist',
+            index=models.Index(fields=['country'], name='waitinglist_country'),
+        ),
+    ]
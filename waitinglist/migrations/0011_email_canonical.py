@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:11
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def fill_email_canonical(apps, schema_editor):
+    apps.get_model('waitinglist', 'WaitingList').objects.update(email_canonical=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waitinglist', '0010_waitinglist_country_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitinglist',
+            name='email_canonical',
+            field=models.CharField(default='', editable=False, max_length=254),
+        ),
+        migrations.RunPython(fill_email_canonical, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='waitinglist',
+            index=models.Index(fields=['email_canonical', 'status'], name='waitinglist_email_status'),
+        ),
+    ]
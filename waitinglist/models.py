@@ -1,7 +1,17 @@
 from django.db import models
 from django.utils import timezone
 
-class WaitingList(models.Model):
+from nsocial.emails import CanonicalEmailMixin, CanonicalEmailQuerySet
+
+
+def country_from_city(city):
+    """ País a partir de city con formato "Ciudad, País" (la última parte); '' si no hay coma. """
+    if city and ',' in city:
+        return city.rsplit(',', 1)[-1].strip()
+    return ''
+
+
+class WaitingList(CanonicalEmailMixin, models.Model):
     STATUS_PENDING = 'pending'
     STATUS_APPROVED = 'approved'
     STATUS_REJECTED = 'rejected'
@@ -15,8 +25,11 @@ class WaitingList(models.Model):
     last_name = models.CharField(max_length=150, null=False, blank=False, verbose_name="Last Name")
     phone_number = models.CharField(max_length=20, null=True, blank=True, verbose_name="Phone Number")
     email = models.EmailField(max_length=255, null=False, blank=False, verbose_name="E-mail") 
+    email_canonical = models.CharField(max_length=254, editable=False, default='')
     occupation = models.CharField(max_length=60, null=True, blank=True, verbose_name="Occupation")
     city = models.CharField(max_length=255, null=True, blank=True, verbose_name="Country")
+    # Derivado de city al guardar (ver save); permite filtrar por país en SQL
+    country = models.CharField(max_length=255, blank=True, default='', editable=False, verbose_name="Country (derived)")
     referenced = models.CharField(max_length=70, null=True, blank=True, verbose_name="Referenced")
     # screen 2
     option0 = models.BooleanField(blank=True, default=False, verbose_name="Engage in a trusted, premium ecosysten tailored to meet your needs")
@@ -49,14 +62,30 @@ class WaitingList(models.Model):
     rejection_reason = models.ForeignKey('RejectionReason', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Rejection Reason")
     notes = models.CharField(max_length=100, null=True, blank=True, verbose_name="Notes")
 
+    objects = CanonicalEmailQuerySet.as_manager()
+
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
-    
+
+    def save(self, *args, **kwargs):
+        self.country = country_from_city(self.city)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'city' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'country'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Waiting List"
         verbose_name_plural = "Waiting Lists"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='waitinglist_status_created'),
+            models.Index(fields=['created_at'], name='waitinglist_created'),
+            models.Index(fields=['email'], name='waitinglist_email'),
+            models.Index(fields=['email_canonical', 'status'], name='waitinglist_email_status'),
+            models.Index(fields=['country'], name='waitinglist_country'),
+        ]
 
 
 class RejectionReason(models.Model):
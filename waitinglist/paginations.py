@@ -0,0 +1,7 @@
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class WaitingListPagination(LimitOffsetPagination):
+    """ limit/offset como el resto de la API, con páginas más grandes para el panel de admin. """
+    default_limit = 50
+    max_limit = 500
@@ -28,6 +28,22 @@ class RejectWaitingListSerializer(serializers.Serializer):
     )
 
 
+BULK_MAX_IDS = 500
+
+
+class BulkWaitingListSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_IDS,
+        help_text="IDs de las entradas de la lista de espera."
+    )
+
+
+class BulkRejectWaitingListSerializer(RejectWaitingListSerializer, BulkWaitingListSerializer):
+    pass
+
+
 class ExistingUserSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True, allow_null=False)
 
@@ -72,26 +88,25 @@ class WaitingListAdminListSerializer(serializers.ModelSerializer):
         return "Waiting List"
 
     def get_country(self, obj):
-        # Intenta extraer el país del campo city (asumiendo formato "Ciudad, País")
-        if obj.city and ',' in obj.city: #
-            parts = obj.city.split(',')
-            # Toma la última parte y quita espacios en blanco
-            country = parts[-1].strip()
-            return country
-        # Si no tiene el formato esperado o está vacío, devuelve null o una cadena vacía
-        return None
+        # Extraído de city ("Ciudad, País") al guardar la entrada
+        return obj.country or None
 
     def get_category(self, obj):
         # Valor fijo según lo solicitado
         return "Category"
 
     def get_assigned(self, obj):
-        # Obtiene el nombre del usuario admin que está haciendo la petición
-        request = self.context.get('request')
-        if request and request.user and request.user.is_authenticated:
-            # Puedes elegir qué mostrar: email, nombre completo, etc.
-            return f"{request.user.first_name} {request.user.last_name}".strip() or request.user.email
-        return "N/A" # O algún valor por defecto si no hay usuario
+        # Es el admin que hace la petición: se calcula una vez por petición (ver assigned_name)
+        if 'assigned' not in self.context:
+            self.context['assigned'] = assigned_name(self.context.get('request'))
+        return self.context['assigned']
+
+
+def assigned_name(request):
+    """ Nombre del admin que hace la petición (columna 'assigned' del listado). """
+    if request and request.user and request.user.is_authenticated:
+        return f"{request.user.first_name} {request.user.last_name}".strip() or request.user.email
+    return "N/A"
 
 
 class RejectionReasonSerializer(serializers.ModelSerializer):
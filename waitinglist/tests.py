@@ -1,3 +1,119 @@
+import json
+
+from django.core import mail
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import InviteTmpToken
+from notification.models import UnreadCounter
+from nsocial.models import CustomUser, ProfileCard, Role
+from waitinglist.models import RejectionReason, WaitingList
+
+
+class WaitingListAdminListTests(TestCase):
+    URL = '/api/v1/waitinglist/admin/'
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create(
+            email='admin@nobilis.test', first_name='Ad', last_name='Min',
+            role=Role.objects.create(code='admin', name='Admin', is_admin=True),
+        )
+        for i in range(6):
+            WaitingList.objects.create(
+                first_name=f'Applicant{i}', last_name='Test', email=f'applicant{i}@nobilis.test',
+                city='Monterrey, Mexico' if i % 2 else 'Madrid, Spain',
+                wealth_owner=i < 2,
+                status=WaitingList.STATUS_REJECTED if i == 5 else WaitingList.STATUS_PENDING,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_country_is_stored_on_save(self):
+        entry = WaitingList.objects.get(email='applicant1@nobilis.test')
+        self.assertEqual(entry.country, 'Mexico')
+        entry.city = 'Lima, Peru'
+        entry.save(update_fields=['city'])
+        entry.refresh_from_db()
+        self.assertEqual(entry.country, 'Peru')
+
+    def test_paginated_and_filtered(self):
+        with self.assertNumQueries(2):  # count y página
+            data = self.client.get(self.URL, {'limit': 4}).data
+        self.assertEqual(data['count'], 6)
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual({r['assigned'] for r in data['results']}, {'Ad Min'})
+
+        data = self.client.get(self.URL, {'status': 'pending', 'country': 'Mexico'}).data
+        self.assertEqual([r['full_name'] for r in data['results']], ['Applicant3 Test', 'Applicant1 Test'])
+        self.assertEqual(data['results'][0]['country'], 'Mexico')
+        self.assertEqual(self.client.get(self.URL, {'wealth_owner': 'true'}).data['count'], 2)
+        self.assertEqual(self.client.get(self.URL, {'status': 'unknown'}).status_code, 400)
+
+    def test_streaming_exports(self):
+        response = self.client.get(self.URL, {'export': 'ndjson', 'status': 'pending'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['email'], 'applicant4@nobilis.test')
+
+        response = self.client.get(self.URL, {'export': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertTrue(lines[0].startswith('id,first_name,last_name,email'))
+
+
+class WaitingListBulkActionTests(TestCase):
+    URL = '/api/v1/waitinglist/admin/'
+
+    def setUp(self):
+        Role.objects.create(pk=2, code='final-user', name='Final user')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin = CustomUser.objects.create(
+                email='admin@nobilis.test', first_name='Ad', last_name='Min',
+                role=Role.objects.create(code='admin', name='Admin', is_admin=True),
+            )
+        self.entries = [
+            WaitingList.objects.create(first_name=f'Applicant{i}', last_name='Test',
+                                       email=f'Applicant{i}@nobilis.test', city='Madrid, Spain')
+            for i in range(4)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_bulk_approve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create(email='applicant3@nobilis.test', first_name='Already', last_name='Member')
+        self.entries[2].status = WaitingList.STATUS_REJECTED
+        self.entries[2].save()
+        ids = [entry.pk for entry in self.entries] + [999]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.URL + 'bulk-approve/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual((data['approved'], data['rejected'], data['skipped']), (2, 1, 2))
+        self.assertEqual([r['status'] for r in data['results']],
+                         ['approved', 'approved', 'skipped', 'rejected', 'skipped'])
+
+        user = CustomUser.objects.get(email_canonical='applicant0@nobilis.test')
+        self.assertFalse(user.is_active)
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(user.role_id, 2)
+        self.assertTrue(hasattr(user, 'profile'))
+        self.assertEqual(UnreadCounter.objects.get(user=user).unread, 0)
+        self.assertTrue(ProfileCard.objects.filter(user=user).exists())
+        self.assertTrue(InviteTmpToken.objects.filter(user_id=user.pk).exists())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            list(WaitingList.objects.order_by('pk').values_list('status', flat=True)),
+            ['approved', 'approved', 'rejected', 'rejected'],
+        )
 
-# Create your tests here.
+    def test_bulk_reject(self):
+        reason = RejectionReason.objects.create(reason='Not eligible')
+        ids = [entry.pk for entry in self.entries[:3]]
+        data = self.client.post(self.URL + 'bulk-reject/',
+                                {'ids': ids, 'rejectionReasonId': reason.pk, 'notes': 'Batch'},
+                                format='json').data
+        self.assertEqual(data['rejected'], 3)
+        self.assertEqual(WaitingList.objects.filter(rejection_reason=reason, notes='Batch').count(), 3)
+        self.assertEqual(self.client.post(self.URL + 'bulk-reject/', {'ids': []}, format='json').status_code, 400)
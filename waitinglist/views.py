@@ -5,18 +5,20 @@ from waitinglist.serializers import (
     RejectWaitingListSerializer,
     WaitingListAdminListSerializer,
     RejectionReasonSerializer,
-    ExistingUserSerializer
+    ExistingUserSerializer,
+    BulkWaitingListSerializer,
+    BulkRejectWaitingListSerializer,
 )
 from rest_framework.response import Response
 from django.db import transaction
-from notification.models import Notification
+from notification.fanout import notify
 from rest_framework.permissions import AllowAny
 import uuid
 from nsocial.models import Role
 from rest_framework import status, generics, viewsets
 from rest_framework.decorators import action
-from djangorestframework_camel_case.parser import CamelCaseJSONParser
-from django.core.mail import send_mail
+from api.camel_case import CamelCaseJSONParser
+from notification.mail import queue_mail
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from moderation.views import IsAdminRole
@@ -25,6 +27,14 @@ from django.core.exceptions import ObjectDoesNotExist
 from api.models import InviteTmpToken
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from api.streaming import EXPORT_FORMATS, StreamingListMixin, export_response
+from waitinglist.paginations import WaitingListPagination
+from nsocial.emails import email_status
+from waitinglist import bulk
+
 class WaitingListView(generics.ListCreateAPIView):
     throttle_classes = [AnonRateThrottle]
     queryset = WaitingList.objects.all()
@@ -37,12 +47,8 @@ class WaitingListView(generics.ListCreateAPIView):
 
         email = serializer.validated_data.get('email')
 
-        # Busca si ya existe una entrada APROBADA con este email
-        # Usamos la constante del modelo WaitingList
-        already_approved = WaitingList.objects.filter(
-            email=email,
-            status=WaitingList.STATUS_APPROVED  # Usa la constante del modelo
-        ).exists()
+        # Busca si ya existe una entrada APROBADA con este email (sin importar mayúsculas)
+        already_approved = email_status(email).approved
 
         if already_approved:
             # Si ya existe y está aprobada, devuelve un error 409 Conflict
@@ -61,25 +67,20 @@ class WaitingListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         instance = serializer.save()
 
-        # Lógica de notificación a administradores (sin cambios)
+        # Notificación a administradores: un solo INSERT y envío WS tras el commit
         try:
-            admin_users = list(CustomUser.objects.filter(role__is_admin=True))  #
+            admin_ids = list(CustomUser.objects.filter(role__is_admin=True).values_list('pk', flat=True))
 
-            if not admin_users:
+            if not admin_ids:
                 print("Advertencia: No se encontraron usuarios administradores para notificar.")
                 return
 
-            waitinglist_content_type = ContentType.objects.get_for_model(instance)
-
-            for admin in admin_users:
-                Notification.objects.create(
-                    recipient=admin,
-                    actor=None,
-                    verb=f"{instance.first_name} {instance.last_name} has joined the waiting list",
-                    target_content_type=waitinglist_content_type,
-                    target_object_id=instance.pk
-                )  #
-            print(f"Notificaciones enviadas a {len(admin_users)} administradores.")
+            notify(
+                admin_ids,
+                verb=f"{instance.first_name} {instance.last_name} has joined the waiting list",
+                target=instance,
+            )
+            print(f"Notificaciones enviadas a {len(admin_ids)} administradores.")
 
         except Exception as e:
             print(f"Error al intentar crear notificaciones para WaitingList: {e}")
@@ -109,11 +110,76 @@ class WaitingListView(generics.ListCreateAPIView):
     #     except Exception as e:
     #         print(f"Error al intentar crear notificaciones para WaitingList: {e}")
 
-class WaitingListAdminViewSet(viewsets.ReadOnlyModelViewSet):
+class WaitingListAdminViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Listado paginado (limit/offset) de la lista de espera para admins.
+
+    Filtros: ?status= (uno o varios separados por coma), ?created_from /
+    ?created_to (YYYY-MM-DD), ?wealth_owner / ?impact_maker / ?executive /
+    ?governor (true/false) y ?country=. ?export=csv|ndjson devuelve todas las
+    entradas filtradas, generadas por partes; Accept: application/x-ndjson o
+    application/json; stream=true, el listado completo sin paginar (ver
+    api.streaming).
+
+    POST admin/bulk-approve/ {ids} y admin/bulk-reject/ {ids, rejectionReasonId,
+    notes} procesan varias entradas a la vez y devuelven un resultado por id.
+    """
     throttle_classes = [UserRateThrottle]
-    queryset = WaitingList.objects.all().order_by('-id') # Corrected ordering field if needed
+    queryset = WaitingList.objects.all().order_by('-created_at', '-id')  # Igual que los índices (status, -created_at)
     permission_classes = [IsAdminRole]
-    pagination_class = None
+    pagination_class = WaitingListPagination
+
+    flag_filters = ('wealth_owner', 'impact_maker', 'executive', 'governor')
+    export_columns = [
+        'id', 'first_name', 'last_name', 'email', 'phone_number', 'city', 'country', 'created_at', 'status',
+        'wealth_owner', 'impact_maker', 'executive', 'governor', 'income_range', 'referenced',
+    ]
+
+    def filter_entries(self, queryset):
+        params = self.request.query_params
+
+        statuses = [s for s in params.get('status', '').split(',') if s]
+        if statuses:
+            valid = {choice for choice, _ in WaitingList.STATUS_CHOICES}
+            if not set(statuses) <= valid:
+                raise ValidationError({'status': f"Use one of: {', '.join(sorted(valid))}."})
+            queryset = queryset.filter(status__in=statuses)
+
+        for param, lookup in (('created_from', 'created_at__gte'), ('created_to', 'created_at__lte')):
+            if params.get(param):
+                day = parse_date(params[param])
+                if day is None:
+                    raise ValidationError({param: 'Use YYYY-MM-DD.'})
+                queryset = queryset.filter(**{lookup: day})
+
+        for flag in self.flag_filters:
+            value = params.get(flag)
+            if value is not None:
+                if value.lower() not in ('true', 'false', '1', '0'):
+                    raise ValidationError({flag: 'Use true or false.'})
+                queryset = queryset.filter(**{flag: value.lower() in ('true', '1')})
+
+        if params.get('country'):
+            queryset = queryset.filter(country=params['country'].strip())
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_entries(self.get_queryset())
+        export_format = request.query_params.get('export')
+        if export_format in EXPORT_FORMATS:
+            rows = queryset.values_list(*self.export_columns).iterator(chunk_size=2000)
+            return export_response(
+                export_format, self.export_columns, rows, f'waitinglist-{timezone.now():%Y%m%d}', request,
+            )
+
+        # Solo las columnas que usa WaitingListAdminListSerializer
+        queryset = queryset.only('id', 'first_name', 'last_name', 'country', 'created_at', 'status')
+        streamed = self.stream_list(request, queryset)
+        if streamed is not None:
+            return streamed
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     # Use get_serializer_class to select the serializer
     def get_serializer_class(self):
@@ -121,6 +187,10 @@ class WaitingListAdminViewSet(viewsets.ReadOnlyModelViewSet):
             return WaitingListAdminListSerializer
         if self.action == 'reject':
             return RejectWaitingListSerializer
+        if self.action == 'bulk_approve':
+            return BulkWaitingListSerializer
+        if self.action == 'bulk_reject':
+            return BulkRejectWaitingListSerializer
         # For 'approve' or 'retrieve' (if enabled), use the basic one
         return WaitingListSerializer
 
@@ -139,7 +209,7 @@ class WaitingListAdminViewSet(viewsets.ReadOnlyModelViewSet):
         if waiting_entry.status != WaitingList.STATUS_PENDING:
             return Response({'error': 'This request has already been processed.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if CustomUser.objects.filter(email=waiting_entry.email).exists():
+        if email_status(waiting_entry.email, cached=False).has_user:
             waiting_entry.status = WaitingList.STATUS_REJECTED
             waiting_entry.save()
             return Response({'error': 'A user with this email already exists in the system.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -147,7 +217,7 @@ class WaitingListAdminViewSet(viewsets.ReadOnlyModelViewSet):
         # Assuming Role ID 2 is 'FINAL USER'. Get the Role instance.
         try:
              # Make sure the Role model is imported: from nsocial.models import Role
-            default_role_instance = Role.objects.get(pk=2)
+            default_role_instance = Role.objects.get(pk=bulk.DEFAULT_ROLE_ID)
         except Role.DoesNotExist:
              return Response({'error': 'Default role (ID=2) not found.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -165,31 +235,14 @@ class WaitingListAdminViewSet(viewsets.ReadOnlyModelViewSet):
         token = token_uuid.hex
         invite = InviteTmpToken(user_email=user.email, user_token=token, user_id=user.id)
         invite.save()
-        current_site = settings.CURRENT_SITE # Assuming CURRENT_SITE is defined in settings
-        # Construct URL based on frontend needs, using the actual token
-        abslink = f'{current_site}/activate-account/{token}/{user.first_name}/' # Example structure
-
-        subject = 'You have been accepted into Nobilis!'
-        message = (
-            f"Hello {user.first_name},\n\n"
-            f"Congratulations! Your application to join Nobilis has been approved.\n\n"
-            f"To activate your account and set your password, please click the following link:\n"
-            f"{abslink}\n\n"
-            f"Welcome to the community!\n\n"
-            f"Greetings,\nThe Nobilis Team"
-        )
-        try:
-            # Make sure ADMIN_USER_EMAIL is defined in settings
-            send_mail(subject, message, settings.ADMIN_USER_EMAIL, [user.email])
-        except Exception as e:
-            print(f"Error sending activation email to {user.email}: {e}")
-            # Consider transaction rollback or specific error handling
-            return Response({'error': 'User created but activation email failed to send.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        subject, message = bulk.approval_message(user.first_name, token)
+        # Encolado en la misma transacción: si la aprobación falla no sale ningún correo
+        queue_mail(subject, message, settings.ADMIN_USER_EMAIL, [user.email])
 
         waiting_entry.status = WaitingList.STATUS_APPROVED
         waiting_entry.save()
 
-        return Response({'success': f'User {user.email} approved and activation email sent.'}, status=status.HTTP_200_OK)
+        return Response({'success': f'User {user.email} approved and activation email queued.'}, status=status.HTTP_200_OK)
 
     # --- reject action logic ---
     @action(detail=True, methods=['post'], serializer_class=RejectWaitingListSerializer)
@@ -209,22 +262,40 @@ class WaitingListAdminViewSet(viewsets.ReadOnlyModelViewSet):
         waiting_entry.notes = notes # If you add 'notes' back
         waiting_entry.save()
 
-        subject = 'Update on your application at Nobilis'
-        message = (
-            f"Hello {waiting_entry.first_name}\n\n"
-            f"Unfortunately, we have rejected your request to join Nobilis.\n\n"
-            # Optional: Include reason f"Reason: {reason}\n\n"
-            f"Greetings,\nThe Nobilis Team"
-        )
-        try:
-            # Make sure ADMIN_USER_EMAIL is defined in settings
-            send_mail(subject, message, settings.ADMIN_USER_EMAIL, [waiting_entry.email])
-        except Exception as e:
-             print(f"Error sending rejection email to {waiting_entry.email}: {e}")
-             # Decide if this error should affect the response
+        subject, message = bulk.rejection_message(waiting_entry.first_name)
+        queue_mail(subject, message, settings.ADMIN_USER_EMAIL, [waiting_entry.email])
 
         return Response({'success': f'Request for {waiting_entry.email} rejected.'}, status=status.HTTP_200_OK)
 
+    # --- acciones en lote (waitinglist.bulk) ---
+    def _bulk_response(self, results):
+        summary = {outcome: 0 for outcome in (bulk.APPROVED, bulk.REJECTED, bulk.SKIPPED)}
+        for result in results:
+            summary[result['status']] += 1
+        return Response({**summary, 'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='bulk-approve')
+    def bulk_approve(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = bulk.approve_entries(serializer.validated_data['ids'])
+        except Role.DoesNotExist:
+            return Response({'error': f'Default role (ID={bulk.DEFAULT_ROLE_ID}) not found.'},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return self._bulk_response(results)
+
+    @action(detail=False, methods=['post'], url_path='bulk-reject')
+    def bulk_reject(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk.reject_entries(
+            serializer.validated_data['ids'],
+            serializer.validated_data['rejection_reason'],
+            serializer.validated_data.get('notes', ''),
+        )
+        return self._bulk_response(results)
+
 
 # class WaitingListAdminViewSet(viewsets.ReadOnlyModelViewSet):
 #     queryset = WaitingList.objects.all().order_by('-created_at')
@@ -377,21 +448,18 @@ class UserExistsView(APIView):
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
     def post(self, request):
-        waitinglist = WaitingList.objects.all()
         serializer = ExistingUserSerializer(data=request.data)
         if serializer.is_valid():
-            try:
-                user = waitinglist.get(email=serializer.validated_data["email"], status=WaitingList.STATUS_APPROVED)
-                if user:
-                    return Response({
-                        'success': False,
-                        'message': 'User already exists.'
-                    }, status=status.HTTP_409_CONFLICT)
-            except ObjectDoesNotExist:
+            # Respuesta cacheada (nsocial.emails): este endpoint público recibe mucho tráfico
+            if email_status(serializer.validated_data["email"]).approved:
                 return Response({
                     'success': False,
-                    'message':'User does not exist'
-                }, status=status.HTTP_200_OK)
+                    'message': 'User already exists.'
+                }, status=status.HTTP_409_CONFLICT)
+            return Response({
+                'success': False,
+                'message':'User does not exist'
+            }, status=status.HTTP_200_OK)
         return Response({
             'success': False,
             'message': 'email was not send'